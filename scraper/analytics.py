@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Ad longevity and launch cadence analytics.
+
+The columns the analyses need (start date, end date, status, platforms)
+are streamed out of PostgreSQL already encoded as integers: dates as days
+since the epoch and platforms as a bitmask. They are loaded into NumPy
+arrays, and every statistic is computed with array operations, so there
+is no per-ad Python work and millions of ads take seconds.
+
+Usage:
+    python analytics.py [--json analytics.json] [--status active] [--platform instagram]
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from database import Database
+
+
+# Marks a NULL date in the day-number arrays
+NULL_DAY = np.iinfo(np.int32).min
+
+EPOCH = date(1970, 1, 1)
+
+# Run-duration histogram bucket edges, in days
+DURATION_BINS = [0, 1, 3, 7, 14, 30, 60, 90, 180, 365, 730]
+
+PERCENTILES = [10, 25, 50, 75, 90, 99]
+
+
+class AdArrays:
+    """Columnar view of the ads needed for analytics."""
+
+    def __init__(self, start: np.ndarray, end: np.ndarray, active: np.ndarray,
+                 platform_bits: np.ndarray, platforms: List[str]):
+        self.start = start                  # int32 days since epoch, NULL_DAY if unknown
+        self.end = end                      # int32 days since epoch, NULL_DAY if unknown
+        self.active = active                # bool
+        self.platform_bits = platform_bits  # int64, bit i set if the ad ran on platforms[i]
+        self.platforms = platforms
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+
+def load_ad_arrays(db: Database, batch_size: int = 100000, **filters) -> AdArrays:
+    """Stream the analytics columns into NumPy arrays.
+
+    Accepts the same filters as Database.query_ads. Archived stubs keep
+    their status and dates, so they are included unless filtered out.
+    """
+    filters.setdefault('include_archived', True)
+    clauses, params = db._ad_filters(**filters)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    cursor = db.conn.cursor()
+
+    try:
+        cursor.execute(f"SELECT DISTINCT unnest(platforms) FROM ads {where} ORDER BY 1", params)
+        # Bit 63 would make the mask negative
+        platforms = [row[0] for row in cursor.fetchall()][:63]
+    finally:
+        cursor.close()
+
+    bit_terms = ' + '.join(
+        f"(CASE WHEN %s = ANY(platforms) THEN {1 << i}::bigint ELSE 0 END)"
+        for i in range(len(platforms))
+    ) or '0::bigint'
+
+    cursor = db.conn.cursor(name='analytics_ad_arrays')
+    cursor.itersize = batch_size
+    chunks = []
+
+    try:
+        cursor.execute(f"""
+            SELECT
+                COALESCE(start_date - DATE '1970-01-01', %s),
+                COALESCE(end_date - DATE '1970-01-01', %s),
+                (status = 'active')::int,
+                {bit_terms}
+            FROM ads
+            {where}
+        """, [int(NULL_DAY), int(NULL_DAY)] + platforms + params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.int64))
+    finally:
+        cursor.close()
+        db.conn.rollback()
+
+    data = np.concatenate(chunks) if chunks else np.empty((0, 4), dtype=np.int64)
+    return AdArrays(
+        start=data[:, 0].astype(np.int32),
+        end=data[:, 1].astype(np.int32),
+        active=data[:, 2].astype(bool),
+        platform_bits=data[:, 3],
+        platforms=platforms,
+    )
+
+
+def arrays_from_ads(ads: List[Dict]) -> AdArrays:
+    """AdArrays from ad dicts already in memory (e.g. the report server's cache)."""
+    platforms = sorted({name for ad in ads for name in ad.get('platforms') or []})[:63]
+    bits = {name: 1 << i for i, name in enumerate(platforms)}
+
+    def day(value) -> int:
+        return (value - EPOCH).days if value else int(NULL_DAY)
+
+    return AdArrays(
+        start=np.fromiter((day(ad.get('start_date')) for ad in ads), dtype=np.int32, count=len(ads)),
+        end=np.fromiter((day(ad.get('end_date')) for ad in ads), dtype=np.int32, count=len(ads)),
+        active=np.fromiter((ad.get('status') == 'active' for ad in ads), dtype=bool, count=len(ads)),
+        platform_bits=np.fromiter(
+            (sum(bits.get(name, 0) for name in ad.get('platforms') or []) for ad in ads),
+            dtype=np.int64, count=len(ads),
+        ),
+        platforms=platforms,
+    )
+
+
+def _to_date(day: int) -> str:
+    return (EPOCH + timedelta(days=int(day))).isoformat()
+
+
+def _today_day() -> int:
+    return (date.today() - EPOCH).days
+
+
+def run_durations(arrays: AdArrays, today: Optional[int] = None):
+    """(durations in days, still-running mask) for ads with a known span.
+
+    Active ads without an end date are counted up to today (censored);
+    inactive ads without an end date have no known duration and are left out.
+    """
+    today = _today_day() if today is None else today
+    has_start = arrays.start != NULL_DAY
+    has_end = arrays.end != NULL_DAY
+    running = has_start & ~has_end & arrays.active
+    known = has_start & (has_end | running)
+    end = np.where(has_end, arrays.end, today)
+    durations = (end - arrays.start)[known]
+    return np.maximum(durations, 0), running[known]
+
+
+def longevity(arrays: AdArrays, today: Optional[int] = None) -> Dict:
+    """Run-duration distribution, split into ended and still-running ads."""
+    durations, running = run_durations(arrays, today)
+    bins = DURATION_BINS + [max(int(durations.max()) + 1, DURATION_BINS[-1] + 1) if durations.size else DURATION_BINS[-1] + 1]
+
+    def summary(values: np.ndarray) -> Dict:
+        if not values.size:
+            return {'count': 0}
+        counts, _ = np.histogram(values, bins=bins)
+        return {
+            'count': int(values.size),
+            'mean_days': round(float(values.mean()), 1),
+            'percentiles': {
+                f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))
+            },
+            'histogram': [
+                {'from_days': int(low), 'to_days': int(high), 'count': int(count)}
+                for low, high, count in zip(bins[:-1], bins[1:], counts)
+            ],
+        }
+
+    return {
+        'all': summary(durations),
+        'ended': summary(durations[~running]),
+        'running': summary(durations[running]),
+    }
+
+
+def launch_cadence(arrays: AdArrays) -> Dict:
+    """Ads launched per ISO week and per weekday."""
+    start = arrays.start[arrays.start != NULL_DAY].astype(np.int64)
+    if not start.size:
+        return {'weeks': [], 'weekday_counts': [0] * 7}
+
+    # 1970-01-01 was a Thursday; weekday 0 is Monday
+    weekday = (start + 3) % 7
+    week_start = start - weekday
+    first = week_start.min()
+    counts = np.bincount((week_start - first) // 7)
+    week_days = first + 7 * np.arange(counts.size)
+
+    return {
+        'weeks': [{'week_start': _to_date(day), 'launches': int(count)}
+                  for day, count in zip(week_days, counts)],
+        'mean_per_week': round(float(counts.mean()), 2),
+        'median_per_week': float(np.median(counts)),
+        'max_per_week': int(counts.max()),
+        'weeks_without_launches': int((counts == 0).sum()),
+        'weekday_counts': np.bincount(weekday, minlength=7).tolist(),
+    }
+
+
+def platform_mix(arrays: AdArrays) -> Dict:
+    """Launches per platform per calendar month."""
+    has_start = arrays.start != NULL_DAY
+    start = arrays.start[has_start]
+    bits = arrays.platform_bits[has_start]
+    if not start.size:
+        return {'platforms': arrays.platforms, 'months': []}
+
+    months = start.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    first = months.min()
+    index = months - first
+    size = int(index.max()) + 1
+    per_platform = {
+        name: np.bincount(index, weights=(bits >> i) & 1, minlength=size).astype(np.int64)
+        for i, name in enumerate(arrays.platforms)
+    }
+    totals = np.bincount(index, minlength=size)
+
+    return {
+        'platforms': arrays.platforms,
+        'months': [
+            {
+                'month': str(np.datetime64(int(first + m), 'M')),
+                'launches': int(totals[m]),
+                'by_platform': {name: int(counts[m]) for name, counts in per_platform.items()},
+            }
+            for m in range(size)
+        ],
+    }
+
+
+def active_inventory(arrays: AdArrays, today: Optional[int] = None) -> Dict:
+    """Number of ads running on each day (from start date through end date)."""
+    today = _today_day() if today is None else today
+    has_start = arrays.start != NULL_DAY
+    has_end = arrays.end != NULL_DAY
+    running = has_start & ~has_end & arrays.active
+    known = has_start & (has_end | running)
+    start = arrays.start[known].astype(np.int64)
+    if not start.size:
+        return {'days': [], 'peak': 0}
+
+    end = np.where(has_end, arrays.end, today)[known].astype(np.int64)
+    end = np.maximum(end, start)
+    first = start.min()
+    size = int(end.max() - first) + 2
+    # +1 on the start day, -1 the day after the end, then a running sum
+    delta = np.bincount(start - first, minlength=size) - np.bincount(end - first + 1, minlength=size)
+    curve = np.cumsum(delta)[:-1]
+    peak = int(curve.argmax())
+
+    return {
+        'days': [{'date': _to_date(first + i), 'active': int(count)} for i, count in enumerate(curve)],
+        'peak': int(curve[peak]),
+        'peak_date': _to_date(first + peak),
+        'latest': int(curve[-1]),
+    }
+
+
+def compute_analytics(arrays: AdArrays, today: Optional[int] = None) -> Dict:
+    """All analyses, as a JSON-serializable dict."""
+    return {
+        'generated_at': date.today().isoformat(),
+        'ads': len(arrays),
+        'longevity': longevity(arrays, today),
+        'cadence': launch_cadence(arrays),
+        'platform_mix': platform_mix(arrays),
+        'active_inventory': active_inventory(arrays, today),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ad longevity and launch cadence analytics")
+    parser.add_argument('--json', dest='json_path', default=None,
+                        help="Write the results to this file (default: stdout)")
+    parser.add_argument('--status', default=None)
+    parser.add_argument('--platform', default=None)
+    args = parser.parse_args()
+
+    db = Database()
+
+    try:
+        arrays = load_ad_arrays(db, status=args.status, platform=args.platform)
+    finally:
+        db.close()
+
+    results = compute_analytics(arrays)
+    output = json.dumps(results, indent=2)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"✓ Analytics for {len(arrays)} ads written to {args.json_path}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
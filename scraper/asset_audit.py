@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Asset audit and garbage collection.
+
+Reconciles the asset directory with the database:
+- missing: `asset_path` values (in `ads` or `ad_versions`) whose file is gone
+- orphaned: files no row points at, including leftover `.part` downloads
+- corrupt: empty or truncated files, or files whose content doesn't match
+  their extension
+
+Asset paths are streamed from the database with a server-side cursor and
+the directory is walked with os.scandir. Files are hashed and checked in a
+process pool through mmap, with large videos spread across the workers
+one file at a time. The size, mtime and hash of every checked file are
+kept in `asset_files`, so a later audit only reads new or changed files
+(use --full to re-read everything and catch silent corruption).
+
+Usage:
+    python asset_audit.py [--assets-dir assets] [--full] [--workers N] [--report audit.json]
+        [--delete-orphans] [--requeue-missing] [--requeue-corrupt]
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from psycopg2.extras import execute_values
+from database import Database
+
+
+# Files at least this big are hashed one per task; smaller ones in chunks
+LARGE_FILE_BYTES = 8 * 1024 * 1024
+SMALL_FILE_CHUNKSIZE = 64
+
+# Suffix of a download that hasn't finished (see download_asset)
+PARTIAL_SUFFIX = '.part'
+
+EMPTY_SHA256 = hashlib.sha256(b'').hexdigest()
+
+
+def _check_jpeg(mm) -> Optional[str]:
+    if mm[:3] != b'\xff\xd8\xff':
+        return 'not a JPEG'
+    # End-of-image marker, allowing for trailing padding
+    if mm.rfind(b'\xff\xd9', max(0, len(mm) - 1024)) == -1:
+        return 'truncated JPEG'
+    return None
+
+
+def _check_png(mm) -> Optional[str]:
+    if mm[:8] != b'\x89PNG\r\n\x1a\n':
+        return 'not a PNG'
+    if mm.rfind(b'IEND', max(0, len(mm) - 64)) == -1:
+        return 'truncated PNG'
+    return None
+
+
+def _check_gif(mm) -> Optional[str]:
+    if mm[:4] != b'GIF8':
+        return 'not a GIF'
+    if mm[len(mm) - 1:] != b';':
+        return 'truncated GIF'
+    return None
+
+
+def _check_webp(mm) -> Optional[str]:
+    if mm[:4] != b'RIFF' or mm[8:12] != b'WEBP':
+        return 'not a WebP'
+    if struct.unpack('<I', mm[4:8])[0] + 8 > len(mm):
+        return 'truncated WebP'
+    return None
+
+
+def _check_mp4(mm) -> Optional[str]:
+    """Walk the top-level boxes; they must tile the file exactly and include moov."""
+    size = len(mm)
+    offset = 0
+    boxes = set()
+    while offset < size:
+        if offset + 8 > size:
+            return 'truncated MP4 box header'
+        box_size, box_type = struct.unpack('>I4s', mm[offset:offset + 8])
+        if box_size == 1:
+            if offset + 16 > size:
+                return 'truncated MP4 box header'
+            box_size = struct.unpack('>Q', mm[offset + 8:offset + 16])[0]
+        elif box_size == 0:
+            # Box extends to the end of the file
+            box_size = size - offset
+        if box_size < 8:
+            return f"invalid MP4 box size at offset {offset}"
+        if offset + box_size > size:
+            return f"truncated MP4 ({box_type.decode('latin-1')} box runs past end of file)"
+        boxes.add(box_type)
+        offset += box_size
+    if b'moov' not in boxes:
+        return 'MP4 without moov box'
+    return None
+
+
+def _check_webm(mm) -> Optional[str]:
+    if mm[:4] != b'\x1a\x45\xdf\xa3':
+        return 'not a WebM'
+    return None
+
+
+FORMAT_CHECKS = {
+    '.jpg': _check_jpeg,
+    '.jpeg': _check_jpeg,
+    '.png': _check_png,
+    '.gif': _check_gif,
+    '.webp': _check_webp,
+    '.mp4': _check_mp4,
+    '.mov': _check_mp4,
+    '.webm': _check_webm,
+}
+
+
+def inspect_file(path: str) -> Tuple[str, Optional[int], Optional[int], Optional[str], Optional[str]]:
+    """(path, size, mtime_ns, sha256, problem) for one file.
+
+    Runs in a worker process. The file is read through mmap, so hashing a
+    multi-gigabyte video doesn't copy it through Python buffers.
+    """
+    try:
+        stat = os.stat(path)
+        if stat.st_size == 0:
+            return path, 0, stat.st_mtime_ns, EMPTY_SHA256, 'empty file'
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, 'madvise'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            digest = hashlib.sha256(mm).hexdigest()
+            check = FORMAT_CHECKS.get(os.path.splitext(path)[1].lower())
+            problem = check(mm) if check else None
+        return path, stat.st_size, stat.st_mtime_ns, digest, problem
+    except (OSError, ValueError) as e:
+        return path, None, None, None, f"unreadable: {e}"
+
+
+def walk_files(root: str) -> Iterator[os.DirEntry]:
+    """Every regular file under root, without following symlinks."""
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except OSError as e:
+            print(f"    ⚠️  Could not list directory: {e}")
+
+
+class AssetAudit:
+    """Compare the files under an assets directory with the database."""
+
+    def __init__(self, db: Database, assets_dir: str = 'assets', workers: Optional[int] = None,
+                 grace_seconds: float = 3600, batch_size: int = 10000):
+        self.db = db
+        self.root = os.path.abspath(assets_dir)
+        self.workers = workers or os.cpu_count() or 1
+        # Files younger than this may belong to a download in progress
+        self.grace_seconds = grace_seconds
+        self.batch_size = batch_size
+
+    def relative(self, path: str) -> Optional[str]:
+        """Path relative to the assets root, or None if it lies outside it."""
+        rel = os.path.relpath(os.path.abspath(path), self.root)
+        return None if rel.startswith('..') else rel
+
+    def scan_files(self) -> Dict[str, Tuple[int, int]]:
+        """{relative path: (size, mtime_ns)} for every file under the root."""
+        files = {}
+        for entry in walk_files(self.root):
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            files[os.path.relpath(entry.path, self.root)] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def iter_references(self) -> Iterator[Tuple[str, tuple, str]]:
+        """Stream (table, key, asset_path) for every row with a local asset."""
+        cursor = self.db.conn.cursor(name='asset_audit_references', withhold=True)
+        cursor.itersize = self.batch_size
+
+        try:
+            cursor.execute("""
+                SELECT 'ads', ad_id, NULL::integer, asset_path
+                FROM ads WHERE asset_path IS NOT NULL
+                UNION ALL
+                SELECT 'ad_versions', ad_id, version_index, asset_path
+                FROM ad_versions WHERE asset_path IS NOT NULL
+            """)
+            self.db.conn.commit()
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    return
+                for table, ad_id, version_index, asset_path in rows:
+                    key = (ad_id,) if table == 'ads' else (ad_id, version_index)
+                    yield table, key, asset_path
+        finally:
+            cursor.close()
+
+    def load_known(self) -> Dict[str, tuple]:
+        """{path: (size, mtime_ns, sha256, problem)} recorded by earlier audits."""
+        cursor = self.db.conn.cursor(name='asset_audit_known')
+        cursor.itersize = self.batch_size
+
+        try:
+            cursor.execute("SELECT path, size, mtime_ns, sha256, problem FROM asset_files")
+            return {row[0]: tuple(row[1:]) for row in cursor}
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
+
+    def inspect(self, paths: List[str], sizes: Dict[str, Tuple[int, int]]) -> Iterator[tuple]:
+        """Hash and check files in the process pool, largest files one per task."""
+        large = [p for p in paths if sizes[p][0] >= LARGE_FILE_BYTES]
+        small = [p for p in paths if sizes[p][0] < LARGE_FILE_BYTES]
+        # Start the biggest files first so no worker is left with one at the end
+        large.sort(key=lambda p: sizes[p][0], reverse=True)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for rel, chunksize in ((large, 1), (small, SMALL_FILE_CHUNKSIZE)):
+                full_paths = [os.path.join(self.root, p) for p in rel]
+                for result in executor.map(inspect_file, full_paths, chunksize=chunksize):
+                    yield (os.path.relpath(result[0], self.root),) + result[1:]
+
+    def record(self, rows: List[tuple]):
+        """Upsert inspected files into asset_files."""
+        if not rows:
+            return
+        cursor = self.db.conn.cursor()
+
+        try:
+            execute_values(cursor, """
+                INSERT INTO asset_files (path, size, mtime_ns, sha256, problem) VALUES %s
+                ON CONFLICT (path) DO UPDATE SET
+                    size = EXCLUDED.size,
+                    mtime_ns = EXCLUDED.mtime_ns,
+                    sha256 = EXCLUDED.sha256,
+                    problem = EXCLUDED.problem,
+                    checked_at = CURRENT_TIMESTAMP
+            """, rows)
+            self.db.conn.commit()
+        except Exception as e:
+            print(f"✗ Error recording audited files: {e}")
+            self.db.conn.rollback()
+        finally:
+            cursor.close()
+
+    def forget(self, paths: List[str]):
+        """Drop asset_files rows for files that no longer exist."""
+        if not paths:
+            return
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute("DELETE FROM asset_files WHERE path = ANY(%s)", (paths,))
+            self.db.conn.commit()
+        except Exception as e:
+            print(f"✗ Error pruning audited files: {e}")
+            self.db.conn.rollback()
+        finally:
+            cursor.close()
+
+    def run(self, full: bool = False) -> Dict:
+        """Audit the assets directory and return the findings."""
+        started = time.monotonic()
+        files = self.scan_files()
+        print(f"  Found {len(files)} files under {self.root} ({time.monotonic() - started:.1f}s)")
+
+        referenced = {}
+        missing = []
+        outside = 0
+        for table, key, asset_path in self.iter_references():
+            rel = self.relative(asset_path)
+            if rel is None:
+                # Written under another assets directory; only check it exists
+                outside += 1
+                if not os.path.exists(asset_path):
+                    missing.append({'table': table, 'key': list(key), 'asset_path': asset_path})
+            elif rel in files:
+                referenced.setdefault(rel, []).append((table, key))
+            else:
+                missing.append({'table': table, 'key': list(key), 'asset_path': asset_path})
+        print(f"  Checked {sum(len(v) for v in referenced.values()) + len(missing) + outside} asset references")
+
+        cutoff_ns = int((time.time() - self.grace_seconds) * 1e9)
+        orphans = []
+        partial = []
+        for rel, (size, mtime_ns) in files.items():
+            if rel in referenced or mtime_ns > cutoff_ns:
+                continue
+            (partial if rel.endswith(PARTIAL_SUFFIX) else orphans).append(rel)
+
+        known = self.load_known()
+        to_check = [
+            rel for rel in referenced
+            if full or rel not in known or known[rel][:2] != files[rel]
+        ]
+        total_bytes = sum(files[rel][0] for rel in to_check)
+        print(f"  Inspecting {len(to_check)} new or changed files "
+              f"({total_bytes / 1e9:.2f} GB, {self.workers} workers)...")
+
+        corrupt = []
+        batch = []
+        for rel, size, mtime_ns, digest, problem in self.inspect(to_check, files):
+            previous = known.get(rel)
+            # Same size and mtime but different bytes: silent corruption
+            if (problem is None and full and previous and previous[2] and digest
+                    and previous[:2] == (size, mtime_ns) and previous[2] != digest):
+                problem = 'content changed without a new mtime'
+            if problem:
+                corrupt.append({'path': rel, 'problem': problem, 'references': [
+                    {'table': table, 'key': list(key)} for table, key in referenced[rel]
+                ]})
+            if size is not None:
+                batch.append((rel, size, mtime_ns, digest, problem))
+            if len(batch) >= self.batch_size:
+                self.record(batch)
+                batch = []
+        self.record(batch)
+        self.forget([rel for rel in known if rel not in files])
+
+        # Problems found by earlier audits on files that haven't changed since
+        checked = set(to_check)
+        for rel in referenced:
+            if rel not in checked and known[rel][3]:
+                corrupt.append({'path': rel, 'problem': known[rel][3], 'references': [
+                    {'table': table, 'key': list(key)} for table, key in referenced[rel]
+                ]})
+
+        elapsed = time.monotonic() - started
+        return {
+            'assets_dir': self.root,
+            'files': len(files),
+            'bytes': sum(size for size, _ in files.values()),
+            'references': sum(len(v) for v in referenced.values()) + len(missing) + outside,
+            'inspected': len(to_check),
+            'inspected_bytes': total_bytes,
+            'elapsed_seconds': round(elapsed, 2),
+            'missing': missing,
+            'orphans': orphans,
+            'partial': partial,
+            'corrupt': corrupt,
+        }
+
+    def delete_files(self, paths: List[str]) -> int:
+        """Remove files (relative to the root) and their audit rows."""
+        deleted = []
+        for rel in paths:
+            try:
+                os.remove(os.path.join(self.root, rel))
+                deleted.append(rel)
+            except FileNotFoundError:
+                deleted.append(rel)
+            except OSError as e:
+                print(f"    ⚠️  Could not delete {rel}: {e}")
+        self.forget(deleted)
+        return len(deleted)
+
+    def requeue(self, references: List[Dict]) -> int:
+        """Clear asset_path so the asset worker downloads these assets again."""
+        ad_keys = [ref['key'][0] for ref in references if ref['table'] == 'ads']
+        version_keys = [tuple(ref['key']) for ref in references if ref['table'] == 'ad_versions']
+        cursor = self.db.conn.cursor()
+
+        try:
+            if ad_keys:
+                cursor.execute("""
+                    UPDATE ads SET asset_path = NULL, updated_at = CURRENT_TIMESTAMP
+                    WHERE ad_id = ANY(%s)
+                """, (ad_keys,))
+            if version_keys:
+                execute_values(cursor, """
+                    UPDATE ad_versions SET asset_path = NULL
+                    FROM (VALUES %s) AS v(ad_id, version_index)
+                    WHERE ad_versions.ad_id = v.ad_id AND ad_versions.version_index = v.version_index
+                """, version_keys)
+            self.db.conn.commit()
+            return len(ad_keys) + len(version_keys)
+        except Exception as e:
+            print(f"✗ Error requeueing assets: {e}")
+            self.db.conn.rollback()
+            return 0
+        finally:
+            cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit and clean up the asset directory")
+    parser.add_argument('--assets-dir', default='assets')
+    parser.add_argument('--full', action='store_true',
+                        help="Re-read every file, not only new or changed ones")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('AUDIT_WORKERS', '0')) or None,
+                        help="Hashing processes (default: CPU count)")
+    parser.add_argument('--grace-minutes', type=float, default=60,
+                        help="Ignore unreferenced files younger than this (downloads in progress)")
+    parser.add_argument('--report', default=None, help="Write the full findings to this JSON file")
+    parser.add_argument('--delete-orphans', action='store_true',
+                        help="Delete unreferenced files and leftover partial downloads")
+    parser.add_argument('--requeue-missing', action='store_true',
+                        help="Clear asset_path on rows whose file is missing")
+    parser.add_argument('--requeue-corrupt', action='store_true',
+                        help="Delete corrupt files and clear asset_path on their rows")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Auditing ad assets...")
+    print("=" * 60)
+
+    db = Database()
+    audit = AssetAudit(db, args.assets_dir, args.workers, grace_seconds=args.grace_minutes * 60)
+
+    try:
+        report = audit.run(full=args.full)
+
+        print("\n" + "=" * 60)
+        print(f"✓ Audited {report['files']} files ({report['bytes'] / 1e9:.2f} GB) "
+              f"in {report['elapsed_seconds']}s")
+        print(f"  Missing files:   {len(report['missing'])}")
+        print(f"  Orphaned files:  {len(report['orphans'])}")
+        print(f"  Partial files:   {len(report['partial'])}")
+        print(f"  Corrupt files:   {len(report['corrupt'])}")
+        for item in report['corrupt'][:10]:
+            print(f"    {item['path']}: {item['problem']}")
+
+        if args.delete_orphans:
+            deleted = audit.delete_files(report['orphans'] + report['partial'])
+            print(f"✓ Deleted {deleted} orphaned/partial files")
+        if args.requeue_missing:
+            requeued = audit.requeue(report['missing'])
+            print(f"✓ Requeued {requeued} missing assets for asset_worker.py")
+        if args.requeue_corrupt:
+            audit.delete_files([item['path'] for item in report['corrupt']])
+            requeued = audit.requeue([ref for item in report['corrupt'] for ref in item['references']])
+            print(f"✓ Deleted corrupt files and requeued {requeued} assets for asset_worker.py")
+
+        if args.report:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            print(f"✓ Report written to {args.report}")
+        print("=" * 60)
+    except KeyboardInterrupt:
+        print("\n✗ Interrupted")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
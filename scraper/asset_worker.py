@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Asset backfill/refresh worker.
+
+Finds ads whose asset was never downloaded (or whose local file is gone),
+active ads first, re-resolves expired fbcdn URLs through the browser, then
+downloads in parallel and updates `asset_path` in bulk.
+
+Usage:
+    python asset_worker.py [--limit N] [--batch-size 200] [--workers 8] [--verify-files] [--no-resolve]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from psycopg2.extras import execute_values
+from database import Database
+
+
+def url_expires_at(asset_url: str) -> Optional[int]:
+    """Expiry of a signed fbcdn URL as a Unix timestamp (from its hex `oe` parameter)."""
+    try:
+        oe = parse_qs(urlparse(asset_url).query).get('oe')
+        return int(oe[0], 16) if oe else None
+    except (ValueError, TypeError):
+        return None
+
+
+def is_url_expired(asset_url: str, margin_seconds: int = 300) -> bool:
+    """Whether a signed URL has expired (or will within the margin)."""
+    expires_at = url_expires_at(asset_url)
+    return expires_at is not None and expires_at < time.time() + margin_seconds
+
+
+class AssetBackfill:
+    """Backfill missing assets for rows in the ads table."""
+
+    def __init__(self, db: Database, assets_dir: str = 'assets', workers: int = 8,
+                 resolve_expired: bool = True):
+        from facebook_ads_scraper import FacebookAdsScraper
+        from sinks import MultiSink
+
+        self.db = db
+        self.workers = workers
+        self.resolve_expired = resolve_expired
+        # Used for its download path, rate controller and (lazily) its browser;
+        # nothing is written through its sinks
+        self.scraper = FacebookAdsScraper(assets_dir=assets_dir, sink=MultiSink([]))
+
+    def iter_missing(self, batch_size: int, limit: Optional[int] = None):
+        """Yield batches of rows with no local asset, active ads first."""
+        cursor = self.db.conn.cursor(name='asset_backfill_missing', withhold=True)
+        cursor.itersize = batch_size
+
+        try:
+            cursor.execute("""
+                SELECT ad_id, asset_url, asset_type
+                FROM ads
+                WHERE asset_path IS NULL AND asset_url IS NOT NULL
+                ORDER BY (status <> 'active'), start_date DESC NULLS LAST
+                LIMIT %s
+            """, (limit,))
+            self.db.conn.commit()
+            yield from self._batches(cursor, batch_size)
+        finally:
+            cursor.close()
+
+    def iter_stale(self, batch_size: int, limit: Optional[int] = None):
+        """Yield batches of rows whose recorded asset file no longer exists."""
+        cursor = self.db.conn.cursor(name='asset_backfill_stale', withhold=True)
+        cursor.itersize = batch_size
+
+        try:
+            cursor.execute("""
+                SELECT ad_id, asset_url, asset_type, asset_path
+                FROM ads
+                WHERE asset_path IS NOT NULL AND asset_url IS NOT NULL
+                ORDER BY (status <> 'active'), start_date DESC NULLS LAST
+                LIMIT %s
+            """, (limit,))
+            self.db.conn.commit()
+            for batch in self._batches(cursor, batch_size):
+                stale = [row for row in batch if not os.path.exists(row['asset_path'])]
+                if stale:
+                    yield stale
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _batches(cursor, batch_size: int):
+        columns = None
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            if columns is None:
+                columns = [col[0] for col in cursor.description]
+            yield [dict(zip(columns, row)) for row in rows]
+
+    def resolve_url(self, ad_id: str) -> tuple:
+        """Load the ad's Library page in the browser and extract a fresh asset URL."""
+        from selenium.webdriver.common.by import By
+        from facebook_ads_scraper import build_ad_url
+
+        scraper = self.scraper
+        if scraper.driver is None and not scraper.setup_driver():
+            return None, None
+
+        scraper.navigate(build_ad_url(ad_id))
+        time.sleep(3)
+        for container in scraper.driver.find_elements(By.CSS_SELECTOR, "div[class*='xh8yej3']"):
+            if scraper.extract_ad_id(container) == ad_id:
+                return scraper.extract_asset(container)
+        return None, None
+
+    def process_batch(self, rows: List[Dict]) -> int:
+        """Refresh expired URLs, download in parallel and bulk-update asset paths."""
+        if self.resolve_expired:
+            for row in rows:
+                if is_url_expired(row['asset_url']):
+                    try:
+                        asset_url, asset_type = self.resolve_url(row['ad_id'])
+                    except Exception as e:
+                        print(f"    ⚠️  Could not re-resolve asset for ad {row['ad_id']}: {e}")
+                        continue
+                    if asset_url:
+                        row['asset_url'], row['asset_type'] = asset_url, asset_type
+
+        def fetch(row):
+            if row.get('asset_path') and os.path.exists(row['asset_path']):
+                return row['asset_path']
+            return self.scraper.download_asset(row['asset_url'], row['asset_type'], row['ad_id'])
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            paths = list(executor.map(fetch, rows))
+
+        updates = [
+            (row['ad_id'], row['asset_url'], row['asset_type'], path)
+            for row, path in zip(rows, paths) if path
+        ]
+        self.bulk_update(updates)
+        return len(updates)
+
+    def bulk_update(self, updates: List[tuple]):
+        """Set asset_url/asset_type/asset_path for many ads in one statement."""
+        if not updates:
+            return
+        cursor = self.db.conn.cursor()
+
+        try:
+            execute_values(cursor, """
+                UPDATE ads
+                SET asset_url = v.asset_url,
+                    asset_type = v.asset_type,
+                    asset_path = v.asset_path,
+                    updated_at = CURRENT_TIMESTAMP
+                FROM (VALUES %s) AS v(ad_id, asset_url, asset_type, asset_path)
+                WHERE ads.ad_id = v.ad_id
+            """, updates)
+            self.db.conn.commit()
+        except Exception as e:
+            print(f"✗ Error updating asset paths: {e}")
+            self.db.conn.rollback()
+        finally:
+            cursor.close()
+
+    def run(self, batch_size: int = 200, limit: Optional[int] = None, verify_files: bool = False) -> Dict:
+        """Backfill missing assets (and optionally files missing on disk)."""
+        totals = {'candidates': 0, 'downloaded': 0}
+        sources = [self.iter_missing(batch_size, limit)]
+        if verify_files:
+            sources.append(self.iter_stale(batch_size, limit))
+
+        for source in sources:
+            for rows in source:
+                totals['candidates'] += len(rows)
+                totals['downloaded'] += self.process_batch(rows)
+                print(f"  Processed {totals['candidates']} candidates, "
+                      f"downloaded {totals['downloaded']} | {self.scraper.rate_controller.format_stats()}")
+        return totals
+
+    def close(self):
+        if self.scraper.driver:
+            self.scraper.driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill missing ad assets")
+    parser.add_argument('--limit', type=int, default=None, help="Maximum rows to process")
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=int(os.getenv('ASSET_WORKERS', '8')))
+    parser.add_argument('--assets-dir', default='assets')
+    parser.add_argument('--verify-files', action='store_true',
+                        help="Also re-download assets whose local file is missing")
+    parser.add_argument('--no-resolve', action='store_true',
+                        help="Don't open a browser to refresh expired URLs")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Backfilling ad assets...")
+    print("=" * 60)
+
+    db = Database()
+    backfill = AssetBackfill(db, args.assets_dir, args.workers, resolve_expired=not args.no_resolve)
+
+    try:
+        totals = backfill.run(args.batch_size, args.limit, args.verify_files)
+        print(f"\n✓ Downloaded {totals['downloaded']} of {totals['candidates']} missing assets")
+    except KeyboardInterrupt:
+        print("\n✗ Interrupted")
+    finally:
+        backfill.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+End-to-end scraper benchmark against the local Ads Library stand-in.
+
+Starts mock_ads_library on a background thread, points the scraper at it
+and runs a full crawl through the browser, asset downloads and the
+configured sinks (PostgreSQL by default), then reports ads/sec and
+bytes/sec. With --browserless the feed is paginated over HTTP after a
+one-time browser bootstrap (feed_client) instead of by scrolling.
+
+Usage:
+    python benchmark.py [--ads 10000] [--batch-size 30] [--asset-latency 0.05]
+        [--error-rate 0.01] [--throttle-rate 0.01] [--json results.json]
+        [--browserless --streams 8]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_ads_library import MockAdsLibrary, start_server
+
+
+def run_benchmark(args) -> dict:
+    library = MockAdsLibrary(
+        total_ads=args.ads, batch_size=args.batch_size,
+        asset_latency=args.asset_latency, image_size=args.image_size,
+        video_size=args.video_size, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, token_ttl=args.token_ttl,
+    )
+    server = start_server(library, port=0)
+    os.environ['ADS_LIBRARY_BASE_URL'] = f"{library.base_url}/ads/library/"
+    os.environ.setdefault('SCROLL_PAUSE', str(args.scroll_pause))
+
+    if args.browserless:
+        return run_browserless_benchmark(args, library, server)
+
+    from facebook_ads_scraper import FacebookAdsScraper
+
+    assets_dir = tempfile.mkdtemp(prefix='adge-bench-assets-')
+    scraper = FacebookAdsScraper(max_ads=args.ads, assets_dir=assets_dir)
+    started = time.monotonic()
+    try:
+        ads = scraper.scrape_ads()
+    finally:
+        elapsed = time.monotonic() - started
+        scraper.close()
+        server.shutdown()
+        shutil.rmtree(assets_dir, ignore_errors=True)
+
+    served = library.stats()
+    return {
+        'ads_requested': args.ads,
+        'ads_scraped': len(ads),
+        'assets_downloaded': scraper.assets_downloaded,
+        'elapsed_seconds': round(elapsed, 2),
+        'ads_per_second': round(len(ads) / elapsed, 2) if elapsed else 0.0,
+        'bytes_per_second': round(served['asset_bytes'] / elapsed, 2) if elapsed else 0.0,
+        'server': served,
+        'pipeline': scraper.pipeline.stats(),
+        'rate_control': scraper.rate_controller.snapshot(),
+        'error': str(scraper.error) if scraper.error else None,
+    }
+
+
+def run_browserless_benchmark(args, library, server) -> dict:
+    from feed_client import BrowserlessCrawler
+    from sharded_crawl import media_shard_filters
+
+    # The stand-in serves image and video ads, so one stream per media type
+    shard_filters = media_shard_filters()[:2] if args.streams > 1 else [{}]
+    assets_dir = tempfile.mkdtemp(prefix='adge-bench-assets-')
+    crawler = BrowserlessCrawler('benchmark', shard_filters, streams=args.streams,
+                                 max_ads=args.ads, assets_dir=assets_dir)
+    try:
+        result = crawler.run()
+    finally:
+        crawler.close()
+        server.shutdown()
+        shutil.rmtree(assets_dir, ignore_errors=True)
+
+    served = library.stats()
+    elapsed = result['elapsed_seconds']
+    return {
+        'ads_requested': args.ads,
+        'ads_scraped': result['ads'],
+        'assets_downloaded': result['assets_downloaded'],
+        'elapsed_seconds': elapsed,
+        'ads_per_second': result['ads_per_second'],
+        'bytes_per_second': round(served['asset_bytes'] / elapsed, 2) if elapsed else 0.0,
+        'pages': result['pages'],
+        'session_refreshes': result['refreshes'],
+        'server': served,
+        'pipeline': crawler.scraper.pipeline.stats(),
+        'rate_control': crawler.scraper.rate_controller.snapshot(),
+        'error': result['error'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end scraper benchmark")
+    parser.add_argument('--ads', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=30)
+    parser.add_argument('--asset-latency', type=float, default=0.05)
+    parser.add_argument('--image-size', type=int, default=60000)
+    parser.add_argument('--video-size', type=int, default=500000)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--scroll-pause', type=float, default=0.5,
+                        help="Seconds to wait after each scroll (SCROLL_PAUSE)")
+    parser.add_argument('--browserless', action='store_true',
+                        help="Paginate the feed over HTTP instead of scrolling a browser")
+    parser.add_argument('--streams', type=int, default=2,
+                        help="Concurrent pagination streams in browserless mode")
+    parser.add_argument('--token-ttl', type=float, default=0.0,
+                        help="Expire session tokens after this many seconds (forces refreshes)")
+    parser.add_argument('--json', default=None, help="Also write results to this file")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"Benchmark: {args.ads} ads against local Ads Library stand-in")
+    print("=" * 60)
+
+    results = run_benchmark(args)
+
+    print("\n" + "=" * 60)
+    print(f"✓ Scraped {results['ads_scraped']} ads in {results['elapsed_seconds']}s")
+    print(f"  {results['ads_per_second']} ads/sec")
+    print(f"  {results['bytes_per_second'] / 1e6:.2f} MB/sec of assets")
+    print(f"  Server: {results['server']}")
+    print("=" * 60)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"✓ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
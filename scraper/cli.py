@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the scraper tools.
+
+Each subcommand runs the `main()` of the script that implements it, with
+the remaining arguments. A script is imported only when its command runs,
+and heavy dependencies (Selenium, requests, numpy, pyarrow) are imported
+inside the code paths that use them. Short report and maintenance runs
+then skip the imports they never use.
+
+`startup-check` guards this. It imports each command's module under
+`python -X importtime` in a fresh interpreter. It fails if the imports
+take longer than the budget (CLI_STARTUP_BUDGET_MS, default 200), or if
+a heavy dependency is loaded at startup by a command that does not declare
+it.
+
+Usage:
+    python cli.py scrape
+    python cli.py report
+    python cli.py diff [RUN_ID]
+    python cli.py export [output.parquet]
+    python cli.py workers assets [--limit 100]
+    python cli.py workers jobs run
+    python cli.py workers daemon run --browsers 2
+    python cli.py startup-check [--budget-ms 200] [--repeat 3]
+"""
+
+import argparse
+import importlib
+import os
+import sys
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+
+class Command(NamedTuple):
+    module: str
+    help: str
+    # Heavy dependencies the module is expected to import at startup
+    loads: Tuple[str, ...] = ()
+
+
+COMMANDS: Dict[str, Command] = {
+    'scrape': Command('scraper', "Scrape ads and generate the HTML report"),
+    'crawl': Command('sharded_crawl', "Sharded parallel crawl of one advertiser"),
+    'feed': Command('feed_client', "Browserless feed crawl of one advertiser", loads=('requests',)),
+    'sweep': Command('country_sweep', "Multi-country sweep of one advertiser"),
+    'report': Command('regenerate_report', "Regenerate the HTML report from the database"),
+    'diff': Command('run_diff', "Change report for a scrape run"),
+    'serve': Command('report_server', "Serve the report from an in-memory cache"),
+    'export': Command('export_parquet', "Export the ads table to Parquet"),
+    'search': Command('search', "Full-text search of ad copy"),
+    'analytics': Command('analytics', "Ad longevity and launch cadence analytics", loads=('numpy',)),
+    'audit': Command('asset_audit', "Audit and clean up the asset directory"),
+    'retention': Command('retention', "Archive cold ads and assets, restore them on demand"),
+    'benchmark': Command('benchmark', "End-to-end scraper benchmark"),
+}
+
+WORKERS: Dict[str, Command] = {
+    'assets': Command('asset_worker', "Backfill missing ad assets"),
+    'jobs': Command('job_worker', "Distributed scrape job queue"),
+    'daemon': Command('daemon', "Long-running scrape daemon"),
+}
+
+# Dependencies that must not be imported at startup unless a command declares them
+HEAVY_MODULES = ('selenium', 'webdriver_manager', 'requests', 'numpy', 'pyarrow', 'pandas')
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def find_command(name: str) -> Command:
+    """The command for `name` ('report', or 'workers assets' for a worker)."""
+    group, _, worker = name.partition(' ')
+    if group == 'workers':
+        return WORKERS[worker]
+    return COMMANDS[group]
+
+
+def load_command(name: str) -> Callable[[], None]:
+    """Import a command's module and return its `main`."""
+    return importlib.import_module(find_command(name).module).main
+
+
+def run_command(name: str, args: List[str]):
+    """Run a command's `main` as if its script was invoked with `args`."""
+    main = load_command(name)
+    sys.argv = [f"{os.path.basename(sys.argv[0])} {name}"] + args
+    main()
+
+
+def import_profile(name: str) -> Tuple[float, Set[str]]:
+    """Import time (ms) and the modules imported when loading a command, in a fresh interpreter."""
+    import subprocess
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import cli; cli.load_command({name!r})"],
+        cwd=HERE, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'no output'
+        raise RuntimeError(last_line)
+
+    total_us = 0
+    modules = set()
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, package = line[len('import time:'):].split('|')
+        modules.add(package.strip())
+        # Nested imports are indented and already counted in their parent
+        if not package[1:].startswith(' '):
+            total_us += int(cumulative)
+    return total_us / 1000, modules
+
+
+def startup_check(budget_ms: float, repeat: int = 3) -> List[str]:
+    """Problems found in the startup of every command (empty when all pass)."""
+    names = list(COMMANDS) + [f"workers {worker}" for worker in WORKERS]
+    problems = []
+
+    for name in names:
+        command = find_command(name)
+        try:
+            # The fastest of a few runs is the least disturbed by other load
+            profiles = [import_profile(name) for _ in range(max(1, repeat))]
+        except RuntimeError as e:
+            problems.append(f"{name}: import failed ({e})")
+            print(f"  ✗ {name:<16} import failed: {e}")
+            continue
+        elapsed_ms = min(ms for ms, _ in profiles)
+        modules = profiles[0][1]
+        heavy = sorted(
+            root for root in HEAVY_MODULES
+            if root not in command.loads and any(m == root or m.startswith(root + '.') for m in modules)
+        )
+
+        ok = elapsed_ms <= budget_ms and not heavy
+        status = '✓' if ok else '✗'
+        extra = f"  loads {', '.join(heavy)}" if heavy else ''
+        print(f"  {status} {name:<16} {elapsed_ms:7.1f} ms{extra}")
+        if elapsed_ms > budget_ms:
+            problems.append(f"{name}: imports take {elapsed_ms:.1f} ms (budget {budget_ms:.0f} ms)")
+        if heavy:
+            problems.append(f"{name}: imports {', '.join(heavy)} at startup")
+    return problems
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Facebook Ads Library scraper tools",
+        epilog="Run 'COMMAND --help' for a command's own options.",
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    for name, command in COMMANDS.items():
+        subparsers.add_parser(name, help=command.help, add_help=False)
+
+    workers_parser = subparsers.add_parser('workers', help="Background workers")
+    worker_subparsers = workers_parser.add_subparsers(dest='worker', required=True)
+    for name, command in WORKERS.items():
+        worker_subparsers.add_parser(name, help=command.help, add_help=False)
+
+    check_parser = subparsers.add_parser('startup-check', help="Enforce the startup import budget")
+    check_parser.add_argument('--budget-ms', type=float,
+                              default=float(os.getenv('CLI_STARTUP_BUDGET_MS', '200')),
+                              help="Maximum import time per command")
+    check_parser.add_argument('--repeat', type=int, default=3,
+                              help="Runs per command; the fastest counts")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    # Everything after the command name belongs to the command's own parser
+    split = 2 if argv[:1] == ['workers'] else 1
+    args = parser.parse_args(argv[:split] if argv[:1] != ['startup-check'] else argv)
+
+    if args.command == 'startup-check':
+        print(f"Startup import time per command (budget {args.budget_ms:.0f} ms):")
+        problems = startup_check(args.budget_ms, args.repeat)
+        if problems:
+            print(f"\n✗ {len(problems)} startup problem(s):")
+            for problem in problems:
+                print(f"  - {problem}")
+            sys.exit(1)
+        print("\n✓ Every command starts within budget")
+        return
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    name = 'workers ' + args.worker if args.command == 'workers' else args.command
+    run_command(name, argv[split:])
+
+
+if __name__ == "__main__":
+    main()
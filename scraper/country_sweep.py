@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Multi-country sweep of one advertiser.
+
+Crawls the target's feed for a list of countries in parallel and records
+which markets each ad ran in (`ad_countries`). Ads are extracted and their
+assets downloaded once, however many countries they appear in; presence
+rows are bulk-merged at the end. Countries swept recently are skipped.
+
+Usage:
+    python country_sweep.py PAGE_ID [--countries US,GB,DE,FR] [--parallel 4] [--max-age-hours 24]
+"""
+
+import argparse
+import os
+import sys
+from typing import Dict, Iterable, List
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from psycopg2.extras import execute_values
+from database import Database
+
+
+DEFAULT_COUNTRIES = 'US,GB,CA,AU,DE,FR,ES,IT,NL,BR,MX,JP,IN'
+
+
+class CountryPresence:
+    """Ad-to-country membership and sweep bookkeeping."""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def recently_swept(self, page_id: str, countries: List[str], max_age_hours: float) -> set:
+        """Countries swept for this page within the last `max_age_hours`."""
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute("""
+                SELECT country FROM country_sweeps
+                WHERE page_id = %s
+                  AND country = ANY(%s)
+                  AND swept_at > CURRENT_TIMESTAMP - %s * INTERVAL '1 hour'
+            """, (page_id, countries, max_age_hours))
+            return {row[0] for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
+
+    def merge_presence(self, country: str, ad_ids: Iterable[str]) -> int:
+        """Bulk upsert presence rows for one country."""
+        rows = [(ad_id, country) for ad_id in ad_ids]
+        if not rows:
+            return 0
+        cursor = self.db.conn.cursor()
+
+        try:
+            execute_values(cursor, """
+                INSERT INTO ad_countries (ad_id, country)
+                VALUES %s
+                ON CONFLICT (ad_id, country) DO UPDATE SET
+                    last_seen_at = CURRENT_TIMESTAMP
+            """, rows, page_size=1000)
+            self.db.conn.commit()
+            return len(rows)
+        except Exception as e:
+            print(f"✗ Error merging presence for {country}: {e}")
+            self.db.conn.rollback()
+            return 0
+        finally:
+            cursor.close()
+
+    def mark_swept(self, page_id: str, country: str, ads_seen: int):
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute("""
+                INSERT INTO country_sweeps (page_id, country, swept_at, ads_seen)
+                VALUES (%s, %s, CURRENT_TIMESTAMP, %s)
+                ON CONFLICT (page_id, country) DO UPDATE SET
+                    swept_at = EXCLUDED.swept_at,
+                    ads_seen = EXCLUDED.ads_seen
+            """, (page_id, country, ads_seen))
+            self.db.conn.commit()
+        except Exception as e:
+            print(f"✗ Error recording sweep of {country}: {e}")
+            self.db.conn.rollback()
+        finally:
+            cursor.close()
+
+    def countries_for(self, ad_id: str) -> List[str]:
+        """Countries an ad has been seen in."""
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute("""
+                SELECT country FROM ad_countries WHERE ad_id = %s ORDER BY country
+            """, (ad_id,))
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
+
+
+def sweep(page_id: str, countries: List[str], parallel: int = 4,
+          max_age_hours: float = 24, max_ads_per_country=None,
+          assets_dir: str = 'assets') -> Dict:
+    """Crawl every country not swept recently and record ad presence."""
+    from sharded_crawl import run_parallel_crawls
+
+    db = Database()
+    presence = CountryPresence(db)
+
+    try:
+        skipped = presence.recently_swept(page_id, countries, max_age_hours)
+        pending = [country for country in countries if country not in skipped]
+        if skipped:
+            print(f"  Skipping recently swept: {', '.join(sorted(skipped))}")
+        if not pending:
+            return {'ads': [], 'swept': [], 'skipped': sorted(skipped)}
+
+        result = run_parallel_crawls(
+            page_id, [{'country': country} for country in pending],
+            parallel=parallel, max_ads_per_shard=max_ads_per_country,
+            assets_dir=assets_dir,
+        )
+
+        swept = []
+        for scraper in result['scrapers']:
+            country = scraper.filters['country']
+            merged = presence.merge_presence(country, scraper.observed_ad_ids)
+            # Presence is complete only when the crawl reached the end of the
+            # country's feed; otherwise the next sweep crawls it again
+            if scraper.error is None and scraper.feed_exhausted:
+                presence.mark_swept(page_id, country, merged)
+                swept.append(country)
+                print(f"  {country}: {merged} ads present")
+            else:
+                print(f"  ⚠️  {country}: {merged} ads present (incomplete crawl, not marked as swept)")
+
+        return {'ads': result['ads'], 'swept': swept, 'skipped': sorted(skipped)}
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-country sweep of one advertiser")
+    parser.add_argument('page_id', help="Facebook page ID to sweep")
+    parser.add_argument('--countries', default=os.getenv('SWEEP_COUNTRIES', DEFAULT_COUNTRIES),
+                        help="Comma-separated ISO country codes")
+    parser.add_argument('--parallel', type=int, default=4, help="Concurrent browser sessions")
+    parser.add_argument('--max-age-hours', type=float, default=24,
+                        help="Skip countries swept more recently than this")
+    parser.add_argument('--max-ads-per-country', type=int, default=None)
+    parser.add_argument('--assets-dir', default='assets')
+    args = parser.parse_args()
+
+    countries = [c.strip().upper() for c in args.countries.split(',') if c.strip()]
+
+    print("=" * 60)
+    print(f"Country sweep of page {args.page_id}: {len(countries)} countries")
+    print("=" * 60)
+
+    result = sweep(
+        args.page_id, countries, parallel=args.parallel,
+        max_age_hours=args.max_age_hours,
+        max_ads_per_country=args.max_ads_per_country, assets_dir=args.assets_dir,
+    )
+
+    print("\n" + "=" * 60)
+    print(f"✓ Swept {len(result['swept'])} countries, skipped {len(result['skipped'])}; "
+          f"{len(result['ads'])} unique ads extracted")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Long-running scrape daemon with freshness-prioritized scheduling.
+
+Targets (a page ID plus optional Ads Library URL filters) are registered
+once, each with a minimum and maximum refresh interval. The daemon keeps a
+fixed set of browsers and database connections open and repeatedly
+re-crawls the target with the best expected freshness gain per second of
+browser time:
+
+    expected changes = (observed change rate + weight * active ads) * hours since last run
+    score            = expected changes / seconds the last run took
+
+Change rates come from each run's `ad_observations` (new ads plus ads
+whose status, dates, platforms or asset changed) and are smoothed with an
+exponential moving average. Targets that are never run, or whose
+maximum interval has passed, are always picked first. Dormant targets
+are left alone until they reach their maximum interval.
+
+SIGINT/SIGTERM stop the daemon gracefully: runs in progress finish and
+are recorded, then browsers and connections are closed. A second signal
+exits immediately.
+
+Usage:
+    python daemon.py add PAGE_ID [--filter country=GB] [--min-interval 1h] [--max-interval 7d] [--max-ads 500]
+    python daemon.py remove PAGE_ID [--filter country=GB]
+    python daemon.py list
+    python daemon.py run [--browsers 2]
+"""
+
+import argparse
+import json
+import math
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from psycopg2.extras import RealDictCursor
+from database import Database
+
+
+INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Observation fields that count towards a target's change rate
+CHANGE_FIELDS = ('status', 'end_date', 'platforms', 'disappeared')
+
+
+def parse_interval(value: str) -> int:
+    """Parse an interval such as `90`, `30m`, `6h` or `7d` into seconds."""
+    value = value.strip().lower()
+    if value and value[-1] in INTERVAL_UNITS:
+        return int(float(value[:-1]) * INTERVAL_UNITS[value[-1]])
+    return int(value)
+
+
+class TargetScheduler:
+    """Registered targets, their observed change rates and refresh scores."""
+
+    def __init__(self, db: Database):
+        self.db = db
+        # Expected changes per hour contributed by each active ad
+        self.active_weight = float(os.getenv('SCHEDULER_ACTIVE_WEIGHT', '0.01'))
+        # Smoothing factor for the change-rate moving average
+        self.rate_smoothing = float(os.getenv('SCHEDULER_RATE_SMOOTHING', '0.3'))
+        # Don't spend browser time on targets expected to have changed less than this
+        self.min_expected_changes = float(os.getenv('SCHEDULER_MIN_EXPECTED_CHANGES', '0.5'))
+
+    def add_target(self, page_id: str, filters: Optional[Dict] = None,
+                   min_interval: int = 3600, max_interval: int = 604800,
+                   max_ads: Optional[int] = None) -> int:
+        """Register (or re-enable and update) a target and return its ID."""
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute("""
+                INSERT INTO scrape_targets (page_id, filters, min_interval_seconds, max_interval_seconds, max_ads)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (page_id, filters) DO UPDATE SET
+                    min_interval_seconds = EXCLUDED.min_interval_seconds,
+                    max_interval_seconds = EXCLUDED.max_interval_seconds,
+                    max_ads = EXCLUDED.max_ads,
+                    enabled = TRUE
+                RETURNING id
+            """, (page_id, json.dumps(filters or {}), min_interval, max_interval, max_ads))
+            target_id = cursor.fetchone()[0]
+            self.db.conn.commit()
+            return target_id
+        except Exception:
+            self.db.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def disable_target(self, page_id: str, filters: Optional[Dict] = None) -> bool:
+        """Stop scheduling a target (its statistics are kept)."""
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute("""
+                UPDATE scrape_targets SET enabled = FALSE
+                WHERE page_id = %s AND filters = %s::jsonb
+            """, (page_id, json.dumps(filters or {})))
+            disabled = cursor.rowcount > 0
+            self.db.conn.commit()
+            return disabled
+        except Exception:
+            self.db.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def targets(self) -> List[Dict]:
+        """All enabled targets, with seconds since their last run."""
+        cursor = self.db.conn.cursor(cursor_factory=RealDictCursor)
+
+        try:
+            cursor.execute("""
+                SELECT *, EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - last_run_at)::float8 AS elapsed_seconds
+                FROM scrape_targets
+                WHERE enabled
+                ORDER BY id
+            """)
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
+
+    def score(self, target: Dict) -> float:
+        """Expected changes caught per second of browser time.
+
+        Returns -1 while a target is inside its minimum interval and
+        infinity when it has never run or is past its maximum interval.
+        """
+        elapsed = target['elapsed_seconds']
+        if elapsed is None or elapsed >= target['max_interval_seconds']:
+            return math.inf
+        if elapsed < target['min_interval_seconds']:
+            return -1.0
+        return self.expected_changes(target) / max(target['last_duration_seconds'] or 1.0, 1.0)
+
+    def expected_changes(self, target: Dict) -> float:
+        """Changes expected to have accumulated since the target's last run."""
+        if target['elapsed_seconds'] is None:
+            return math.inf
+        rate = (target['change_rate'] or 0.0) + self.active_weight * target['active_ads']
+        return rate * target['elapsed_seconds'] / 3600
+
+    def next_target(self, exclude=()) -> Optional[Dict]:
+        """Highest-scoring target worth running now, or None."""
+        best, best_key = None, None
+        for target in self.targets():
+            if target['id'] in exclude:
+                continue
+            score = self.score(target)
+            if score < 0:
+                continue
+            if not math.isinf(score) and self.expected_changes(target) < self.min_expected_changes:
+                continue
+            # Among due targets, the most overdue (never-run first) goes first
+            elapsed = target['elapsed_seconds']
+            key = (score, math.inf if elapsed is None else elapsed)
+            if best is None or key > best_key:
+                best, best_key = target, key
+        return best
+
+    def record_run(self, target: Dict, run_id: Optional[int], status: str, duration: float):
+        """Update a target's change rate, active-ad count and cost after a run."""
+        changes, active_ads = self._run_changes(run_id) if run_id is not None else (0, 0)
+
+        change_rate = target['change_rate']
+        elapsed = target['elapsed_seconds']
+        # Only a complete run says anything about how fast the target changes
+        if status == 'completed' and elapsed:
+            observed = changes / (elapsed / 3600)
+            if change_rate is None:
+                change_rate = observed
+            else:
+                change_rate = self.rate_smoothing * observed + (1 - self.rate_smoothing) * change_rate
+
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute("""
+                UPDATE scrape_targets SET
+                    runs = runs + 1,
+                    last_run_id = %s,
+                    last_run_at = CURRENT_TIMESTAMP,
+                    last_status = %s,
+                    last_duration_seconds = %s,
+                    last_changes = %s,
+                    change_rate = %s,
+                    active_ads = CASE WHEN %s = 'completed' THEN %s ELSE active_ads END
+                WHERE id = %s
+            """, (run_id, status, duration, changes, change_rate, status, active_ads, target['id']))
+            self.db.conn.commit()
+        except Exception as e:
+            print(f"✗ Error recording run for target {target['id']}: {e}")
+            self.db.conn.rollback()
+        finally:
+            cursor.close()
+
+    def _run_changes(self, run_id: int):
+        """(new or changed ads, active ads) observed in one run."""
+        cursor = self.db.conn.cursor()
+
+        try:
+            # asset_url is left out: observations recorded before asset URLs were
+            # compared by asset_key list a change for every re-signed URL
+            cursor.execute("""
+                SELECT
+                    COUNT(*) FILTER (WHERE o.is_new OR o.changed_fields && %s::text[]),
+                    COUNT(*) FILTER (WHERE a.status = 'active')
+                FROM ad_observations o
+                LEFT JOIN ads a ON a.ad_id = o.ad_id
+                WHERE o.run_id = %s
+            """, (list(CHANGE_FIELDS), run_id))
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
+
+
+class ScrapeDaemon:
+    """Warm browsers pulling the best target from the scheduler until stopped."""
+
+    def __init__(self, browsers: int = 1, assets_dir: str = 'assets', idle_poll: float = 30.0):
+        self.browsers = max(1, browsers)
+        self.assets_dir = assets_dir
+        self.idle_poll = idle_poll
+        self.stop_event = threading.Event()
+        self.db = Database()
+        self.scheduler = TargetScheduler(self.db)
+        # Scheduler queries and the running set are shared by all workers
+        self._lock = threading.Lock()
+        self._running = set()
+
+    def request_stop(self, signum=None, frame=None):
+        if self.stop_event.is_set():
+            print("\n✗ Second signal received, exiting now")
+            os._exit(1)
+        name = signal.Signals(signum).name if signum else 'stop'
+        print(f"\n⏹  {name} received; finishing runs in progress (signal again to exit now)")
+        self.stop_event.set()
+
+    def _claim(self) -> Optional[Dict]:
+        with self._lock:
+            target = self.scheduler.next_target(exclude=self._running)
+            if target is not None:
+                self._running.add(target['id'])
+            return target
+
+    def _release(self, target: Dict, run_id: Optional[int], status: str, duration: float):
+        with self._lock:
+            self.scheduler.record_run(target, run_id, status, duration)
+            self._running.discard(target['id'])
+
+    def _worker(self, index: int):
+        from facebook_ads_scraper import FacebookAdsScraper
+        from sinks import PostgresSink, build_sink
+
+        # One browser, one sink (and its database connection) per worker, reused across runs
+        sink = build_sink()
+        postgres_sink = sink.find(PostgresSink)
+        scraper = FacebookAdsScraper(
+            assets_dir=self.assets_dir, sink=sink, manage_run=False, keep_browser=True,
+        )
+
+        try:
+            while not self.stop_event.is_set():
+                target = self._claim()
+                if target is None:
+                    self.stop_event.wait(self.idle_poll)
+                    continue
+
+                print(f"\n▶ [browser {index}] Target {target['id']}: page {target['page_id']} "
+                      f"{target['filters'] or ''} (last run {_format_age(target['elapsed_seconds'])} ago)")
+                scraper.retarget(
+                    target['page_id'], target['filters'],
+                    max_ads=target['max_ads'] or int(os.getenv('MAX_ADS', '50')),
+                )
+                started = time.monotonic()
+                sink.begin_run(target['page_id'], target['filters'])
+                run_id = postgres_sink.run_id if postgres_sink is not None else None
+                status = 'failed'
+                try:
+                    scraper.scrape_ads()
+                    status = 'completed' if scraper.error is None else 'failed'
+                    if status == 'completed':
+                        scraper.reconcile_missing()
+                finally:
+                    sink.end_run(status)
+                    duration = time.monotonic() - started
+                    self._release(target, run_id, status, duration)
+                print(f"✓ [browser {index}] Target {target['id']} {status} in {duration:.0f}s, "
+                      f"{len(scraper.scraped_ads)} ads")
+        finally:
+            scraper.close()
+
+    def run(self):
+        """Run until signalled."""
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGTERM, self.request_stop)
+        print(f"✓ Daemon started with {self.browsers} browser(s)")
+
+        threads = [
+            threading.Thread(target=self._worker, args=(i,), name=f"daemon-{i}")
+            for i in range(self.browsers)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            # Wake up periodically so signals are handled promptly
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1)
+        finally:
+            self.db.close()
+            print("✓ Daemon stopped")
+
+
+def _format_age(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return 'never'
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size:
+            return f"{seconds / size:.1f}{unit}"
+    return f"{seconds:.0f}s"
+
+
+def _parse_filters(items: List[str]) -> Dict:
+    filters = {}
+    for item in items:
+        key, _, value = item.partition('=')
+        filters[key] = value
+    return filters
+
+
+def add(args):
+    db = Database()
+    try:
+        target_id = TargetScheduler(db).add_target(
+            args.page_id, _parse_filters(args.filter),
+            min_interval=parse_interval(args.min_interval),
+            max_interval=parse_interval(args.max_interval),
+            max_ads=args.max_ads,
+        )
+        print(f"✓ Target {target_id} scheduled for page {args.page_id}")
+    finally:
+        db.close()
+
+
+def remove(args):
+    db = Database()
+    try:
+        if TargetScheduler(db).disable_target(args.page_id, _parse_filters(args.filter)):
+            print(f"✓ Stopped scheduling page {args.page_id}")
+        else:
+            print(f"✗ No target for page {args.page_id} with those filters")
+    finally:
+        db.close()
+
+
+def list_targets(args):
+    db = Database()
+    try:
+        scheduler = TargetScheduler(db)
+        targets = scheduler.targets()
+        if not targets:
+            print("No targets scheduled")
+            return
+        targets.sort(key=scheduler.score, reverse=True)
+        for target in targets:
+            score = scheduler.score(target)
+            score_text = 'due' if math.isinf(score) else ('wait' if score < 0 else f"{score:.4f}")
+            rate = target['change_rate']
+            print(f"  {target['id']:>4}  {target['page_id']:<20} {json.dumps(target['filters']):<24} "
+                  f"last {_format_age(target['elapsed_seconds']):>6}  "
+                  f"rate {rate if rate is not None else 0:.2f}/h  active {target['active_ads']:>5}  "
+                  f"score {score_text}")
+    finally:
+        db.close()
+
+
+def run(args):
+    print("=" * 60)
+    print(f"Scrape daemon ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')})")
+    print("=" * 60)
+    ScrapeDaemon(browsers=args.browsers, assets_dir=args.assets_dir, idle_poll=args.poll).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-running scrape daemon")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help="Schedule a target")
+    add_parser.add_argument('page_id', help="Facebook page ID to scrape")
+    add_parser.add_argument('--filter', action='append', default=[],
+                            help="Ads Library URL filter as key=value (repeatable)")
+    add_parser.add_argument('--min-interval', default='1h', help="Never re-crawl sooner than this")
+    add_parser.add_argument('--max-interval', default='7d', help="Always re-crawl after this")
+    add_parser.add_argument('--max-ads', type=int, default=None)
+    add_parser.set_defaults(func=add)
+
+    remove_parser = subparsers.add_parser('remove', help="Stop scheduling a target")
+    remove_parser.add_argument('page_id')
+    remove_parser.add_argument('--filter', action='append', default=[])
+    remove_parser.set_defaults(func=remove)
+
+    list_parser = subparsers.add_parser('list', help="Show targets by current score")
+    list_parser.set_defaults(func=list_targets)
+
+    run_parser = subparsers.add_parser('run', help="Run the daemon until signalled")
+    run_parser.add_argument('--browsers', type=int, default=int(os.getenv('DAEMON_BROWSERS', '1')),
+                            help="Concurrent warm browsers")
+    run_parser.add_argument('--poll', type=float, default=30.0,
+                            help="Seconds to wait when no target is worth running")
+    run_parser.add_argument('--assets-dir', default='assets')
+    run_parser.set_defaults(func=run)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,21 @@ Database connection and schema setup for ads storage.
 
 import psycopg2
 import os
-from typing import Optional
-from psycopg2.extras import RealDictCursor
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from psycopg2.extras import RealDictCursor, execute_values
+from migrations import migrate
+
+
+# Columns that can be selected through the query API
+AD_COLUMNS = (
+    'id', 'ad_id', 'status', 'platforms', 'start_date', 'end_date',
+    'asset_url', 'asset_type', 'asset_path', 'multiple_versions',
+    'body_text', 'headline', 'cta_text', 'link_url',
+    'scraped_at', 'created_at', 'updated_at',
+)
+
+# Expression covered by the trigram index, used for fuzzy search
+SEARCH_TEXT_EXPR = "(COALESCE(headline, '') || ' ' || COALESCE(body_text, ''))"
 
 
 class Database:
@@ -32,85 +45,53 @@ class Database:
             raise
     
     def create_schema(self):
-        """Create the ads table if it doesn't exist."""
+        """Bring the schema up to date by applying pending migrations.
+        
+        An up-to-date database costs one version lookup, whatever the size of the ads table.
+        """
+        try:
+            version = migrate(self.conn)
+        except Exception as e:
+            print(f"✗ Error with schema: {e}")
+            print("   If the database user can't create tables, run the migrations once as the owner.")
+            raise
+        
+        count = self.estimated_ad_count()
+        count_text = f"~{count}" if count is not None else "not yet analyzed"
+        print(f"✓ Database schema at version {version} (ads: {count_text})")
+    
+    def estimated_ad_count(self) -> Optional[int]:
+        """Planner estimate of the ads row count (no table scan).
+        
+        Returns None if the table hasn't been vacuumed or analyzed yet.
+        """
         cursor = self.conn.cursor()
         
         try:
-            # Check if table already exists
             cursor.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = 'ads'
-                )
+                SELECT reltuples::bigint FROM pg_class
+                WHERE oid = to_regclass('ads')
             """)
-            table_exists = cursor.fetchone()[0]
-            
-            if table_exists:
-                print("✓ Ads table already exists, skipping creation")
-            else:
-                # Try to create table
-                try:
-                    cursor.execute("""
-                        CREATE TABLE ads (
-                            id SERIAL PRIMARY KEY,
-                            ad_id VARCHAR(255) UNIQUE NOT NULL,
-                            status VARCHAR(50) NOT NULL,
-                            platforms TEXT[],
-                            start_date DATE,
-                            end_date DATE,
-                            asset_url TEXT,
-                            asset_type VARCHAR(50),
-                            asset_path TEXT,
-                            multiple_versions BOOLEAN DEFAULT FALSE,
-                            scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                    """)
-                    
-                    # Create indexes
-                    cursor.execute("""
-                        CREATE INDEX idx_ad_id ON ads(ad_id)
-                    """)
-                    cursor.execute("""
-                        CREATE INDEX idx_status ON ads(status)
-                    """)
-                    cursor.execute("""
-                        CREATE INDEX idx_start_date ON ads(start_date)
-                    """)
-                    cursor.execute("""
-                        CREATE INDEX idx_platforms ON ads USING GIN(platforms)
-                    """)
-                    
-                    self.conn.commit()
-                    print("✓ Database schema created")
-                except Exception as create_error:
-                    print(f"⚠️  Could not create table: {create_error}")
-                    print("   The table needs to be created manually as postgres user.")
-                    self.conn.rollback()
-                    raise Exception("Table does not exist and could not be created. Please create it manually.")
-            
-            # Verify table exists and is accessible
-            cursor.execute("SELECT COUNT(*) FROM ads")
-            count = cursor.fetchone()[0]
-            print(f"✓ Database schema verified (current ads: {count})")
-            
-        except Exception as e:
-            print(f"✗ Error with schema: {e}")
+            row = cursor.fetchone()
+            self.conn.commit()
+            if row is None or row[0] < 0:
+                return None
+            return row[0]
+        except Exception:
             self.conn.rollback()
-            raise
+            return None
         finally:
             cursor.close()
     
-    def insert_ad(self, ad_data: dict) -> Optional[int]:
-        """Insert or update an ad in the database."""
+    def insert_ad(self, ad_data: dict, page_id: Optional[str] = None) -> Optional[int]:
+        """Insert or update an ad in the database, marking it seen now."""
         cursor = self.conn.cursor()
         
         try:
             cursor.execute("""
-                INSERT INTO ads (ad_id, status, platforms, start_date, end_date, asset_url, asset_type, asset_path, multiple_versions)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                INSERT INTO ads (ad_id, status, platforms, start_date, end_date, asset_url, asset_type, asset_path, multiple_versions,
+                                 body_text, headline, cta_text, link_url, page_id, last_seen_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
                 ON CONFLICT (ad_id) DO UPDATE SET
                     status = EXCLUDED.status,
                     platforms = EXCLUDED.platforms,
@@ -118,8 +99,20 @@ class Database:
                     end_date = EXCLUDED.end_date,
                     asset_url = EXCLUDED.asset_url,
                     asset_type = EXCLUDED.asset_type,
-                    asset_path = EXCLUDED.asset_path,
+                    -- A rescrape without a download keeps the backfilled path, unless the asset
+                    -- changed (asset_key ignores the URL signature, which changes every load)
+                    asset_path = CASE WHEN asset_key(EXCLUDED.asset_url) IS DISTINCT FROM asset_key(ads.asset_url)
+                                      THEN EXCLUDED.asset_path
+                                      ELSE COALESCE(EXCLUDED.asset_path, ads.asset_path) END,
                     multiple_versions = EXCLUDED.multiple_versions,
+                    body_text = EXCLUDED.body_text,
+                    headline = EXCLUDED.headline,
+                    cta_text = EXCLUDED.cta_text,
+                    link_url = EXCLUDED.link_url,
+                    page_id = COALESCE(EXCLUDED.page_id, ads.page_id),
+                    last_seen_at = EXCLUDED.last_seen_at,
+                    disappeared_at = NULL,
+                    archived_at = NULL,
                     updated_at = CURRENT_TIMESTAMP
                 RETURNING id
             """, (
@@ -131,7 +124,12 @@ class Database:
                 ad_data.get('asset_url'),
                 ad_data.get('asset_type', 'image'),
                 ad_data.get('asset_path'),
-                ad_data.get('multiple_versions', False)
+                ad_data.get('multiple_versions', False),
+                ad_data.get('body_text'),
+                ad_data.get('headline'),
+                ad_data.get('cta_text'),
+                ad_data.get('link_url'),
+                page_id
             ))
             
             result = cursor.fetchone()
@@ -144,6 +142,55 @@ class Database:
         finally:
             cursor.close()
     
+    def upsert_ads(self, cursor, ads: List[dict], page_id: Optional[str] = None):
+        """Insert or update many ads with one statement, marking them seen now (caller commits)."""
+        execute_values(cursor, """
+            INSERT INTO ads (ad_id, status, platforms, start_date, end_date, asset_url, asset_type, asset_path, multiple_versions,
+                             body_text, headline, cta_text, link_url, page_id, last_seen_at)
+            VALUES %s
+            ON CONFLICT (ad_id) DO UPDATE SET
+                status = EXCLUDED.status,
+                platforms = EXCLUDED.platforms,
+                start_date = EXCLUDED.start_date,
+                end_date = EXCLUDED.end_date,
+                asset_url = EXCLUDED.asset_url,
+                asset_type = EXCLUDED.asset_type,
+                -- A rescrape without a download keeps the backfilled path, unless the asset
+                -- changed (asset_key ignores the URL signature, which changes every load)
+                asset_path = CASE WHEN asset_key(EXCLUDED.asset_url) IS DISTINCT FROM asset_key(ads.asset_url)
+                                  THEN EXCLUDED.asset_path
+                                  ELSE COALESCE(EXCLUDED.asset_path, ads.asset_path) END,
+                multiple_versions = EXCLUDED.multiple_versions,
+                body_text = EXCLUDED.body_text,
+                headline = EXCLUDED.headline,
+                cta_text = EXCLUDED.cta_text,
+                link_url = EXCLUDED.link_url,
+                page_id = COALESCE(EXCLUDED.page_id, ads.page_id),
+                last_seen_at = EXCLUDED.last_seen_at,
+                disappeared_at = NULL,
+                archived_at = NULL,
+                updated_at = CURRENT_TIMESTAMP
+        """, [
+            (
+                ad_data.get('ad_id'),
+                ad_data.get('status', 'unknown'),
+                ad_data.get('platforms', []),
+                ad_data.get('start_date'),
+                ad_data.get('end_date'),
+                ad_data.get('asset_url'),
+                ad_data.get('asset_type', 'image'),
+                ad_data.get('asset_path'),
+                ad_data.get('multiple_versions', False),
+                ad_data.get('body_text'),
+                ad_data.get('headline'),
+                ad_data.get('cta_text'),
+                ad_data.get('link_url'),
+                page_id
+            )
+            for ad_data in ads
+        ], template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)",
+           page_size=1000)
+    
     def get_all_ads(self) -> list:
         """Get all ads from the database."""
         cursor = self.conn.cursor(cursor_factory=RealDictCursor)
@@ -160,6 +207,137 @@ class Database:
         finally:
             cursor.close()
     
+    def _ad_filters(self, status: Optional[str] = None,
+                    platform: Optional[Union[str, Sequence[str]]] = None,
+                    start_date_from=None, start_date_to=None,
+                    multiple_versions: Optional[bool] = None,
+                    include_archived: bool = False) -> Tuple[List[str], list]:
+        """Build WHERE clauses and parameters for ad filters.
+        
+        Archived stubs (see retention.py) are left out unless include_archived.
+        """
+        clauses = []
+        params = []
+        
+        if not include_archived:
+            clauses.append("archived_at IS NULL")
+        
+        if status is not None:
+            clauses.append("status = %s")
+            params.append(status)
+        
+        if platform is not None:
+            # Array containment/overlap operators can use the GIN index on platforms
+            if isinstance(platform, str):
+                clauses.append("platforms @> ARRAY[%s]::text[]")
+                params.append(platform)
+            else:
+                clauses.append("platforms && %s::text[]")
+                params.append(list(platform))
+        
+        if start_date_from is not None:
+            clauses.append("start_date >= %s")
+            params.append(start_date_from)
+        
+        if start_date_to is not None:
+            clauses.append("start_date <= %s")
+            params.append(start_date_to)
+        
+        if multiple_versions is not None:
+            clauses.append("multiple_versions = %s")
+            params.append(multiple_versions)
+        
+        return clauses, params
+    
+    def _select_ads(self, selected: List[str], clauses: List[str], params: list,
+                    limit: int) -> List[Dict]:
+        """One keyset-ordered page of ads matching all clauses (errors are raised)."""
+        cursor = self.conn.cursor(cursor_factory=RealDictCursor)
+        
+        try:
+            cursor.execute(f"""
+                SELECT {', '.join(selected)}
+                FROM ads
+                WHERE {' AND '.join(clauses)}
+                ORDER BY start_date DESC NULLS LAST, id DESC
+                LIMIT %s
+            """, params + [limit])
+            rows = [dict(row) for row in cursor.fetchall()]
+            self.conn.commit()
+            return rows
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    
+    def query_ads(self, columns: Optional[Sequence[str]] = None, after: Optional[tuple] = None,
+                  limit: int = 100, **filters) -> Tuple[List[Dict], Optional[tuple]]:
+        """Fetch one page of ads, newest start_date first.
+        
+        Args:
+            columns: Columns to return (defaults to all of AD_COLUMNS)
+            after: Cursor returned by the previous page, a (start_date, id) tuple
+            limit: Page size
+            **filters: status, platform (name or list of names), start_date_from,
+                start_date_to, multiple_versions, include_archived
+        
+        Returns:
+            (rows, next_cursor), where next_cursor is None on the last page
+        """
+        columns = list(columns or AD_COLUMNS)
+        unknown = [column for column in columns if column not in AD_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown ad columns: {', '.join(unknown)}")
+        
+        # The cursor needs start_date and id even if the caller didn't ask for them
+        selected = columns + [key for key in ('start_date', 'id') if key not in columns]
+        
+        clauses, params = self._ad_filters(**filters)
+        
+        # Dated ads come first, then undated ones (NULLS LAST). Each phase is a
+        # range seek on idx_start_date_id; an OR across them would rescan the index.
+        rows = []
+        after_date, after_id = after if after is not None else (None, None)
+        if after is None or after_date is not None:
+            dated_clauses = clauses + ["start_date IS NOT NULL"]
+            dated_params = list(params)
+            if after is not None:
+                dated_clauses.append("(start_date, id) < (%s, %s)")
+                dated_params.extend([after_date, after_id])
+            rows = self._select_ads(selected, dated_clauses, dated_params, limit)
+            # Undated ads start from the top once the dated ones run out
+            after_id = None
+        
+        if len(rows) < limit:
+            undated_clauses = clauses + ["start_date IS NULL"]
+            undated_params = list(params)
+            if after_id is not None:
+                undated_clauses.append("id < %s")
+                undated_params.append(after_id)
+            rows += self._select_ads(selected, undated_clauses, undated_params, limit - len(rows))
+        
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = (rows[-1]['start_date'], rows[-1]['id'])
+        
+        if len(selected) != len(columns):
+            for row in rows:
+                for key in selected[len(columns):]:
+                    del row[key]
+        
+        return rows, next_cursor
+    
+    def iter_ads(self, columns: Optional[Sequence[str]] = None, batch_size: int = 1000,
+                 **filters) -> Iterator[Dict]:
+        """Stream matching ads page by page (see query_ads for arguments)."""
+        after = None
+        while True:
+            rows, after = self.query_ads(columns=columns, after=after, limit=batch_size, **filters)
+            yield from rows
+            if after is None:
+                return
+    
     def close(self):
         """Close the database connection."""
         if self.conn:
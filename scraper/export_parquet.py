@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Export the ads table to a Parquet file.
+
+Rows are streamed from PostgreSQL through a server-side cursor and written
+one row group at a time, so memory use does not depend on table size.
+"""
+
+import os
+import sys
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import Database
+from sinks import ParquetSink, PARQUET_COLUMNS
+
+
+def export_ads_to_parquet(db: Database, output_path: str, batch_size: int = 10000) -> int:
+    """Stream the ads table into a Parquet file.
+
+    Returns:
+        Number of rows exported
+    """
+    sink = ParquetSink(output_path, row_group_size=batch_size)
+    cursor = db.conn.cursor(name='export_ads_parquet')
+    cursor.itersize = batch_size
+    total = 0
+
+    try:
+        cursor.execute(f"""
+            SELECT {', '.join(PARQUET_COLUMNS)}
+            FROM ads
+        """)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            sink.write_batch([dict(zip(PARQUET_COLUMNS, row)) for row in rows])
+            total += len(rows)
+            print(f"  Exported {total} rows...")
+    finally:
+        cursor.close()
+        sink.close()
+        db.conn.rollback()
+
+    return total
+
+
+def main():
+    """Export the ads table to Parquet."""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    output_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join('exports', f'ads_{timestamp}.parquet')
+    batch_size = int(os.getenv('PARQUET_ROW_GROUP_SIZE', '10000'))
+
+    print("=" * 60)
+    print("Exporting ads table to Parquet...")
+    print("=" * 60)
+
+    db = Database()
+
+    try:
+        total = export_ads_to_parquet(db, output_path, batch_size)
+        print(f"\n✓ Exported {total} ads to {os.path.abspath(output_path)}")
+    except Exception as e:
+        print(f"\n✗ Error exporting ads: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
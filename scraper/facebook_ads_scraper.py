@@ -2,49 +2,184 @@
 """
 Facebook Ads Library scraper for Nike ads.
 Scrapes up to 50 ads and stores them in PostgreSQL database.
+
+Selenium, webdriver-manager and requests are imported where they are used,
+so modules that only need the URL helpers stay cheap to import.
 """
 
 import os
-import sys
 import time
 import re
-import requests
+import threading
 from datetime import datetime
 from typing import List, Dict, Optional
-from urllib.parse import urlparse
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from webdriver_manager.chrome import ChromeDriverManager
-from dotenv import load_dotenv
+from urllib.parse import urlparse, urlencode, parse_qs
+
+from pipeline import ScrapePipeline
+from rate_control import AdaptiveRateController, ThrottledError
+from selector_plan import get_selector_plan
+from sinks import AdSink, PostgresSink, build_sink
+
+
+def is_throttle_error(error: Exception) -> bool:
+    """Whether a fetch error signals overload/throttling and is worth retrying."""
+    import requests
+    from selenium.common.exceptions import TimeoutException
+
+    if isinstance(error, (ThrottledError, requests.Timeout, requests.ConnectionError, TimeoutException)):
+        return True
+    response = getattr(error, 'response', None)
+    status_code = getattr(response, 'status_code', None)
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+
+# Nike's page, scraped when no target is given
+DEFAULT_PAGE_ID = '15087023444'
+
+# Ads Library query parameters used unless a target overrides them
+DEFAULT_FILTERS = {
+    'active_status': 'all',
+    'ad_type': 'all',
+    'country': 'US',
+    'is_targeted_country': 'false',
+    'media_type': 'all',
+    'search_type': 'page',
+}
+
+# Marker shown once the feed has no more ads (override with FEED_END_XPATH)
+FEED_END_XPATH = "//*[@id='end-of-feed' or normalize-space(text())='End of results']"
 
-# Load environment variables
-load_dotenv()
 
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+def ads_library_base_url() -> str:
+    """Ads Library endpoint; override with ADS_LIBRARY_BASE_URL (e.g. a local stand-in server)."""
+    return os.getenv('ADS_LIBRARY_BASE_URL', 'https://www.facebook.com/ads/library/')
+
+
+def build_ads_url(page_id: str = DEFAULT_PAGE_ID, filters: Optional[Dict] = None) -> str:
+    """Build the Ads Library URL for a page, applying filter overrides."""
+    params = dict(DEFAULT_FILTERS)
+    params.update(filters or {})
+    params['view_all_page_id'] = page_id
+    return ads_library_base_url() + "?" + urlencode(params)
+
+
+def build_ad_url(ad_id: str) -> str:
+    """Ads Library URL showing a single ad."""
+    return ads_library_base_url() + "?" + urlencode({'id': ad_id})
+
+
+class SeenAdIds:
+    """Thread-safe set of ad IDs, shareable between parallel crawls."""
+    
+    def __init__(self):
+        self._ids = set()
+        self._lock = threading.Lock()
+    
+    def __contains__(self, ad_id: str) -> bool:
+        return ad_id in self._ids
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+    
+    def add_if_new(self, ad_id: str) -> bool:
+        """Add an ID; returns False if it was already present."""
+        with self._lock:
+            if ad_id in self._ids:
+                return False
+            self._ids.add(ad_id)
+            return True
+
 
-from database import Database
+class ScrapedAd:
+    """Compact in-memory record kept for each ad during long crawls.
+    
+    The full ad dict is flushed to the sinks; only what is needed for the
+    final summary stays in memory.
+    """
+    
+    __slots__ = ('ad_id', 'status')
+    
+    def __init__(self, ad_id: str, status: str):
+        self.ad_id = ad_id
+        self.status = status
+    
+    def get(self, key: str, default=None):
+        """Dict-style access so callers can treat records like ad dicts."""
+        return getattr(self, key, default) if key in self.__slots__ else default
 
 
 class FacebookAdsScraper:
     """Scraper for Facebook Ads Library."""
     
-    def __init__(self, max_ads: int = 50, assets_dir: str = "assets"):
+    def __init__(self, max_ads: Optional[int] = 50, assets_dir: str = "assets", sink: Optional[AdSink] = None,
+                 long_crawl: Optional[bool] = None,
+                 rate_controller: Optional[AdaptiveRateController] = None,
+                 page_id: str = DEFAULT_PAGE_ID, filters: Optional[Dict] = None,
+                 seen_ad_ids: Optional[SeenAdIds] = None, manage_run: bool = True,
+                 keep_browser: bool = False, expand_versions: Optional[bool] = None,
+                 stop_event: Optional[threading.Event] = None):
+        # Ads this crawl's feed may show; None means no limit: crawl until the feed runs out
         self.max_ads = max_ads
-        self.ads_url = (
-            "https://www.facebook.com/ads/library/"
-            "?active_status=all&ad_type=all&country=US&is_targeted_country=false"
-            "&media_type=all&search_type=page&view_all_page_id=15087023444"
-        )
-        self.db = Database()
+        # Long-crawl mode prunes processed containers from the DOM, recycles the
+        # browser when it grows too large and keeps only compact records in memory
+        if long_crawl is None:
+            long_crawl = os.getenv('LONG_CRAWL', 'false').lower() == 'true'
+        self.long_crawl = long_crawl
+        self.browser_memory_limit_mb = int(os.getenv('BROWSER_MEMORY_LIMIT_MB', '1024'))
+        self.scroll_pause = float(os.getenv('SCROLL_PAUSE', '2'))
+        self.page_id = page_id
+        self.filters = dict(filters or {})
+        self.ads_url = build_ads_url(page_id, self.filters)
+        # Whether this scraper opens/closes its own scrape run in the sinks
+        # (parallel crawls share one run managed by the caller)
+        self.manage_run = manage_run
+        # Keep the browser open between scrape_ads() calls (daemon mode)
+        self.keep_browser = keep_browser
+        # Open multi-version ads in background sessions and store every version
+        # (off by default: each scraper would start VERSION_SESSIONS extra browsers)
+        if expand_versions is None:
+            expand_versions = os.getenv('EXPAND_VERSIONS', 'false').lower() == 'true'
+        self.expand_versions = expand_versions
+        self.version_sessions = int(os.getenv('VERSION_SESSIONS', '2'))
+        self.expander = None
+        # Set when a run fails, so callers can tell failure from an empty feed
+        self.error = None
+        # Set by the caller to abort the run between scrolls (e.g. a lost job lease)
+        self.stop_event = stop_event or threading.Event()
+        # Where scraped ads are written (PostgreSQL unless SCRAPER_SINKS says otherwise)
+        self.sink = sink if sink is not None else build_sink()
         self.driver = None
         self.scraped_ads = []
+        # Shared between shards of a parallel crawl so each ad is extracted once
+        self.seen_ad_ids = seen_ad_ids if seen_ad_ids is not None else SeenAdIds()
+        # Every ad ID that appeared in this crawl's feed, including ones
+        # skipped because another crawl already extracted them
+        self.observed_ad_ids = set()
+        # Whether the last scroll ran out of feed rather than reaching max_ads
+        self.feed_exhausted = False
+        # Whether the last scroll gave up because the feed stopped loading
+        self.stalled = False
+        self.saved_count = 0
+        self.assets_downloaded = 0
+        self._counter_lock = threading.Lock()
+        # Shared by asset downloads and page navigation
+        asset_workers = int(os.getenv('ASSET_WORKERS', '4'))
+        self.rate_controller = rate_controller or AdaptiveRateController(
+            name='fetch',
+            max_concurrency=int(os.getenv('RATE_MAX_CONCURRENCY', str(asset_workers + 1))),
+            target_latency=float(os.getenv('RATE_TARGET_LATENCY', '3.0')),
+            max_retries=int(os.getenv('FETCH_MAX_RETRIES', '4')),
+        )
+        # Learned selector order for the extractors, shared process-wide
+        self.selector_plan = get_selector_plan()
         self.assets_dir = assets_dir
+        self.skip_asset_downloads = os.getenv('SKIP_ASSET_DOWNLOADS', 'false').lower() == 'true'
+        self.pipeline = ScrapePipeline(
+            fetch_asset=self.fetch_asset_stage,
+            write_ad=self.write_ad_stage,
+            asset_workers=asset_workers,
+            queue_size=int(os.getenv('PIPELINE_QUEUE_SIZE', '100')),
+        )
         self._ensure_assets_dirs()
     
     def _ensure_assets_dirs(self):
@@ -106,23 +241,48 @@ class FacebookAdsScraper:
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
             }
             
-            response = requests.get(asset_url, headers=headers, timeout=30, stream=True)
-            response.raise_for_status()
+            import requests
             
-            # Save to file
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            def fetch():
+                # Closing the response returns its connection to the pool, even on errors
+                with requests.get(asset_url, headers=headers, timeout=30, stream=True) as response:
+                    if response.status_code == 429 or response.status_code >= 500:
+                        raise ThrottledError(f"HTTP {response.status_code}", response.status_code)
+                    response.raise_for_status()
+                    
+                    # Save to a temporary file so an interrupted download never
+                    # looks like a complete asset
+                    partial_path = filepath + '.part'
+                    with open(partial_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=8192):
+                            f.write(chunk)
+                os.replace(partial_path, filepath)
             
+            self.rate_controller.call(fetch, is_throttle=is_throttle_error)
             return filepath
             
         except Exception as e:
             print(f"    ⚠️  Could not download asset for ad {ad_id}: {e}")
             return None
     
-    def setup_driver(self):
-        """Setup Chrome WebDriver with appropriate options."""
+    def navigate(self, url: str):
+        """Load a page through the shared rate controller, retrying timeouts."""
+        self.rate_controller.call(lambda: self.driver.get(url), is_throttle=is_throttle_error)
+    
+    def create_driver(self, capture_network: bool = False):
+        """Start a new Chrome WebDriver with the scraper's options.
+        
+        With `capture_network`, the browser's network events are available
+        through `driver.get_log('performance')`.
+        """
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
+        
         chrome_options = Options()
+        if capture_network:
+            chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
         # Run in headless mode for production, but visible for debugging
         if os.getenv('HEADLESS', 'true').lower() == 'true':
             chrome_options.add_argument('--headless')
@@ -133,11 +293,17 @@ class FacebookAdsScraper:
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option('useAutomationExtension', False)
         
+        # Use webdriver-manager to automatically handle ChromeDriver
+        service = Service(ChromeDriverManager().install())
+        driver = webdriver.Chrome(service=service, options=chrome_options)
+        driver.set_page_load_timeout(int(os.getenv('PAGE_LOAD_TIMEOUT', '60')))
+        driver.maximize_window()
+        return driver
+    
+    def setup_driver(self):
+        """Setup Chrome WebDriver with appropriate options."""
         try:
-            # Use webdriver-manager to automatically handle ChromeDriver
-            service = Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            self.driver.maximize_window()
+            self.driver = self.create_driver()
             print("✓ Chrome WebDriver initialized")
             return True
         except Exception as e:
@@ -145,14 +311,32 @@ class FacebookAdsScraper:
             print("  Make sure Chrome is installed")
             return False
     
-    def scroll_and_extract_ads(self, target_count: int):
-        """Scroll the page and extract ads until we have enough valid ads."""
+    def scroll_and_extract_ads(self, target_count: Optional[int]):
+        """Scroll the page and extract ads until this feed has shown `target_count` ads.
+        
+        The count includes ads another crawl sharing `seen_ad_ids` already
+        extracted, so overlapping shards each get their full limit.
+        """
+        from selenium.webdriver.common.by import By
+        
+        if target_count is None:
+            target_count = float('inf')
+        self.feed_exhausted = False
         print(f"  Scrolling and extracting ads (target: {target_count})...")
         scroll_attempts = 0
         max_scroll_attempts = 50
-        last_valid_count = 0
+        # Progress is measured on the ads this page load has shown, so scrolling
+        # back over ads handled before a browser recycle still counts
+        page_ad_ids = set()
+        last_page_count = 0
+        recycled = False
+        end_reached = False
         
-        while len(self.scraped_ads) < target_count and scroll_attempts < max_scroll_attempts:
+        while len(self.observed_ad_ids) < target_count and scroll_attempts < max_scroll_attempts:
+            if self.stop_event.is_set():
+                print("  ⚠️  Stop requested; ending the scroll early")
+                break
+            
             # Find ad containers
             try:
                 ad_containers = self.driver.find_elements(
@@ -162,15 +346,22 @@ class FacebookAdsScraper:
             except:
                 ad_containers = []
             
+            # Containers that are done with and can be pruned in long-crawl mode
+            processed_containers = []
+            
             # Try to extract ads from visible containers
             for i, container in enumerate(ad_containers):
-                if len(self.scraped_ads) >= target_count:
+                if len(self.observed_ad_ids) >= target_count:
                     break
                 
                 # Skip if we've already processed this ad
                 try:
                     ad_id = self.extract_ad_id(container)
-                    if ad_id and any(ad.get('ad_id') == ad_id for ad in self.scraped_ads):
+                    if ad_id:
+                        page_ad_ids.add(ad_id)
+                    if ad_id and ad_id in self.seen_ad_ids:
+                        self.observed_ad_ids.add(ad_id)
+                        processed_containers.append(container)
                         continue
                 except:
                     pass
@@ -178,85 +369,195 @@ class FacebookAdsScraper:
                 # Try to extract this ad
                 ad_data = self.extract_ad_data(container, len(self.scraped_ads))
                 if ad_data and ad_data.get('ad_id'):
+                    self.observed_ad_ids.add(ad_data['ad_id'])
+                    processed_containers.append(container)
                     # Check if we already have this ad
-                    if not any(ad.get('ad_id') == ad_data.get('ad_id') for ad in self.scraped_ads):
-                        self.scraped_ads.append(ad_data)
-                        
-                        # Console log first 10 ads
-                        if len(self.scraped_ads) <= 10:
-                            print(f"\n    📋 Ad #{len(self.scraped_ads)} Data:")
-                            print(f"       Ad ID: {ad_data.get('ad_id')}")
-                            print(f"       Status: {ad_data.get('status')}")
-                            print(f"       Platforms: {ad_data.get('platforms')}")
-                            print(f"       Start Date: {ad_data.get('start_date')}")
-                            print(f"       End Date: {ad_data.get('end_date')}")
-                            print(f"       Multiple Versions: {ad_data.get('multiple_versions')}")
-                            print(f"       Asset URL: {ad_data.get('asset_url', 'N/A')[:80]}...")
-                            if ad_data.get('asset_path'):
-                                print(f"       Asset saved: {ad_data.get('asset_path')}")
-                            print()
+                    if self.seen_ad_ids.add_if_new(ad_data['ad_id']):
+                        if self.long_crawl:
+                            self.scraped_ads.append(ScrapedAd(ad_data['ad_id'], ad_data['status']))
+                        else:
+                            self.scraped_ads.append(ad_data)
                         
-                        # Save to database
-                        self.db.insert_ad(ad_data)
-                        print(f"    ✓ Saved ad {len(self.scraped_ads)}/{target_count}: {ad_data.get('ad_id')}")
+                        # Hand off to the download/write stages
+                        self.pipeline.submit(ad_data)
+                        if self.expander is not None and ad_data.get('multiple_versions'):
+                            self.expander.submit(ad_data['ad_id'])
+            
+            if self.long_crawl:
+                self.prune_containers(processed_containers)
+                if self.recycle_browser_if_needed():
+                    # The reloaded feed starts from the top; catching up counts as progress
+                    recycled = True
+                    page_ad_ids = set()
+                    last_page_count = 0
+                    scroll_attempts = 0
+                    continue
             
-            # Check if we got new valid ads
-            if len(self.scraped_ads) == last_valid_count:
+            # Check if the feed showed any ads we hadn't scrolled past yet
+            if len(page_ad_ids) == last_page_count:
                 scroll_attempts += 1
+                # Only the feed's end marker proves there is nothing more to load
+                if self.feed_end_reached():
+                    end_reached = True
+                    break
             else:
                 scroll_attempts = 0
-                last_valid_count = len(self.scraped_ads)
+                last_page_count = len(page_ad_ids)
             
             # If we have enough, stop
-            if len(self.scraped_ads) >= target_count:
+            if len(self.observed_ad_ids) >= target_count:
                 break
             
+            # While catching up after a recycle nothing new reaches the
+            # pipeline, so skip ahead without waiting on it
+            catching_up = recycled and len(page_ad_ids) < len(self.observed_ad_ids)
+            if not catching_up:
+                # Don't load more ads while downloads/writes are lagging
+                self.pipeline.wait_for_capacity()
+                print(f"    ⏱  {self.pipeline.format_stats()}")
+                print(f"    ⏱  {self.rate_controller.format_stats()}")
+                if self.expander is not None:
+                    print(f"    ⏱  {self.expander.format_stats()}")
+            
             # Scroll down to load more
             self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)  # Wait for content to load
+            time.sleep(self.scroll_pause)  # Wait for content to load
         
+        self.stalled = not end_reached and scroll_attempts >= max_scroll_attempts
+        if self.stalled:
+            after_recycle = " after a browser recycle" if recycled else ""
+            print(f"  ⚠️  Feed stopped loading{after_recycle} before its end; the crawl is incomplete")
+        # A stall (slow network, lazy-load hiccup) never counts as the end of the feed
+        self.feed_exhausted = end_reached and not self.stop_event.is_set()
         print(f"  Finished. Extracted {len(self.scraped_ads)} valid ads")
     
+    def feed_end_reached(self) -> bool:
+        """Whether the page shows the end-of-results marker."""
+        from selenium.webdriver.common.by import By
+        
+        try:
+            markers = self.driver.find_elements(By.XPATH, os.getenv('FEED_END_XPATH', FEED_END_XPATH))
+            return any(marker.is_displayed() for marker in markers)
+        except Exception:
+            return False
+    
+    def prune_containers(self, containers: list):
+        """Remove processed ad containers from the live DOM.
+        
+        Keeps Chrome memory and the cost of `find_elements` flat on deep crawls.
+        """
+        if not containers:
+            return
+        try:
+            self.driver.execute_script(
+                "for (const el of arguments) { if (el.isConnected) el.remove(); }",
+                *containers
+            )
+        except Exception as e:
+            print(f"    ⚠️  Could not prune ad containers: {e}")
+    
+    def browser_memory_mb(self) -> Optional[float]:
+        """JS heap currently used by the page, in MB (Chrome only)."""
+        try:
+            used = self.driver.execute_script(
+                "return performance.memory ? performance.memory.usedJSHeapSize : null;"
+            )
+            return used / (1024 * 1024) if used else None
+        except Exception:
+            return None
+    
+    def recycle_browser_if_needed(self) -> bool:
+        """Restart the browser once its memory crosses the configured limit.
+        
+        The feed restarts from the top; ads that were already seen are only
+        identified by ID and pruned, not extracted again. Returns whether
+        the browser was recycled.
+        """
+        memory_mb = self.browser_memory_mb()
+        if memory_mb is None or memory_mb < self.browser_memory_limit_mb:
+            return False
+        
+        print(f"    ♻️  Browser using {memory_mb:.0f} MB (limit {self.browser_memory_limit_mb} MB), recycling...")
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+        self.driver = None
+        if not self.setup_driver():
+            raise RuntimeError("Could not restart WebDriver")
+        self.navigate(self.ads_url)
+        time.sleep(5)
+        return True
+    
+    def fetch_asset_stage(self, ad_data: Dict) -> Dict:
+        """Pipeline stage: download the ad's asset."""
+        # Leave asset_path empty for the asset worker to backfill
+        if self.skip_asset_downloads:
+            return ad_data
+        if ad_data.get('asset_url'):
+            ad_data['asset_path'] = self.download_asset(
+                ad_data['asset_url'], ad_data.get('asset_type', 'image'), ad_data['ad_id']
+            )
+            if ad_data['asset_path']:
+                with self._counter_lock:
+                    self.assets_downloaded += 1
+        return ad_data
+    
+    def write_ad_stage(self, ad_data: Dict) -> None:
+        """Pipeline stage: write the ad to the sinks and log progress."""
+        self.sink.write(ad_data)
+        self.saved_count += 1
+        
+        # Console log first 10 ads
+        if self.saved_count <= 10:
+            print(f"\n    📋 Ad #{self.saved_count} Data:")
+            print(f"       Ad ID: {ad_data.get('ad_id')}")
+            print(f"       Status: {ad_data.get('status')}")
+            print(f"       Platforms: {ad_data.get('platforms')}")
+            print(f"       Start Date: {ad_data.get('start_date')}")
+            print(f"       End Date: {ad_data.get('end_date')}")
+            print(f"       Multiple Versions: {ad_data.get('multiple_versions')}")
+            print(f"       Asset URL: {(ad_data.get('asset_url') or 'N/A')[:80]}...")
+            if ad_data.get('asset_path'):
+                print(f"       Asset saved: {ad_data.get('asset_path')}")
+            print()
+        
+        print(f"    ✓ Saved ad {self.saved_count}/{self.max_ads or '∞'}: {ad_data.get('ad_id')}")
+    
     def extract_ad_id(self, element) -> Optional[str]:
         """Extract Library ID from ad element."""
-        try:
+        def library_id(elements):
             # Look for "Library ID: XXXXX" text
-            text_elements = element.find_elements(By.XPATH, ".//span[contains(text(), 'Library ID:')]")
-            for elem in text_elements:
-                text = elem.text
-                match = re.search(r'Library ID:\s*(\d+)', text)
+            for elem in elements:
+                match = re.search(r'Library ID:\s*(\d+)', elem.text)
                 if match:
                     return match.group(1)
-        except:
-            pass
-        return None
+            return None
+        
+        return self.selector_plan.find(element, 'ad_id', library_id)
     
     def extract_status(self, element) -> str:
         """Extract ad status (Active/Inactive)."""
-        try:
-            # Look for status text - it's in a span with class containing 'x117nqv4' or 'xeuugli'
+        def status(elements):
             # The text "Active" or "Inactive" appears directly in a span
-            status_elements = element.find_elements(By.XPATH, ".//span[text()='Active' or text()='Inactive']")
-            if not status_elements:
-                # Try with contains
-                status_elements = element.find_elements(By.XPATH, ".//span[contains(text(), 'Active') or contains(text(), 'Inactive')]")
-            
-            for elem in status_elements:
+            for elem in elements:
                 text = elem.text.strip()
                 if text == 'Active' or 'Active' in text:
                     return 'active'
                 elif text == 'Inactive' or 'Inactive' in text:
                     return 'inactive'
-        except Exception as e:
-            pass
-        return 'unknown'
+            return None
+        
+        return self.selector_plan.find(element, 'status', status) or 'unknown'
     
     def extract_platforms(self, element) -> List[str]:
         """Extract platforms (Facebook, Instagram, etc.)."""
+        from selenium.webdriver.common.by import By
+        
         platforms = []
         try:
             # Find the Platforms section - it's a span with "Platforms" text followed by a div
-            platform_label = element.find_elements(By.XPATH, ".//span[contains(text(), 'Platforms')]")
+            platform_label = self.selector_plan.find(element, 'platforms', lambda elements: elements or None)
             
             if platform_label:
                 # Get the parent or following sibling that contains the icons
@@ -300,37 +601,16 @@ class FacebookAdsScraper:
         end_date = None
         
         try:
-            # Look for the specific element structure: div.x3nfvp2.x1e56ztr > span with date text
             # The HTML structure is: <div class="x3nfvp2 x1e56ztr"><span class="x8t9es0 xw23nyj xo1l8bm x63nzvj x108nfp6 xq9mrsl x1h4wwuj xeuugli">Started running on 8 Jan 2026</span></div>
-            # Try multiple XPath patterns to find date text
-            date_patterns = [
-                # Most specific: div with both classes, then span
-                ".//div[contains(@class, 'x3nfvp2') and contains(@class, 'x1e56ztr')]//span[contains(text(), 'Started running on')]",
-                # Try finding span with the specific classes
-                ".//span[contains(@class, 'x8t9es0') and contains(@class, 'xw23nyj') and contains(@class, 'xo1l8bm') and contains(text(), 'Started running on')]",
-                # Try finding the div first, then any span inside
-                ".//div[contains(@class, 'x3nfvp2')]//span[contains(text(), 'Started running on')]",
-                # Generic: any span with "Started running on"
-                ".//span[contains(text(), 'Started running on')]",
-                # Generic: any element with "Started running on"
-                ".//*[contains(text(), 'Started running on')]",
-            ]
+            # The candidate XPath patterns (most specific first) live in selector_plan
+            def started_text(elements):
+                for elem in elements:
+                    text = elem.text.strip()
+                    if 'Started running on' in text:
+                        return text
+                return None
             
-            date_text = None
-            for pattern in date_patterns:
-                try:
-                    date_elements = element.find_elements(By.XPATH, pattern)
-                    for elem in date_elements:
-                        text = elem.text.strip()
-                        if 'Started running on' in text:
-                            date_text = text
-                            break
-                    if date_text:
-                        break
-                except Exception as e:
-                    if len(self.scraped_ads) < 3:
-                        print(f"      DEBUG: Pattern error: {e}")
-                    continue
+            date_text = self.selector_plan.find(element, 'dates', started_text)
             
             if date_text:
                 # Parse different date formats:
@@ -409,24 +689,14 @@ class FacebookAdsScraper:
             # The large image is typically in a div with class containing 'x1ywc1zp' or similar
             # Try to find the largest image (the actual ad asset, not the profile pic)
             
-            # First, try to find images in the ad content container
-            ad_content = element.find_elements(By.CSS_SELECTOR, "div[data-testid='ad-library-dynamic-content-container']")
-            if ad_content:
-                # Look for large images (s600x600) which are the ad assets
-                img_elements = ad_content[0].find_elements(By.CSS_SELECTOR, "img[src*='s600x600'], img[src*='s1080x1080']")
-                if img_elements:
-                    asset_url = img_elements[0].get_attribute('src')
-                    asset_type = 'image'
-            
-            # Fallback: try any large image in the element
-            if not asset_url:
-                img_elements = element.find_elements(By.CSS_SELECTOR, "img[src*='fbcdn.net'][src*='s600x600'], img[src*='fbcdn.net'][src*='s1080x1080']")
-                if img_elements:
-                    asset_url = img_elements[0].get_attribute('src')
-                    asset_type = 'image'
+            # Large images (s600x600) in the ad content container are the ad assets,
+            # falling back to any large fbcdn image in the element
+            asset_url = self.selector_plan.find(
+                element, 'image', lambda elements: elements[0].get_attribute('src') if elements else None
+            )
             
             # Check for video
-            video_elements = element.find_elements(By.CSS_SELECTOR, "video")
+            video_elements = self.selector_plan.find(element, 'video', lambda elements: elements or None) or []
             if video_elements:
                 asset_url = video_elements[0].get_attribute('src')
                 if not asset_url:
@@ -446,14 +716,50 @@ class FacebookAdsScraper:
         """Check if ad has multiple versions."""
         try:
             # Look for "This ad has multiple versions" text
-            multiple_versions_elements = element.find_elements(
-                By.XPATH, 
-                ".//span[contains(text(), 'This ad has multiple versions')]"
-            )
-            return len(multiple_versions_elements) > 0
+            return self.selector_plan.find(element, 'multiple_versions', lambda elements: elements or None) is not None
         except:
             return False
     
+    def extract_ad_copy(self, element) -> Dict:
+        """Extract ad body text, link headline, CTA text and link URL."""
+        from selenium.webdriver.common.by import By
+        
+        copy = {'body_text': None, 'headline': None, 'cta_text': None, 'link_url': None}
+        
+        try:
+            # The body copy is rendered in a pre-wrap block inside the ad content
+            body_elements = self.selector_plan.find(element, 'body_text', lambda elements: elements or None) or []
+            if body_elements:
+                copy['body_text'] = body_elements[0].text.strip() or None
+            
+            # The link card below the creative: domain, headline, description and CTA button
+            link_elements = self.selector_plan.find(element, 'link', lambda elements: elements or None) or []
+            for link in link_elements:
+                href = link.get_attribute('href') or ''
+                if not href or href.startswith('#'):
+                    continue
+                
+                # Outbound links go through l.facebook.com/l.php?u=<target>
+                target = parse_qs(urlparse(href).query).get('u')
+                copy['link_url'] = target[0] if target else href
+                
+                buttons = link.find_elements(By.CSS_SELECTOR, "div[role='button']")
+                if buttons:
+                    copy['cta_text'] = buttons[0].text.strip() or None
+                
+                lines = [line.strip() for line in link.text.split('\n') if line.strip()]
+                for line in lines:
+                    # Skip the upper-case display domain and the CTA label
+                    if line == copy['cta_text'] or (line.isupper() and '.' in line):
+                        continue
+                    copy['headline'] = line
+                    break
+                break
+        except Exception as e:
+            pass
+        
+        return copy
+    
     def extract_ad_data(self, element, index: int) -> Optional[Dict]:
         """Extract all data from a single ad element."""
         try:
@@ -467,11 +773,7 @@ class FacebookAdsScraper:
             start_date, end_date = self.extract_dates(element)
             asset_url, asset_type = self.extract_asset(element)
             multiple_versions = self.extract_multiple_versions(element)
-            
-            # Download asset if URL is available
-            asset_path = None
-            if asset_url:
-                asset_path = self.download_asset(asset_url, asset_type, ad_id)
+            ad_copy = self.extract_ad_copy(element)
             
             ad_data = {
                 'ad_id': ad_id,
@@ -481,8 +783,9 @@ class FacebookAdsScraper:
                 'end_date': end_date,
                 'asset_url': asset_url,
                 'asset_type': asset_type,
-                'asset_path': asset_path,  # Local file path
-                'multiple_versions': multiple_versions
+                'asset_path': None,  # Local file path, set by the asset stage
+                'multiple_versions': multiple_versions,
+                **ad_copy
             }
             
             return ad_data
@@ -490,45 +793,165 @@ class FacebookAdsScraper:
             print(f"    ✗ Error extracting ad data: {e}")
             return None
     
+    def retarget(self, page_id: str, filters: Optional[Dict] = None,
+                 max_ads: Optional[int] = None):
+        """Point the scraper at another target and reset per-run state.
+        
+        The browser (when kept open) and the rate controller carry over.
+        """
+        self.page_id = page_id
+        self.filters = dict(filters or {})
+        self.ads_url = build_ads_url(page_id, self.filters)
+        self.max_ads = max_ads
+        self.error = None
+        self.scraped_ads = []
+        self.seen_ad_ids = SeenAdIds()
+        self.observed_ad_ids = set()
+        self.feed_exhausted = False
+        self.stalled = False
+        self.saved_count = 0
+        self.assets_downloaded = 0
+    
+    def quit_browser(self):
+        """Close the browser if one is open."""
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+            print("✓ WebDriver closed")
+    
     def scrape_ads(self) -> List[Dict]:
         """Main scraping method."""
-        if not self.setup_driver():
+        if self.driver is None and not self.setup_driver():
+            self.error = RuntimeError("Could not set up WebDriver")
             return []
         
         try:
             print(f"  Navigating to: {self.ads_url}")
-            self.driver.get(self.ads_url)
+            self.navigate(self.ads_url)
             
             # Wait for page to load
             print("  Waiting for page to load...")
             time.sleep(5)
             
             # Scroll and extract ads until we have enough
-            self.scroll_and_extract_ads(self.max_ads)
+            if self.manage_run:
+                self.sink.begin_run(self.page_id, self.filters)
+            run_status = 'failed'
+            self.pipeline.start()
+            self.start_expander()
+            try:
+                self.scroll_and_extract_ads(self.max_ads)
+                if self.stop_event.is_set():
+                    run_status = 'aborted'
+                    self.error = RuntimeError("Run stopped before it finished")
+                else:
+                    run_status = 'completed'
+            finally:
+                # Let queued downloads, writes and version expansions finish
+                self.pipeline.close()
+                if self.expander is not None:
+                    self.expander.drain()
+                if self.manage_run:
+                    if run_status == 'completed':
+                        self.reconcile_missing()
+                    self.sink.end_run(run_status)
+                # Keep what was learned about the markup for the next run
+                self.selector_plan.check()
+                self.selector_plan.save()
+            print(f"  Pipeline: {self.pipeline.format_stats()}")
+            print(f"  Rate control: {self.rate_controller.format_stats()}")
+            print(f"  Selectors: {self.selector_plan.format_stats()}")
+            if self.expander is not None:
+                print(f"  Versions: {self.expander.format_stats()}")
             
-            # Count downloaded assets
-            assets_downloaded = sum(1 for ad in self.scraped_ads if ad.get('asset_path'))
             print(f"\n✓ Successfully scraped {len(self.scraped_ads)} ads")
-            print(f"✓ Downloaded {assets_downloaded} assets (saved locally)")
+            print(f"✓ Downloaded {self.assets_downloaded} assets (saved locally)")
             return self.scraped_ads
             
         except Exception as e:
             print(f"✗ Error during scraping: {e}")
+            self.error = e
             import traceback
             traceback.print_exc()
+            # A kept browser may be in a bad state; start fresh next run
+            self.quit_browser()
             return []
         finally:
-            if self.driver:
-                self.driver.quit()
-                print("✓ WebDriver closed")
+            if not self.keep_browser:
+                self.quit_browser()
+                self.close_expander()
+    
+    def postgres_sink(self) -> Optional[PostgresSink]:
+        """The PostgreSQL sink among the configured sinks, if any."""
+        if isinstance(self.sink, PostgresSink):
+            return self.sink
+        find = getattr(self.sink, 'find', None)
+        return find(PostgresSink) if find else None
+    
+    def crawled_whole_feed(self) -> bool:
+        """Whether the last run saw every ad the page has in its country.
+
+        Only true when the feed showed its end marker; False after errors,
+        stalls, when max_ads cut the scroll short, or when filters other
+        than the country narrowed the feed.
+        """
+        narrowed = any(
+            value != DEFAULT_FILTERS.get(key)
+            for key, value in self.filters.items() if key != 'country'
+        )
+        return self.error is None and self.feed_exhausted and not narrowed
+    
+    def reconcile_missing(self) -> int:
+        """After a complete crawl, mark the page's ads that were not seen as disappeared.
+        
+        Must run while the sink's scrape run is still open.
+        """
+        if not self.crawled_whole_feed():
+            return 0
+        postgres_sink = self.postgres_sink()
+        if postgres_sink is None:
+            return 0
+        country = self.filters.get('country', DEFAULT_FILTERS['country'])
+        marked = postgres_sink.reconcile(self.observed_ad_ids, country)
+        if marked:
+            print(f"  ✓ Marked {marked} ads no longer in the feed as disappeared")
+        return marked
+    
+    def start_expander(self):
+        """Start the version expansion sessions for this run, if enabled."""
+        if not self.expand_versions:
+            return
+        if self.expander is None:
+            # Versions are stored in PostgreSQL next to the ads table
+            if self.postgres_sink() is None:
+                print("  ⚠️  No postgres sink configured; skipping multi-version expansion")
+                self.expand_versions = False
+                return
+            from versions import VersionExpander
+            self.expander = VersionExpander(self, sessions=self.version_sessions)
+        self.expander.start()
+    
+    def close_expander(self):
+        """Quit the version expansion sessions."""
+        if self.expander is not None:
+            self.expander.close()
+            self.expander = None
     
     def close(self):
-        """Close database connection."""
-        self.db.close()
+        """Close the browsers and flush and close the output sinks."""
+        self.quit_browser()
+        self.close_expander()
+        self.sink.close()
 
 
 def main():
     """Main entry point."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    
     print("=" * 60)
     print("Facebook Ads Library Scraper - Nike")
     print("=" * 60)
@@ -540,7 +963,7 @@ def main():
         
         if ads:
             print(f"\n✓ Scraping completed. Found {len(ads)} ads")
-            print(f"✓ Data saved to PostgreSQL database")
+            print(f"✓ Data saved to configured sinks")
         else:
             print("\n✗ No ads were scraped")
     
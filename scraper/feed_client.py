@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Browserless feed pagination.
+
+The Ads Library feed is filled by an XHR that returns ads as JSON, one page
+per forward cursor. A browser is started once to load the feed, capture
+the session (cookies, the fb_dtsg/lsd tokens and the shape of that
+pagination request), and is then closed. Pages are pulled with a pooled
+HTTP client instead, several cursors at a time: each shard of the target
+(see sharded_crawl) is paginated by its own stream. The browser is only
+started again to refresh the session when the server rejects it.
+
+Ads go through the scraper's normal pipeline (asset downloads, sinks and
+the scrape run), so the rows are the same as a browser crawl produces.
+Multi-version ads are flagged but not expanded here; run a browser crawl
+(or the daemon) to fill `ad_versions`.
+
+Usage:
+    python feed_client.py PAGE_ID [--streams 8] [--max-ads N]
+    python feed_client.py PAGE_ID --by date --from 2020-01-01 [--to 2026-10-01] [--shards 8]
+    python feed_client.py PAGE_ID --by media
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urljoin, urlsplit, urlunsplit
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+from requests.adapters import HTTPAdapter
+from facebook_ads_scraper import (
+    DEFAULT_FILTERS, FacebookAdsScraper, ScrapedAd, ads_library_base_url,
+    build_ads_url, is_throttle_error,
+)
+from rate_control import AdaptiveRateController, ThrottledError
+
+
+# Path of the XHR the feed uses to load more ads
+PAGINATION_PATH = '/ads/library/async/search_ads/'
+
+# Session tokens embedded in the page's server-rendered JavaScript
+TOKEN_PATTERNS = {
+    'fb_dtsg': re.compile(r'"DTSGInitialData",\[\],\{"token":"([^"]+)"'),
+    'lsd': re.compile(r'"LSD",\[\],\{"token":"([^"]+)"'),
+}
+
+# Anti-JSON-hijacking prefix on every async response
+RESPONSE_PREFIX = 'for (;;);'
+
+# Error codes meaning the tokens or cookies are no longer accepted
+SESSION_EXPIRED_ERRORS = {1357001, 1357004}
+
+# Parameters that change per page rather than per session
+CURSOR_PARAMS = {'forward_cursor', 'backward_cursor', 'count'}
+
+
+class SessionExpired(Exception):
+    """The server rejected the session; a new one must be bootstrapped."""
+
+
+class FeedSession:
+    """Everything needed to replay the feed's pagination request."""
+
+    def __init__(self, endpoint: str, params: Dict, form: Dict, cookies: Dict,
+                 headers: Dict, generation: int = 0):
+        self.endpoint = endpoint
+        self.params = params
+        self.form = form
+        self.cookies = cookies
+        self.headers = headers
+        # Bumped on each refresh so concurrent streams refresh only once
+        self.generation = generation
+
+
+def find_pagination_request(log_entries: List[Dict]) -> Optional[Dict]:
+    """The first pagination request in a Chrome performance log, if any."""
+    for entry in log_entries:
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, TypeError, ValueError):
+            continue
+        if message.get('method') != 'Network.requestWillBeSent':
+            continue
+        request = message.get('params', {}).get('request', {})
+        if PAGINATION_PATH in request.get('url', ''):
+            return request
+    return None
+
+
+def default_request_shape(page_id: str, filters: Optional[Dict] = None) -> Tuple[str, Dict]:
+    """Endpoint and query parameters used when no request was captured."""
+    params = dict(DEFAULT_FILTERS)
+    params.update(filters or {})
+    params['view_all_page_id'] = page_id
+    params['session_id'] = str(uuid.uuid4())
+    return urljoin(ads_library_base_url(), 'async/search_ads/'), params
+
+
+def bootstrap_session(scraper: FacebookAdsScraper, page_id: str, filters: Optional[Dict] = None,
+                      generation: int = 0) -> FeedSession:
+    """Load the feed once in a browser and capture its pagination session."""
+    driver = scraper.create_driver(capture_network=True)
+
+    try:
+        url = build_ads_url(page_id, filters)
+        scraper.rate_controller.call(lambda: driver.get(url), is_throttle=is_throttle_error)
+        time.sleep(float(os.getenv('FEED_BOOTSTRAP_WAIT', '5')))
+        # The first scroll makes the page issue a pagination request
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        time.sleep(scraper.scroll_pause)
+
+        html = driver.page_source
+        try:
+            captured = find_pagination_request(driver.get_log('performance'))
+        except Exception:
+            captured = None
+        cookies = {cookie['name']: cookie['value'] for cookie in driver.get_cookies()}
+        user_agent = driver.execute_script("return navigator.userAgent")
+    finally:
+        driver.quit()
+
+    tokens = {}
+    for name, pattern in TOKEN_PATTERNS.items():
+        match = pattern.search(html)
+        if match:
+            tokens[name] = match.group(1)
+
+    if captured:
+        parts = urlsplit(captured['url'])
+        endpoint = urlunsplit((parts.scheme, parts.netloc, parts.path, '', ''))
+        params = {k: v for k, v in parse_qsl(parts.query) if k not in CURSOR_PARAMS}
+        form = {k: v for k, v in parse_qsl(captured.get('postData') or '') if k not in CURSOR_PARAMS}
+    else:
+        endpoint, params = default_request_shape(page_id, filters)
+        form = {'__a': '1'}
+    # Tokens from the page are fresher than whatever the request carried
+    form.update(tokens)
+
+    headers = {
+        'User-Agent': user_agent,
+        'Referer': url,
+        'Content-Type': 'application/x-www-form-urlencoded',
+    }
+    if 'lsd' in tokens:
+        headers['X-FB-LSD'] = tokens['lsd']
+
+    print(f"✓ Feed session captured ({'from network log' if captured else 'default request shape'}, "
+          f"{len(cookies)} cookies, tokens: {', '.join(sorted(tokens)) or 'none'})")
+    return FeedSession(endpoint, params, form, cookies, headers, generation)
+
+
+def parse_search_response(text: str) -> Tuple[List[Dict], Optional[str]]:
+    """(ad results, next cursor) from a pagination response body."""
+    if text.startswith(RESPONSE_PREFIX):
+        text = text[len(RESPONSE_PREFIX):]
+    data = json.loads(text)
+
+    error = data.get('error')
+    if error:
+        if error in SESSION_EXPIRED_ERRORS:
+            raise SessionExpired(data.get('errorSummary') or f"error {error}")
+        raise RuntimeError(f"Ads Library error {error}: {data.get('errorDescription') or data.get('errorSummary')}")
+
+    payload = data.get('payload') or {}
+    results = []
+    # Results come grouped by collation (an ad and its copies)
+    for group in payload.get('results') or []:
+        results.extend(group if isinstance(group, list) else [group])
+    return results, payload.get('forwardCursor') or None
+
+
+def _timestamp_date(value) -> Optional[date]:
+    if not value:
+        return None
+    return datetime.fromtimestamp(int(value), tz=timezone.utc).date()
+
+
+def parse_ad(result: Dict) -> Optional[Dict]:
+    """Convert one search result into the ad dict the sinks expect."""
+    ad_id = result.get('adArchiveID') or result.get('adid')
+    if not ad_id:
+        return None
+
+    snapshot = result.get('snapshot') or {}
+    body = snapshot.get('body') or {}
+    if isinstance(body, dict):
+        body_text = body.get('text') or (body.get('markup') or {}).get('__html')
+    else:
+        body_text = body
+    cards = snapshot.get('cards') or []
+    first_card = cards[0] if cards else {}
+
+    asset_url, asset_type = None, None
+    videos = snapshot.get('videos') or first_card.get('videos') or []
+    images = snapshot.get('images') or []
+    if videos:
+        asset_url = videos[0].get('video_hd_url') or videos[0].get('video_sd_url')
+        asset_type = 'video' if asset_url else None
+    if not asset_url and images:
+        asset_url = images[0].get('original_image_url') or images[0].get('resized_image_url')
+        asset_type = 'image' if asset_url else None
+    if not asset_url and first_card:
+        asset_url = first_card.get('original_image_url') or first_card.get('resized_image_url')
+        asset_type = 'image' if asset_url else None
+
+    platforms = [name.title() for name in result.get('publisherPlatform') or []] or ['Facebook']
+
+    return {
+        'ad_id': str(ad_id),
+        'status': 'active' if result.get('isActive') else 'inactive',
+        'platforms': platforms,
+        'start_date': _timestamp_date(result.get('startDate')),
+        'end_date': None if result.get('isActive') else _timestamp_date(result.get('endDate')),
+        'asset_url': asset_url,
+        'asset_type': asset_type,
+        'asset_path': None,
+        'multiple_versions': (result.get('collationCount') or 1) > 1,
+        'body_text': body_text or first_card.get('body') or None,
+        'headline': snapshot.get('title') or first_card.get('title') or None,
+        'cta_text': snapshot.get('cta_text') or first_card.get('cta_text') or None,
+        'link_url': snapshot.get('link_url') or first_card.get('link_url') or None,
+    }
+
+
+class BrowserlessCrawler:
+    """Paginate a target's feed over HTTP, one stream per shard.
+
+    A FacebookAdsScraper (never opening its own browser) supplies the
+    pipeline, asset downloads, sink and seen-ID dedup; its browser factory
+    is only used to bootstrap and refresh the session.
+    """
+
+    def __init__(self, page_id: str, shard_filters: Optional[List[Dict]] = None,
+                 streams: int = 8, max_ads: Optional[int] = None,
+                 assets_dir: str = 'assets', sink=None, page_size: Optional[int] = None):
+        self.page_id = page_id
+        self.shard_filters = shard_filters or [{}]
+        self.streams = max(1, min(streams, len(self.shard_filters)))
+        self.max_ads = max_ads
+        self.page_size = page_size or int(os.getenv('FEED_PAGE_SIZE', '30'))
+        self.max_refreshes = int(os.getenv('FEED_MAX_REFRESHES', '3'))
+
+        asset_workers = int(os.getenv('ASSET_WORKERS', '4'))
+        rate_controller = AdaptiveRateController(
+            name='feed',
+            max_concurrency=int(os.getenv('RATE_MAX_CONCURRENCY', str(asset_workers + self.streams))),
+            initial_concurrency=self.streams,
+            target_latency=float(os.getenv('RATE_TARGET_LATENCY', '3.0')),
+            max_retries=int(os.getenv('FETCH_MAX_RETRIES', '4')),
+        )
+        self.scraper = FacebookAdsScraper(
+            max_ads=max_ads, assets_dir=assets_dir, sink=sink, rate_controller=rate_controller,
+            page_id=page_id, manage_run=False, expand_versions=False,
+        )
+
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.streams)
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
+
+        self.session: Optional[FeedSession] = None
+        self.pages = 0
+        self.refreshes = 0
+        # Streams whose last page had no forward cursor
+        self.streams_exhausted = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _limit_reached(self) -> bool:
+        return self.max_ads is not None and len(self.scraper.scraped_ads) >= self.max_ads
+
+    def _refresh(self, stale_generation: int):
+        """Bootstrap a new session unless another stream already did."""
+        with self._refresh_lock:
+            if self.session.generation != stale_generation:
+                return
+            if self.refreshes >= self.max_refreshes:
+                raise RuntimeError(f"Session expired {self.refreshes + 1} times; giving up")
+            print("  ↻ Feed session expired, refreshing through the browser...")
+            self.session = bootstrap_session(self.scraper, self.page_id, generation=stale_generation + 1)
+            self.refreshes += 1
+
+    def fetch_page(self, session: FeedSession, filters: Dict,
+                   cursor: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+        """Request one page of results for a shard."""
+        params = dict(session.params)
+        params.update(filters)
+        params['count'] = str(self.page_size)
+        form = dict(session.form)
+        if cursor:
+            form['forward_cursor'] = cursor
+
+        def fetch():
+            response = self.http.post(session.endpoint, params=params, data=form,
+                                      cookies=session.cookies, headers=session.headers, timeout=30)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise ThrottledError(f"HTTP {response.status_code}", response.status_code)
+            if response.status_code in (401, 403):
+                raise SessionExpired(f"HTTP {response.status_code}")
+            response.raise_for_status()
+            return parse_search_response(response.text)
+
+        return self.scraper.rate_controller.call(fetch, is_throttle=is_throttle_error)
+
+    def _accept(self, ad_data: Dict):
+        """Record a new ad and hand it to the pipeline."""
+        scraper = self.scraper
+        with self._lock:
+            if self._limit_reached():
+                return
+            scraper.observed_ad_ids.add(ad_data['ad_id'])
+            if not scraper.seen_ad_ids.add_if_new(ad_data['ad_id']):
+                return
+            if scraper.long_crawl:
+                scraper.scraped_ads.append(ScrapedAd(ad_data['ad_id'], ad_data['status']))
+            else:
+                scraper.scraped_ads.append(ad_data)
+        scraper.pipeline.submit(ad_data)
+
+    def crawl_stream(self, indexed) -> int:
+        """Follow one shard's cursor until the feed (or the ad limit) runs out."""
+        index, filters = indexed
+        cursor = None
+        pages = 0
+        print(f"▶ Stream {index + 1}/{len(self.shard_filters)}: {filters or 'all ads'}")
+
+        while not self._limit_reached():
+            session = self.session
+            try:
+                results, cursor = self.fetch_page(session, filters, cursor)
+            except SessionExpired:
+                self._refresh(session.generation)
+                continue
+
+            pages += 1
+            with self._lock:
+                self.pages += 1
+            for result in results:
+                ad_data = parse_ad(result)
+                if ad_data:
+                    self._accept(ad_data)
+
+            if not cursor:
+                # The final page of the shard: its end of feed was reached
+                with self._lock:
+                    self.streams_exhausted += 1
+                break
+            if not results:
+                break
+            # Don't fetch more pages while downloads/writes are lagging
+            self.scraper.pipeline.wait_for_capacity()
+            if pages % 10 == 0:
+                print(f"    ⏱  stream {index + 1}: {pages} pages | {self.scraper.pipeline.format_stats()}")
+
+        print(f"✓ Stream {index + 1}/{len(self.shard_filters)} finished after {pages} pages")
+        return pages
+
+    def run(self) -> Dict:
+        """Bootstrap, crawl every shard and record the whole crawl as one scrape run."""
+        scraper = self.scraper
+        self.session = bootstrap_session(scraper, self.page_id)
+
+        scraper.sink.begin_run(self.page_id, {'browserless': True, 'shards': self.shard_filters})
+        run_status = 'failed'
+        scraper.pipeline.start()
+        started = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=self.streams) as executor:
+                list(executor.map(self.crawl_stream, enumerate(self.shard_filters)))
+            run_status = 'completed'
+            scraper.feed_exhausted = self.streams_exhausted == len(self.shard_filters)
+        except Exception as e:
+            print(f"✗ Error during browserless crawl: {e}")
+            scraper.error = e
+        finally:
+            # Let queued downloads and writes finish
+            scraper.pipeline.close()
+            scraper.sink.end_run(run_status)
+        elapsed = time.monotonic() - started
+
+        print(f"  Pipeline: {scraper.pipeline.format_stats()}")
+        print(f"  Rate control: {scraper.rate_controller.format_stats()}")
+        return {
+            'ads': len(scraper.scraped_ads),
+            'pages': self.pages,
+            'refreshes': self.refreshes,
+            'assets_downloaded': scraper.assets_downloaded,
+            'elapsed_seconds': round(elapsed, 2),
+            'ads_per_second': round(len(scraper.scraped_ads) / elapsed, 2) if elapsed else 0.0,
+            'error': str(scraper.error) if scraper.error else None,
+        }
+
+    def close(self):
+        self.http.close()
+        self.scraper.close()
+
+
+def main():
+    from sharded_crawl import date_shard_filters, media_shard_filters
+
+    parser = argparse.ArgumentParser(description="Browserless feed crawl of one advertiser")
+    parser.add_argument('page_id', help="Facebook page ID to crawl")
+    parser.add_argument('--streams', type=int, default=int(os.getenv('FEED_STREAMS', '8')),
+                        help="Shards paginated concurrently")
+    parser.add_argument('--by', choices=['none', 'date', 'media'], default='none',
+                        help="Split the feed into shards by start-date window or media type")
+    parser.add_argument('--from', dest='date_from', type=date.fromisoformat, default=None,
+                        help="Earliest start date (YYYY-MM-DD) for date sharding")
+    parser.add_argument('--to', dest='date_to', type=date.fromisoformat, default=date.today())
+    parser.add_argument('--shards', type=int, default=8, help="Number of date windows")
+    parser.add_argument('--max-ads', type=int, default=None)
+    parser.add_argument('--assets-dir', default='assets')
+    args = parser.parse_args()
+
+    if args.by == 'date':
+        if args.date_from is None:
+            parser.error("--from is required for date sharding")
+        shard_filters = date_shard_filters(args.date_from, args.date_to, args.shards)
+    elif args.by == 'media':
+        shard_filters = media_shard_filters()
+    else:
+        shard_filters = [{}]
+
+    print("=" * 60)
+    print(f"Browserless crawl of page {args.page_id}: {len(shard_filters)} shards, "
+          f"{min(args.streams, len(shard_filters))} streams")
+    print("=" * 60)
+
+    crawler = BrowserlessCrawler(args.page_id, shard_filters, streams=args.streams,
+                                 max_ads=args.max_ads, assets_dir=args.assets_dir)
+    try:
+        result = crawler.run()
+    finally:
+        crawler.close()
+
+    print("\n" + "=" * 60)
+    print(f"✓ {result['ads']} ads from {result['pages']} pages in {result['elapsed_seconds']}s "
+          f"({result['ads_per_second']} ads/sec, {result['refreshes']} session refreshes)")
+    if result['error']:
+        print(f"⚠️  Crawl failed: {result['error']}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Scrape runs and append-only ad observation history.
+
+Every scrape run gets a row in `scrape_runs`. Each ad seen in the run gets
+one row in `ad_observations` holding only the fields that changed since the
+previous observation (unchanged fields stay NULL). Observations are
+computed and written in bulk, in the same transaction as the ads upsert,
+and observation time is indexed with BRIN since rows arrive in time order.
+
+After a complete crawl of a page, ads of that page that were not seen are
+reconciled: marked inactive and disappeared, with a `disappeared`
+observation in the run.
+"""
+
+import io
+import json
+import os
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+from psycopg2.extras import RealDictCursor, execute_values
+
+
+class AdHistory:
+    """Scrape runs and per-run ad observations."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def start_run(self, page_id: Optional[str] = None, filters: Optional[Dict] = None) -> int:
+        """Register a new scrape run and return its ID."""
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute("""
+                INSERT INTO scrape_runs (page_id, filters)
+                VALUES (%s, %s)
+                RETURNING id
+            """, (page_id, json.dumps(filters or {})))
+            run_id = cursor.fetchone()[0]
+            self.db.conn.commit()
+            return run_id
+        except Exception:
+            self.db.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def finish_run(self, run_id: int, status: str = 'completed'):
+        """Close a run, counting the ads observed in it."""
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute("""
+                UPDATE scrape_runs
+                SET status = %s,
+                    finished_at = CURRENT_TIMESTAMP,
+                    ads_seen = (SELECT COUNT(*) FROM ad_observations
+                                WHERE run_id = %s AND NOT 'disappeared' = ANY(changed_fields))
+                WHERE id = %s
+            """, (status, run_id, run_id))
+            self.db.conn.commit()
+        except Exception as e:
+            print(f"✗ Error finishing run {run_id}: {e}")
+            self.db.conn.rollback()
+        finally:
+            cursor.close()
+
+    def record_observations(self, cursor, run_id: int, ads: List[Dict]):
+        """Insert one observation per ad, diffed against the current ads rows.
+
+        Must run before the ads upsert in the same transaction, so the
+        join still sees the previous values. Asset URLs are compared by
+        asset_key, since their signature changes on every page load.
+        """
+        rows = [
+            (run_id, ad['ad_id'], ad.get('status', 'unknown'), ad.get('end_date'),
+             ad.get('platforms', []), ad.get('asset_url'))
+            for ad in ads
+        ]
+        execute_values(cursor, """
+            INSERT INTO ad_observations
+                (run_id, ad_id, is_new, changed_fields, status, end_date, platforms, asset_url)
+            SELECT
+                v.run_id,
+                v.ad_id,
+                a.id IS NULL,
+                ARRAY_REMOVE(ARRAY[
+                    CASE WHEN a.status IS DISTINCT FROM v.status THEN 'status' END,
+                    CASE WHEN a.end_date IS DISTINCT FROM v.end_date THEN 'end_date' END,
+                    CASE WHEN a.platforms IS DISTINCT FROM v.platforms THEN 'platforms' END,
+                    CASE WHEN asset_key(a.asset_url) IS DISTINCT FROM asset_key(v.asset_url) THEN 'asset_url' END
+                ], NULL),
+                CASE WHEN a.status IS DISTINCT FROM v.status THEN v.status END,
+                CASE WHEN a.end_date IS DISTINCT FROM v.end_date THEN v.end_date END,
+                CASE WHEN a.platforms IS DISTINCT FROM v.platforms THEN v.platforms END,
+                CASE WHEN asset_key(a.asset_url) IS DISTINCT FROM asset_key(v.asset_url) THEN v.asset_url END
+            FROM (VALUES %s) AS v(run_id, ad_id, status, end_date, platforms, asset_url)
+            LEFT JOIN ads a ON a.ad_id = v.ad_id
+            ON CONFLICT (run_id, ad_id) DO NOTHING
+        """, rows, template="(%s::integer, %s, %s, %s::date, %s::text[], %s)", page_size=1000)
+
+    def reconcile_unseen(self, run_id: int, page_id: str, seen_ad_ids: Iterable[str],
+                         country: Optional[str] = None) -> int:
+        """Mark the page's ads that a complete crawl did not see as disappeared.
+
+        Only call this after a crawl that covered the page's whole feed;
+        after a partial crawl, every ad it did not reach would be marked.
+        Ads known to run only in other countries are left alone. Returns the
+        number of ads marked.
+        """
+        max_fraction = float(os.getenv('RECONCILE_MAX_FRACTION', '0.5'))
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute("""
+                CREATE TEMP TABLE seen_ads (ad_id VARCHAR(255) PRIMARY KEY) ON COMMIT DROP
+            """)
+            cursor.copy_expert(
+                "COPY seen_ads (ad_id) FROM STDIN",
+                io.StringIO(''.join(f"{ad_id}\n" for ad_id in set(seen_ad_ids))),
+            )
+            cursor.execute("ANALYZE seen_ads")
+
+            # Unseen: not in the feed and not written since the run started
+            unseen = """
+                FROM ads a
+                JOIN scrape_runs r ON r.id = %(run_id)s
+                WHERE a.page_id = %(page_id)s
+                  AND a.disappeared_at IS NULL
+                  AND (a.last_seen_at IS NULL OR a.last_seen_at < r.started_at)
+                  AND NOT EXISTS (SELECT 1 FROM seen_ads s WHERE s.ad_id = a.ad_id)
+                  AND (%(country)s IS NULL
+                       OR NOT EXISTS (SELECT 1 FROM ad_countries c WHERE c.ad_id = a.ad_id)
+                       OR EXISTS (SELECT 1 FROM ad_countries c
+                                  WHERE c.ad_id = a.ad_id AND c.country = %(country)s))
+            """
+            params = {'run_id': run_id, 'page_id': page_id, 'country': country}
+
+            # A crawl that lost most of the feed is more likely broken than
+            # the page having pulled most of its ads
+            cursor.execute(f"""
+                SELECT
+                    (SELECT COUNT(*) {unseen}),
+                    (SELECT COUNT(*) FROM ads WHERE page_id = %(page_id)s AND disappeared_at IS NULL)
+            """, params)
+            unseen_count, live_count = cursor.fetchone()
+            if unseen_count and unseen_count > live_count * max_fraction:
+                print(f"  ⚠️  Not reconciling page {page_id}: {unseen_count} of {live_count} ads "
+                      f"unseen (over RECONCILE_MAX_FRACTION={max_fraction})")
+                self.db.conn.rollback()
+                return 0
+
+            cursor.execute(f"""
+                WITH marked AS (
+                    UPDATE ads
+                    SET status = CASE WHEN ads.status = 'active' THEN 'inactive' ELSE ads.status END,
+                        end_date = COALESCE(ads.end_date, ads.last_seen_at::date),
+                        disappeared_at = CURRENT_TIMESTAMP,
+                        updated_at = CURRENT_TIMESTAMP
+                    FROM (SELECT a.id, a.status, a.end_date {unseen}) prev
+                    WHERE ads.id = prev.id
+                    RETURNING ads.ad_id, prev.status AS old_status, prev.end_date AS old_end_date,
+                              ads.status, ads.end_date
+                )
+                INSERT INTO ad_observations (run_id, ad_id, changed_fields, status, end_date)
+                SELECT
+                    %(run_id)s,
+                    ad_id,
+                    ARRAY_REMOVE(ARRAY[
+                        'disappeared',
+                        CASE WHEN status IS DISTINCT FROM old_status THEN 'status' END,
+                        CASE WHEN end_date IS DISTINCT FROM old_end_date THEN 'end_date' END
+                    ], NULL),
+                    CASE WHEN status IS DISTINCT FROM old_status THEN status END,
+                    CASE WHEN end_date IS DISTINCT FROM old_end_date THEN end_date END
+                FROM marked
+                ON CONFLICT (run_id, ad_id) DO NOTHING
+            """, params)
+            marked = cursor.rowcount
+            self.db.conn.commit()
+            return marked
+        except Exception as e:
+            print(f"✗ Error reconciling page {page_id}: {e}")
+            self.db.conn.rollback()
+            return 0
+        finally:
+            cursor.close()
+
+    def active_on(self, day: date) -> List[str]:
+        """IDs of ads whose last recorded status on or before `day` was active.
+
+        Ads with no status recorded by then (such as ads that predate the
+        history and never changed status) are judged by their start and
+        end dates.
+        """
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute("""
+                WITH latest AS (
+                    SELECT DISTINCT ON (ad_id) ad_id, status
+                    FROM ad_observations
+                    WHERE observed_at < %(day)s::date + 1
+                      AND status IS NOT NULL
+                    ORDER BY ad_id, observed_at DESC
+                )
+                SELECT ad_id FROM latest WHERE status = 'active'
+                UNION ALL
+                SELECT a.ad_id FROM ads a
+                WHERE NOT EXISTS (SELECT 1 FROM latest WHERE latest.ad_id = a.ad_id)
+                  AND a.start_date <= %(day)s
+                  AND (a.end_date >= %(day)s OR (a.end_date IS NULL AND a.status = 'active'))
+            """, {'day': day})
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
+
+    def history_for(self, ad_id: str) -> List[Dict]:
+        """All recorded changes for one ad, oldest first."""
+        cursor = self.db.conn.cursor(cursor_factory=RealDictCursor)
+
+        try:
+            cursor.execute("""
+                SELECT run_id, observed_at, is_new, changed_fields,
+                       status, end_date, platforms, asset_url
+                FROM ad_observations
+                WHERE ad_id = %s AND (is_new OR changed_fields <> '{}')
+                ORDER BY observed_at
+            """, (ad_id,))
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
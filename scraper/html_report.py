@@ -2,18 +2,55 @@
 HTML report generator for scraped ads.
 """
 
+import html as html_lib
+import json
 import os
+import re
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional
 from database import Database
 
 
+REPORT_COLUMNS = [
+    'ad_id', 'status', 'platforms', 'start_date', 'end_date',
+    'asset_url', 'asset_type', 'multiple_versions',
+    'body_text', 'headline', 'cta_text',
+]
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens (the report's search box uses the same rule)."""
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+def ad_tokens(ad: dict) -> set:
+    """Distinct search tokens of an ad's ID and copy."""
+    return set(tokenize(' '.join(filter(None, [ad.get('ad_id'), ad.get('headline'),
+                                               ad.get('body_text'), ad.get('cta_text')]))))
+
+
+def build_search_index(ads: List[dict]) -> Dict[str, List[int]]:
+    """Inverted index from token to the positions of the ads containing it."""
+    index: Dict[str, List[int]] = {}
+    for position, ad in enumerate(ads):
+        for token in ad_tokens(ad):
+            index.setdefault(token, []).append(position)
+    return index
+
+
+def report_sort_key(ad: dict) -> tuple:
+    """Report order: active ads first, then by ad ID."""
+    return (ad.get('status', 'unknown') != 'active', ad.get('ad_id', ''))
+
+
 class HTMLReportGenerator:
     """Generate HTML reports from scraped ads."""
     
-    def __init__(self, output_dir: str = "reports"):
+    def __init__(self, output_dir: str = "reports", db: Optional[Database] = None):
         self.output_dir = output_dir
-        self.db = Database()
+        self.db = db if db is not None else Database()
         self._ensure_output_dir()
     
     def _ensure_output_dir(self):
@@ -23,23 +60,17 @@ class HTMLReportGenerator:
     
     def generate_report(self) -> str:
         """Generate HTML report from database."""
-        ads = self.db.get_all_ads()
+        # Only the columns the report renders
+        ads_list = list(self.db.iter_ads(columns=REPORT_COLUMNS))
         
-        if not ads:
+        if not ads_list:
             return self._generate_empty_report()
         
-        # Convert RealDictRow to regular dict
-        # RealDictRow preserves date objects correctly when converted to dict
-        ads_list = []
-        for ad in ads:
-            ad_dict = dict(ad)
-            # Ensure date objects are preserved
-            ads_list.append(ad_dict)
-        
         # Sort ads: active first, then inactive
-        ads_list.sort(key=lambda x: (x.get('status', 'unknown') != 'active', x.get('ad_id', '')))
+        ads_list.sort(key=report_sort_key)
         
-        html_content = self._generate_html(ads_list)
+        analytics = self._compute_analytics()
+        html_content = self._generate_html(ads_list, analytics)
         
         # Save to file
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -49,9 +80,24 @@ class HTMLReportGenerator:
         with open(filepath, 'w', encoding='utf-8') as f:
             f.write(html_content)
         
+        if analytics is not None:
+            json_path = os.path.join(self.output_dir, f"ads_analytics_{timestamp}.json")
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(analytics, f, indent=2)
+            print(f"✓ Analytics JSON written: {json_path}")
+        
         print(f"✓ HTML report generated: {filepath}")
         return filepath
     
+    def _compute_analytics(self) -> Optional[Dict]:
+        """Longevity, cadence, platform mix and inventory analytics, if NumPy is available."""
+        try:
+            from analytics import compute_analytics, load_ad_arrays
+        except ImportError as e:
+            print(f"⚠️  Skipping analytics sections ({e}); install numpy to enable them")
+            return None
+        return compute_analytics(load_ad_arrays(self.db))
+    
     def _generate_empty_report(self) -> str:
         """Generate empty report when no ads found."""
         html = """<!DOCTYPE html>
@@ -83,7 +129,102 @@ class HTMLReportGenerator:
         
         return filepath
     
-    def _generate_html(self, ads: List[dict]) -> str:
+    def _generate_analytics_html(self, analytics: Dict) -> str:
+        """Report sections for the analytics results."""
+        sections = ''
+        
+        longevity = analytics['longevity']['all']
+        if longevity['count']:
+            percentiles = longevity['percentiles']
+            largest = max(bucket['count'] for bucket in longevity['histogram']) or 1
+            bars = ''.join(
+                f'<div class="bar-row"><span class="bar-label">{bucket["from_days"]}-{bucket["to_days"]}d</span>'
+                f'<div class="bar" style="width: {100 * bucket["count"] / largest:.1f}%"></div>'
+                f'<span class="bar-value">{bucket["count"]}</span></div>'
+                for bucket in longevity['histogram'] if bucket['count']
+            )
+            sections += f"""
+        <section class="analytics">
+            <h2>Ad Longevity</h2>
+            <div class="stats">
+                <div class="stat-card"><div class="stat-label">Median run</div><div class="stat-value">{percentiles['p50']:.0f} days</div></div>
+                <div class="stat-card"><div class="stat-label">90th percentile</div><div class="stat-value">{percentiles['p90']:.0f} days</div></div>
+                <div class="stat-card"><div class="stat-label">Mean run</div><div class="stat-value">{longevity['mean_days']} days</div></div>
+                <div class="stat-card"><div class="stat-label">Still running</div><div class="stat-value">{analytics['longevity']['running']['count']}</div></div>
+            </div>
+            <div class="bars">{bars}</div>
+        </section>
+"""
+        
+        cadence = analytics['cadence']
+        if cadence['weeks']:
+            recent = cadence['weeks'][-26:]
+            largest = max(week['launches'] for week in recent) or 1
+            columns = ''.join(
+                f'<div class="column" title="Week of {week["week_start"]}: {week["launches"]} launches" '
+                f'style="height: {100 * week["launches"] / largest:.1f}%"></div>'
+                for week in recent
+            )
+            weekdays = ', '.join(
+                f"{name} {count}" for name, count in zip(['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
+                                                         cadence['weekday_counts'])
+            )
+            sections += f"""
+        <section class="analytics">
+            <h2>Launch Cadence</h2>
+            <p>{cadence['mean_per_week']} launches per week on average (median {cadence['median_per_week']:.0f},
+               max {cadence['max_per_week']}); {cadence['weeks_without_launches']} weeks without launches.</p>
+            <p class="muted">By weekday: {weekdays}</p>
+            <div class="columns">{columns}</div>
+            <p class="muted">Last {len(recent)} weeks, from {recent[0]['week_start']}</p>
+        </section>
+"""
+        
+        mix = analytics['platform_mix']
+        if mix['months']:
+            header = ''.join(f'<th>{html_lib.escape(name.title())}</th>' for name in mix['platforms'])
+            rows = ''.join(
+                f'<tr><td>{month["month"]}</td><td>{month["launches"]}</td>'
+                + ''.join(
+                    f'<td>{100 * month["by_platform"][name] / month["launches"]:.0f}%</td>' if month['launches']
+                    else '<td>-</td>'
+                    for name in mix['platforms']
+                )
+                + '</tr>'
+                for month in reversed(mix['months'][-12:])
+            )
+            sections += f"""
+        <section class="analytics">
+            <h2>Platform Mix by Launch Month</h2>
+            <table><tr><th>Month</th><th>Launches</th>{header}</tr>{rows}</table>
+        </section>
+"""
+        
+        inventory = analytics['active_inventory']
+        if inventory['days']:
+            days = inventory['days']
+            step = max(1, len(days) // 365)
+            sampled = days[::step]
+            width, height = 1000, 160
+            peak = inventory['peak'] or 1
+            points = ' '.join(
+                f"{width * i / max(len(sampled) - 1, 1):.1f},{height - height * day['active'] / peak:.1f}"
+                for i, day in enumerate(sampled)
+            )
+            sections += f"""
+        <section class="analytics">
+            <h2>Active Inventory</h2>
+            <p>Peak of {inventory['peak']} ads running on {inventory['peak_date']}; {inventory['latest']} on {days[-1]['date']}.</p>
+            <svg viewBox="0 0 {width} {height}" preserveAspectRatio="none" class="inventory">
+                <polyline points="{points}" fill="none" stroke="#1877f2" stroke-width="2"/>
+            </svg>
+            <p class="muted">{days[0]['date']} to {days[-1]['date']}</p>
+        </section>
+"""
+        
+        return sections
+    
+    def _generate_html(self, ads: List[dict], analytics: Optional[Dict] = None) -> str:
         """Generate full HTML report."""
         total_ads = len(ads)
         active_ads = sum(1 for ad in ads if ad.get('status') == 'active')
@@ -223,6 +364,109 @@ class HTMLReportGenerator:
             padding: 40px;
             text-align: center;
         }}
+        .ad-copy {{
+            padding: 15px;
+            font-size: 13px;
+            line-height: 1.4;
+            white-space: pre-wrap;
+        }}
+        .ad-headline {{
+            font-weight: bold;
+            padding: 10px 15px 0;
+        }}
+        .ad-cta {{
+            display: inline-block;
+            margin: 10px 15px 15px;
+            padding: 6px 12px;
+            border-radius: 4px;
+            background: #e4e6eb;
+            font-size: 12px;
+            font-weight: bold;
+        }}
+        .search-bar {{
+            display: flex;
+            gap: 10px;
+            margin-top: 20px;
+            flex-wrap: wrap;
+        }}
+        .search-bar input, .search-bar select {{
+            padding: 8px 12px;
+            border: 1px solid #ccd0d5;
+            border-radius: 6px;
+            font-size: 14px;
+        }}
+        .search-bar input {{
+            flex: 1;
+            min-width: 250px;
+        }}
+        .search-count {{
+            align-self: center;
+            color: #65676b;
+            font-size: 13px;
+        }}
+        .analytics {{
+            background: white;
+            padding: 20px 30px;
+            border-radius: 8px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+            margin-bottom: 20px;
+        }}
+        .analytics h2 {{
+            font-size: 18px;
+            margin-bottom: 10px;
+        }}
+        .analytics p {{
+            font-size: 14px;
+            margin-bottom: 8px;
+        }}
+        .analytics .muted {{
+            color: #65676b;
+            font-size: 12px;
+        }}
+        .analytics table {{
+            border-collapse: collapse;
+            font-size: 13px;
+        }}
+        .analytics th, .analytics td {{
+            padding: 4px 12px;
+            border-bottom: 1px solid #e4e6eb;
+            text-align: right;
+        }}
+        .bars {{
+            margin-top: 15px;
+        }}
+        .bar-row {{
+            display: flex;
+            align-items: center;
+            gap: 8px;
+            font-size: 12px;
+            margin-bottom: 4px;
+        }}
+        .bar-label {{
+            width: 80px;
+            color: #65676b;
+        }}
+        .bar {{
+            height: 14px;
+            background: #1877f2;
+            border-radius: 2px;
+        }}
+        .columns {{
+            display: flex;
+            align-items: flex-end;
+            gap: 3px;
+            height: 120px;
+        }}
+        .column {{
+            flex: 1;
+            background: #1877f2;
+            min-height: 1px;
+        }}
+        .inventory {{
+            width: 100%;
+            height: 160px;
+            background: #f0f2f5;
+        }}
         .generated-at {{
             text-align: center;
             color: #8a8d91;
@@ -255,8 +499,21 @@ class HTMLReportGenerator:
                     <div class="stat-value" style="font-size: 18px;">{', '.join(platform_counts.keys()) if platform_counts else 'N/A'}</div>
                 </div>
             </div>
+            <div class="search-bar">
+                <input id="search" type="search" placeholder="Search ad copy or Library ID...">
+                <select id="status-filter">
+                    <option value="">All statuses</option>
+                    <option value="active">Active</option>
+                    <option value="inactive">Inactive</option>
+                </select>
+                <select id="platform-filter">
+                    <option value="">All platforms</option>
+                    {''.join(f'<option value="{html_lib.escape(p)}">{html_lib.escape(p.title())}</option>' for p in sorted(platform_counts))}
+                </select>
+                <span class="search-count" id="search-count">{total_ads} ads</span>
+            </div>
         </header>
-        
+        {self._generate_analytics_html(analytics) if analytics else ''}
         <div class="ads-grid">
 """
         
@@ -322,8 +579,16 @@ class HTMLReportGenerator:
             asset_url = ad.get('asset_url', '')
             asset_type = ad.get('asset_type', 'image')
             
+            copy_html = ''
+            if ad.get('headline'):
+                copy_html += f'<div class="ad-headline">{html_lib.escape(ad["headline"])}</div>'
+            if ad.get('body_text'):
+                copy_html += f'<div class="ad-copy">{html_lib.escape(ad["body_text"])}</div>'
+            if ad.get('cta_text'):
+                copy_html += f'<span class="ad-cta">{html_lib.escape(ad["cta_text"])}</span>'
+            
             html += f"""
-            <div class="ad-card">
+            <div class="ad-card" data-status="{html_lib.escape(ad.get('status') or 'unknown')}" data-platforms="{html_lib.escape(' '.join(platforms) if isinstance(platforms, list) else '')}">
                 <div class="ad-header">
                     <div class="ad-id">Library ID: {ad.get('ad_id', 'N/A')}</div>
                     <span class="ad-status {status_class}">{status_text}</span>
@@ -342,11 +607,14 @@ class HTMLReportGenerator:
             else:
                 html += '                    <div class="no-asset">No asset available</div>'
             
-            html += """
+            html += f"""
                 </div>
+                {copy_html}
             </div>
 """
         
+        search_index = json.dumps(build_search_index(ads), separators=(',', ':'))
+        
         html += f"""
         </div>
         
@@ -354,6 +622,44 @@ class HTMLReportGenerator:
             Report generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         </div>
     </div>
+    <script>
+        // token -> positions of matching cards, precomputed when the report was generated
+        const SEARCH_INDEX = {search_index};
+        const TOKENS = Object.keys(SEARCH_INDEX);
+        const cards = document.querySelectorAll('.ad-card');
+        
+        function matchQuery(query) {{
+            const terms = query.toLowerCase().match(/[a-z0-9]+/g);
+            if (!terms) return null;
+            let result = null;
+            terms.forEach((term, i) => {{
+                // The last term matches as a prefix, so results update while typing
+                const keys = i === terms.length - 1 ? TOKENS.filter(t => t.startsWith(term)) : [term];
+                const hits = new Set();
+                keys.forEach(key => (SEARCH_INDEX[key] || []).forEach(pos => hits.add(pos)));
+                result = result === null ? hits : new Set([...result].filter(pos => hits.has(pos)));
+            }});
+            return result;
+        }}
+        
+        function applyFilters() {{
+            const matches = matchQuery(document.getElementById('search').value);
+            const status = document.getElementById('status-filter').value;
+            const platform = document.getElementById('platform-filter').value;
+            let shown = 0;
+            cards.forEach((card, pos) => {{
+                const visible = (matches === null || matches.has(pos))
+                    && (!status || card.dataset.status === status)
+                    && (!platform || card.dataset.platforms.split(' ').includes(platform));
+                card.style.display = visible ? '' : 'none';
+                if (visible) shown++;
+            }});
+            document.getElementById('search-count').textContent = shown + ' ads';
+        }}
+        
+        ['search', 'status-filter', 'platform-filter'].forEach(id =>
+            document.getElementById(id).addEventListener('input', applyFilters));
+    </script>
 </body>
 </html>"""
         
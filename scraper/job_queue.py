@@ -0,0 +1,149 @@
+"""
+Distributed scrape job queue backed by PostgreSQL.
+
+Workers on any number of hosts claim jobs with `FOR UPDATE SKIP LOCKED`,
+hold them under a time-limited lease that they renew while running, and
+jobs whose worker died are reclaimed once the lease expires.
+"""
+
+import json
+from typing import Dict, List, Optional
+from psycopg2.extras import RealDictCursor
+
+
+class JobQueue:
+    """Scrape jobs stored in the `scrape_jobs` table."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def enqueue(self, page_id: str, filters: Optional[Dict] = None, priority: int = 0,
+                max_ads: Optional[int] = None, max_attempts: int = 3) -> int:
+        """Add a job and return its ID."""
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute("""
+                INSERT INTO scrape_jobs (page_id, filters, priority, max_ads, max_attempts)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING id
+            """, (page_id, json.dumps(filters or {}), priority, max_ads, max_attempts))
+            job_id = cursor.fetchone()[0]
+            self.db.conn.commit()
+            return job_id
+        except Exception:
+            self.db.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def claim(self, worker_id: str, lease_seconds: int = 300) -> Optional[Dict]:
+        """Claim the highest-priority available job, or return None.
+
+        Pending jobs and running jobs whose lease has expired are both
+        claimable. Expired jobs that have used up their attempts are
+        marked failed instead.
+        """
+        cursor = self.db.conn.cursor(cursor_factory=RealDictCursor)
+
+        try:
+            cursor.execute("""
+                UPDATE scrape_jobs
+                SET status = 'failed',
+                    last_error = COALESCE(last_error, 'lease expired'),
+                    finished_at = CURRENT_TIMESTAMP,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'running'
+                  AND lease_expires_at < CURRENT_TIMESTAMP
+                  AND attempts >= max_attempts
+            """)
+            cursor.execute("""
+                UPDATE scrape_jobs
+                SET status = 'running',
+                    worker_id = %s,
+                    attempts = attempts + 1,
+                    lease_expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second',
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM scrape_jobs
+                    WHERE (status = 'pending'
+                           OR (status = 'running' AND lease_expires_at < CURRENT_TIMESTAMP))
+                      AND attempts < max_attempts
+                    ORDER BY priority DESC, id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING id, page_id, filters, max_ads, attempts, max_attempts
+            """, (worker_id, lease_seconds))
+            job = cursor.fetchone()
+            self.db.conn.commit()
+            return dict(job) if job else None
+        except Exception:
+            self.db.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def renew(self, job_id: int, worker_id: str, lease_seconds: int = 300) -> bool:
+        """Extend a job's lease. Returns False if the worker no longer holds it."""
+        return self._update_owned(job_id, worker_id, """
+            UPDATE scrape_jobs
+            SET lease_expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second',
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND worker_id = %s AND status = 'running'
+        """, (lease_seconds,))
+
+    def complete(self, job_id: int, worker_id: str) -> bool:
+        """Mark a job as done."""
+        return self._update_owned(job_id, worker_id, """
+            UPDATE scrape_jobs
+            SET status = 'done',
+                lease_expires_at = NULL,
+                last_error = NULL,
+                finished_at = CURRENT_TIMESTAMP,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND worker_id = %s AND status = 'running'
+        """)
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> bool:
+        """Record a failed attempt; the job is retried until max_attempts."""
+        return self._update_owned(job_id, worker_id, """
+            UPDATE scrape_jobs
+            SET status = CASE WHEN attempts < max_attempts THEN 'pending' ELSE 'failed' END,
+                last_error = %s,
+                lease_expires_at = NULL,
+                finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE CURRENT_TIMESTAMP END,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND worker_id = %s AND status = 'running'
+        """, (error[:2000],))
+
+    def _update_owned(self, job_id: int, worker_id: str, query: str, params: tuple = ()) -> bool:
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute(query, params + (job_id, worker_id))
+            updated = cursor.rowcount == 1
+            self.db.conn.commit()
+            return updated
+        except Exception as e:
+            print(f"✗ Error updating job {job_id}: {e}")
+            self.db.conn.rollback()
+            return False
+        finally:
+            cursor.close()
+
+    def counts(self) -> List[Dict]:
+        """Number of jobs per status."""
+        cursor = self.db.conn.cursor(cursor_factory=RealDictCursor)
+
+        try:
+            cursor.execute("""
+                SELECT status, COUNT(*) AS count
+                FROM scrape_jobs
+                GROUP BY status
+                ORDER BY status
+            """)
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Scrape job queue worker.
+
+Run any number of workers, on any number of hosts, against the same
+database; each claims a job, scrapes its target and moves on.
+
+Usage:
+    python job_worker.py enqueue PAGE_ID [--filter country=GB] [--priority 10] [--max-ads 500]
+    python job_worker.py work [--worker-id NAME] [--lease 300] [--once]
+    python job_worker.py status
+"""
+
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import Database
+from job_queue import JobQueue
+
+
+class LeaseRenewer(threading.Thread):
+    """Background thread that keeps a claimed job's lease alive.
+
+    Uses its own database connection so renewals never interleave with
+    the scraper's transactions.
+    """
+
+    def __init__(self, job_id: int, worker_id: str, lease_seconds: int):
+        super().__init__(name=f"lease-{job_id}", daemon=True)
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        # Set with `lost`; the scraper polls it and aborts its run
+        self.lost_event = threading.Event()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        db = Database()
+        queue = JobQueue(db)
+        try:
+            while not self._stop_event.wait(self.lease_seconds / 3):
+                if not queue.renew(self.job_id, self.worker_id, self.lease_seconds):
+                    print(f"⚠️  Lost lease on job {self.job_id}, aborting its run")
+                    self.lost = True
+                    self.lost_event.set()
+                    return
+        finally:
+            db.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_job(job: dict, assets_dir: str, stop_event: Optional[threading.Event] = None) -> None:
+    """Scrape a claimed job's target. Raises on failure, or when stopped through `stop_event`."""
+    from facebook_ads_scraper import FacebookAdsScraper
+
+    scraper = FacebookAdsScraper(
+        max_ads=job['max_ads'] or int(os.getenv('MAX_ADS', '50')),
+        assets_dir=assets_dir,
+        page_id=job['page_id'],
+        filters=job['filters'],
+        stop_event=stop_event,
+    )
+    try:
+        scraper.scrape_ads()
+        if scraper.error is not None:
+            raise scraper.error
+    finally:
+        scraper.close()
+
+
+def work(args):
+    """Claim and run jobs until the queue is empty (--once) or forever."""
+    worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    db = Database()
+    queue = JobQueue(db)
+    print(f"✓ Worker {worker_id} started")
+
+    try:
+        while True:
+            job = queue.claim(worker_id, args.lease)
+            if job is None:
+                if args.once:
+                    print("✓ No jobs left")
+                    return
+                time.sleep(args.poll)
+                continue
+
+            print(f"\n▶ Job {job['id']}: page {job['page_id']} "
+                  f"(attempt {job['attempts']}/{job['max_attempts']}, filters {job['filters']})")
+            renewer = LeaseRenewer(job['id'], worker_id, args.lease)
+            renewer.start()
+            try:
+                run_job(job, args.assets_dir, renewer.lost_event)
+            except Exception as e:
+                renewer.stop()
+                if renewer.lost:
+                    # Another worker may have reclaimed the job; its run wins
+                    print(f"⚠️  Job {job['id']} aborted after its lease was lost")
+                else:
+                    queue.fail(job['id'], worker_id, str(e))
+                    print(f"✗ Job {job['id']} failed: {e}")
+                continue
+
+            renewer.stop()
+            if renewer.lost:
+                print(f"⚠️  Job {job['id']} finished after its lease was lost")
+            elif queue.complete(job['id'], worker_id):
+                print(f"✓ Job {job['id']} done")
+    except KeyboardInterrupt:
+        print("\n✗ Worker interrupted; unfinished job will be reclaimed after its lease expires")
+    finally:
+        db.close()
+
+
+def enqueue(args):
+    """Add a scrape job."""
+    filters = {}
+    for item in args.filter:
+        key, _, value = item.partition('=')
+        filters[key] = value
+
+    db = Database()
+    try:
+        job_id = JobQueue(db).enqueue(
+            args.page_id, filters, priority=args.priority,
+            max_ads=args.max_ads, max_attempts=args.max_attempts
+        )
+        print(f"✓ Enqueued job {job_id} for page {args.page_id}")
+    finally:
+        db.close()
+
+
+def status(args):
+    """Print job counts per status."""
+    db = Database()
+    try:
+        for row in JobQueue(db).counts():
+            print(f"  {row['status']:<10} {row['count']}")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed scrape job queue")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    enqueue_parser = subparsers.add_parser('enqueue', help="Add a scrape job")
+    enqueue_parser.add_argument('page_id', help="Facebook page ID to scrape")
+    enqueue_parser.add_argument('--filter', action='append', default=[],
+                                help="Ads Library URL filter as key=value (repeatable)")
+    enqueue_parser.add_argument('--priority', type=int, default=0)
+    enqueue_parser.add_argument('--max-ads', type=int, default=None)
+    enqueue_parser.add_argument('--max-attempts', type=int, default=3)
+    enqueue_parser.set_defaults(func=enqueue)
+
+    work_parser = subparsers.add_parser('work', help="Claim and run jobs")
+    work_parser.add_argument('--worker-id', default=None)
+    work_parser.add_argument('--lease', type=int, default=300, help="Lease length in seconds")
+    work_parser.add_argument('--poll', type=int, default=10, help="Seconds between polls when idle")
+    work_parser.add_argument('--once', action='store_true', help="Exit when no jobs are left")
+    work_parser.add_argument('--assets-dir', default='assets')
+    work_parser.set_defaults(func=work)
+
+    status_parser = subparsers.add_parser('status', help="Show job counts")
+    status_parser.set_defaults(func=status)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
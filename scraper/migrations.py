@@ -0,0 +1,422 @@
+"""
+Versioned schema migrations.
+
+Each migration has a version number and a list of SQL statements. It is
+applied once, in its own transaction, and recorded in `schema_version`.
+At connect time a database that is already current costs a single
+one-row query. Pending migrations are applied under an advisory lock, so
+workers starting at the same moment don't race each other.
+
+The early migrations reproduce the tables and indexes that modules used
+to create on the fly. They use IF NOT EXISTS, so databases created
+before migrations existed are adopted as they are.
+
+To change the schema, append a migration with the next version number.
+Never edit one that has shipped.
+"""
+
+from typing import List, NamedTuple
+
+from psycopg2 import errors
+
+
+# Arbitrary key for pg_advisory_xact_lock, shared by everything that migrates
+MIGRATION_LOCK_KEY = 7312049
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    statements: List[str]
+    # Optional migrations that fail (e.g. a missing extension) are recorded
+    # as skipped instead of blocking startup
+    optional: bool = False
+
+
+MIGRATIONS = [
+    Migration(1, 'create ads table', [
+        """
+        CREATE TABLE IF NOT EXISTS ads (
+            id SERIAL PRIMARY KEY,
+            ad_id VARCHAR(255) UNIQUE NOT NULL,
+            status VARCHAR(50) NOT NULL,
+            platforms TEXT[],
+            start_date DATE,
+            end_date DATE,
+            asset_url TEXT,
+            asset_type VARCHAR(50),
+            asset_path TEXT,
+            multiple_versions BOOLEAN DEFAULT FALSE,
+            scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_ad_id ON ads(ad_id)",
+        "CREATE INDEX IF NOT EXISTS idx_status ON ads(status)",
+        "CREATE INDEX IF NOT EXISTS idx_start_date ON ads(start_date)",
+        "CREATE INDEX IF NOT EXISTS idx_platforms ON ads USING GIN(platforms)",
+    ]),
+    Migration(2, 'keyset pagination index', [
+        """
+        CREATE INDEX IF NOT EXISTS idx_start_date_id
+        ON ads (start_date DESC NULLS LAST, id DESC)
+        """,
+    ]),
+    Migration(3, 'scrape job queue', [
+        """
+        CREATE TABLE IF NOT EXISTS scrape_jobs (
+            id SERIAL PRIMARY KEY,
+            page_id VARCHAR(255) NOT NULL,
+            filters JSONB NOT NULL DEFAULT '{}',
+            max_ads INTEGER,
+            priority INTEGER NOT NULL DEFAULT 0,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            worker_id VARCHAR(255),
+            lease_expires_at TIMESTAMP,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        """,
+        # Only claimable jobs are indexed, in claim order
+        """
+        CREATE INDEX IF NOT EXISTS idx_scrape_jobs_claim
+        ON scrape_jobs (priority DESC, id)
+        WHERE status IN ('pending', 'running')
+        """,
+    ]),
+    Migration(4, 'missing asset index', [
+        """
+        CREATE INDEX IF NOT EXISTS idx_ads_missing_asset
+        ON ads ((status <> 'active'), start_date DESC NULLS LAST)
+        WHERE asset_path IS NULL AND asset_url IS NOT NULL
+        """,
+    ]),
+    Migration(5, 'country presence', [
+        """
+        CREATE TABLE IF NOT EXISTS ad_countries (
+            ad_id VARCHAR(255) NOT NULL,
+            country CHAR(2) NOT NULL,
+            first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (ad_id, country)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_ad_countries_country ON ad_countries (country)",
+        """
+        CREATE TABLE IF NOT EXISTS country_sweeps (
+            page_id VARCHAR(255) NOT NULL,
+            country CHAR(2) NOT NULL,
+            swept_at TIMESTAMP NOT NULL,
+            ads_seen INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (page_id, country)
+        )
+        """,
+    ]),
+    Migration(6, 'scrape runs and ad observations', [
+        """
+        CREATE TABLE IF NOT EXISTS scrape_runs (
+            id SERIAL PRIMARY KEY,
+            page_id VARCHAR(255),
+            filters JSONB NOT NULL DEFAULT '{}',
+            status VARCHAR(20) NOT NULL DEFAULT 'running',
+            ads_seen INTEGER NOT NULL DEFAULT 0,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_scrape_runs_page ON scrape_runs (page_id, id DESC)",
+        """
+        CREATE TABLE IF NOT EXISTS ad_observations (
+            run_id INTEGER NOT NULL REFERENCES scrape_runs(id),
+            ad_id VARCHAR(255) NOT NULL,
+            observed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            is_new BOOLEAN NOT NULL DEFAULT FALSE,
+            changed_fields TEXT[] NOT NULL DEFAULT '{}',
+            status VARCHAR(50),
+            end_date DATE,
+            platforms TEXT[],
+            asset_url TEXT,
+            PRIMARY KEY (run_id, ad_id)
+        )
+        """,
+        # Rows arrive in time order, so a BRIN index is tiny and sufficient
+        """
+        CREATE INDEX IF NOT EXISTS idx_ad_observations_observed_at
+        ON ad_observations USING BRIN (observed_at)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_ad_observations_ad
+        ON ad_observations (ad_id, observed_at DESC)
+        """,
+    ]),
+    Migration(7, 'ad copy and full-text search', [
+        """
+        ALTER TABLE ads
+            ADD COLUMN IF NOT EXISTS body_text TEXT,
+            ADD COLUMN IF NOT EXISTS headline TEXT,
+            ADD COLUMN IF NOT EXISTS cta_text VARCHAR(255),
+            ADD COLUMN IF NOT EXISTS link_url TEXT,
+            ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', COALESCE(headline, '')), 'A') ||
+                setweight(to_tsvector('english', COALESCE(body_text, '')), 'B') ||
+                setweight(to_tsvector('english', COALESCE(cta_text, '')), 'C')
+            ) STORED
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_search_vector ON ads USING GIN (search_vector)",
+    ]),
+    # Full-text search works without it; fuzzy search needs pg_trgm
+    Migration(8, 'trigram search index', [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        """
+        CREATE INDEX IF NOT EXISTS idx_search_text_trgm
+        ON ads USING GIN ((COALESCE(headline, '') || ' ' || COALESCE(body_text, '')) gin_trgm_ops)
+        """,
+    ], optional=True),
+    Migration(9, 'scheduler targets', [
+        """
+        CREATE TABLE IF NOT EXISTS scrape_targets (
+            id SERIAL PRIMARY KEY,
+            page_id VARCHAR(255) NOT NULL,
+            filters JSONB NOT NULL DEFAULT '{}',
+            min_interval_seconds INTEGER NOT NULL DEFAULT 3600,
+            max_interval_seconds INTEGER NOT NULL DEFAULT 604800,
+            max_ads INTEGER,
+            enabled BOOLEAN NOT NULL DEFAULT TRUE,
+            runs INTEGER NOT NULL DEFAULT 0,
+            last_run_id INTEGER,
+            last_run_at TIMESTAMP,
+            last_status VARCHAR(20),
+            last_duration_seconds REAL,
+            last_changes INTEGER,
+            change_rate REAL,
+            active_ads INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (page_id, filters)
+        )
+        """,
+    ]),
+    Migration(10, 'ad versions', [
+        """
+        CREATE TABLE IF NOT EXISTS ad_versions (
+            ad_id VARCHAR(255) NOT NULL,
+            version_index INTEGER NOT NULL,
+            body_text TEXT,
+            headline TEXT,
+            cta_text VARCHAR(255),
+            link_url TEXT,
+            asset_url TEXT,
+            asset_type VARCHAR(50),
+            asset_path TEXT,
+            scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (ad_id, version_index)
+        )
+        """,
+    ]),
+    # Paths are relative to the audited assets directory
+    Migration(11, 'asset file audit state', [
+        """
+        CREATE TABLE IF NOT EXISTS asset_files (
+            path TEXT PRIMARY KEY,
+            size BIGINT NOT NULL,
+            mtime_ns BIGINT NOT NULL,
+            sha256 CHAR(64),
+            problem TEXT,
+            checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    # One notification per statement (not per row) listing the changed
+    # ad_ids, for the report server's cache. NOTIFY payloads are limited to
+    # 8000 bytes, so the IDs are sent in chunks of 30.
+    Migration(12, 'ad change notifications', [
+        """
+        CREATE OR REPLACE FUNCTION notify_ads_changed() RETURNS trigger AS $$
+        DECLARE
+            ad_ids TEXT;
+        BEGIN
+            FOR ad_ids IN
+                SELECT string_agg(ad_id, ',')
+                FROM (SELECT ad_id, (row_number() OVER () - 1) / 30 AS chunk FROM changed_rows) numbered
+                GROUP BY chunk
+            LOOP
+                PERFORM pg_notify('ads_changed', ad_ids);
+            END LOOP;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        # Transition tables allow only one event per trigger
+        "DROP TRIGGER IF EXISTS ads_changed_insert ON ads",
+        """
+        CREATE TRIGGER ads_changed_insert AFTER INSERT ON ads
+        REFERENCING NEW TABLE AS changed_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_ads_changed()
+        """,
+        "DROP TRIGGER IF EXISTS ads_changed_update ON ads",
+        """
+        CREATE TRIGGER ads_changed_update AFTER UPDATE ON ads
+        REFERENCING NEW TABLE AS changed_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_ads_changed()
+        """,
+        "DROP TRIGGER IF EXISTS ads_changed_delete ON ads",
+        """
+        CREATE TRIGGER ads_changed_delete AFTER DELETE ON ads
+        REFERENCING OLD TABLE AS changed_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_ads_changed()
+        """,
+    ]),
+    # The page an ad was last seen under and when, so ads that drop out of
+    # a page's feed can be reconciled after a complete crawl
+    Migration(13, 'ad last seen tracking', [
+        """
+        ALTER TABLE ads
+            ADD COLUMN IF NOT EXISTS page_id VARCHAR(255),
+            ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS disappeared_at TIMESTAMP
+        """,
+        """
+        UPDATE ads
+        SET page_id = latest.page_id,
+            last_seen_at = latest.observed_at
+        FROM (
+            SELECT DISTINCT ON (o.ad_id) o.ad_id, r.page_id, o.observed_at
+            FROM ad_observations o
+            JOIN scrape_runs r ON r.id = o.run_id
+            ORDER BY o.ad_id, o.observed_at DESC
+        ) latest
+        WHERE latest.ad_id = ads.ad_id
+        """,
+        "UPDATE ads SET last_seen_at = updated_at WHERE last_seen_at IS NULL",
+        "CREATE INDEX IF NOT EXISTS idx_ads_page_seen ON ads (page_id, last_seen_at)",
+    ]),
+    # Cold ads are reduced to stubs in `ads`; their bulky columns and versions
+    # move to `ads_archive` and their asset files into bundles
+    Migration(14, 'tiered retention', [
+        "ALTER TABLE ads ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP",
+        "CREATE INDEX IF NOT EXISTS idx_ads_archived ON ads (archived_at) WHERE archived_at IS NOT NULL",
+        # A low toast_tuple_target makes TOAST compress even small archived rows
+        """
+        CREATE TABLE IF NOT EXISTS ads_archive (
+            ad_id VARCHAR(255) PRIMARY KEY,
+            page_id VARCHAR(255),
+            archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            data JSONB NOT NULL,
+            versions JSONB
+        ) WITH (toast_tuple_target = 128)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS archived_assets (
+            path TEXT PRIMARY KEY,
+            ad_id VARCHAR(255) NOT NULL,
+            bundle TEXT NOT NULL,
+            member_offset BIGINT NOT NULL,
+            size BIGINT NOT NULL,
+            stored_size BIGINT NOT NULL,
+            codec VARCHAR(10) NOT NULL,
+            sha256 CHAR(64) NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_archived_assets_ad ON archived_assets (ad_id)",
+    ]),
+    Migration(15, 'asset identity', [
+        # fbcdn URLs are signed, and the signature (oe/oh query) changes on
+        # every page load, as can the CDN host; the file name identifies the
+        # asset itself
+        """
+        CREATE OR REPLACE FUNCTION asset_key(url TEXT) RETURNS TEXT AS $$
+            SELECT NULLIF(regexp_replace(split_part(split_part(url, '#', 1), '?', 1), '^.*/', ''), '')
+        $$ LANGUAGE sql IMMUTABLE
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn) -> int:
+    """Highest applied migration, or 0 for a database without schema_version."""
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        version = cursor.fetchone()[0] or 0
+        conn.commit()
+        return version
+    except errors.UndefinedTable:
+        conn.rollback()
+        return 0
+    finally:
+        cursor.close()
+
+
+def migrate(conn) -> int:
+    """Apply pending migrations and return the resulting schema version."""
+    version = current_version(conn)
+    if version >= LATEST_VERSION:
+        return version
+
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'applied',
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    for migration in MIGRATIONS:
+        if migration.version > version:
+            _apply(conn, migration)
+
+    return current_version(conn)
+
+
+def _apply(conn, migration: Migration):
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+        # Another process may have applied it while we waited for the lock
+        cursor.execute("SELECT 1 FROM schema_version WHERE version = %s", (migration.version,))
+        if cursor.fetchone():
+            conn.commit()
+            return
+
+        status = 'applied'
+        cursor.execute("SAVEPOINT migration")
+        try:
+            for statement in migration.statements:
+                cursor.execute(statement)
+        except Exception as e:
+            if not migration.optional:
+                raise
+            cursor.execute("ROLLBACK TO SAVEPOINT migration")
+            print(f"⚠️  Skipped optional migration {migration.version} ({migration.name}): {e}")
+            status = 'skipped'
+
+        cursor.execute("""
+            INSERT INTO schema_version (version, name, status) VALUES (%s, %s, %s)
+        """, (migration.version, migration.name, status))
+        conn.commit()
+        if status == 'applied':
+            print(f"✓ Applied migration {migration.version}: {migration.name}")
+    except Exception as e:
+        conn.rollback()
+        print(f"✗ Migration {migration.version} ({migration.name}) failed: {e}")
+        raise
+    finally:
+        cursor.close()
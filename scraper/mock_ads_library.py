@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Facebook Ads Library, for end-to-end load testing.
+
+Serves a synthetic Ads Library page whose ad containers use the same
+structure and class names the scraper's extractors target, an infinite
+scroll that appends batches of ads (filtered by country, start date and
+media type like the real feed), the JSON pagination endpoint used by
+browserless crawls (with session tokens that can be made to expire), and
+fbcdn-like asset endpoints with configurable latency, sizes and error
+injection.
+
+Point the scraper at it with:
+    ADS_LIBRARY_BASE_URL=http://127.0.0.1:8765/ads/library/
+
+Usage:
+    python mock_ads_library.py [--port 8765] [--total-ads 10000] [--batch-size 30]
+        [--asset-latency 0.05] [--image-size 60000] [--video-size 500000]
+        [--video-ratio 0.2] [--error-rate 0.01] [--throttle-rate 0.01] [--token-ttl 0]
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+FACEBOOK_ICON = '<div class="x1rg5ohu"><div style="mask-position: -13px -2812px;"></div></div>'
+INSTAGRAM_ICON = '<div class="x1rg5ohu"><div style="mask-position: 0px -2825px;"></div></div>'
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Ad Library (local stand-in)</title>
+    <script type="application/json">{{"define":[["LSD",[],{{"token":"{token}"}},323],["DTSGInitialData",[],{{"token":"{token}"}},258]]}}</script>
+</head>
+<body>
+    <div id="feed">{ads}</div>
+    <div id="end-of-feed" style="display: {end_display};">End of results</div>
+    <script>
+        let offset = {next_offset};
+        let loading = false;
+        let done = {done};
+        async function loadMore() {{
+            if (loading || done) return;
+            loading = true;
+            const response = await fetch('batch?{query}offset=' + offset);
+            const html = await response.text();
+            document.getElementById('feed').insertAdjacentHTML('beforeend', html);
+            offset = Number(response.headers.get('X-Next-Offset'));
+            done = offset >= {total_ads};
+            if (done) {{
+                document.getElementById('end-of-feed').style.display = 'block';
+            }}
+            loading = false;
+        }}
+        window.addEventListener('scroll', () => {{
+            if (window.innerHeight + window.scrollY >= document.body.scrollHeight - 200) loadMore();
+        }});
+    </script>
+</body>
+</html>"""
+
+
+# Vocabulary for synthetic ad copy
+COPY_OPENERS = ['New season, new look.', 'Limited time only!', 'Our best seller is back.',
+                'Made for everyday adventures.', 'Join thousands of happy customers.']
+COPY_OFFERS = ['Free shipping on all orders.', 'Save 20% this weekend.', 'Buy one, get one free.',
+               'Try it risk-free for 30 days.', 'Sign up and get early access.']
+COPY_HEADLINES = ['Shop the Collection', 'Summer Sale', 'Get Started Today',
+                  'Discover Something New', 'Exclusive Member Deals']
+COPY_CTAS = ['Shop Now', 'Learn More', 'Sign Up', 'Get Offer']
+
+# Every ad runs in the first country; each other one is a coin flip
+COUNTRIES = ['US', 'GB', 'DE', 'FR', 'CA', 'AU']
+
+
+def _format_date(value: date) -> str:
+    return f"{value.day} {MONTHS[value.month - 1]} {value.year}"
+
+
+class MockAdsLibrary:
+    """Deterministic synthetic ads and the counters the benchmark reads."""
+
+    def __init__(self, total_ads: int = 10000, batch_size: int = 30,
+                 asset_latency: float = 0.05, image_size: int = 60000,
+                 video_size: int = 500000, video_ratio: float = 0.2,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 token_ttl: float = 0.0, seed: int = 42):
+        self.total_ads = total_ads
+        self.batch_size = batch_size
+        self.asset_latency = asset_latency
+        self.image_size = image_size
+        self.video_size = video_size
+        self.video_ratio = video_ratio
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        # Seconds a session token stays valid (0 = forever)
+        self.token_ttl = token_ttl
+        self.seed = seed
+        self.base_url = ''
+
+        self.ads_served = 0
+        self.asset_requests = 0
+        self.asset_bytes = 0
+        self.errors_injected = 0
+        self.search_requests = 0
+        self.tokens_issued = 0
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def ad(self, index: int) -> dict:
+        """Synthetic ad number `index` (stable across requests)."""
+        rng = random.Random(self.seed * 1000003 + index)
+        start = date(2024, 1, 1) + timedelta(days=rng.randint(0, 700))
+        active = rng.random() < 0.6
+        return {
+            'ad_id': str(100000000000000 + index),
+            'active': active,
+            'start_date': start,
+            'end_date': None if active else start + timedelta(days=rng.randint(1, 90)),
+            'instagram': rng.random() < 0.7,
+            'video': rng.random() < self.video_ratio,
+            'multiple_versions': rng.random() < 0.15,
+            'body_text': f"{rng.choice(COPY_OPENERS)} {rng.choice(COPY_OFFERS)}",
+            'headline': rng.choice(COPY_HEADLINES),
+            'cta_text': rng.choice(COPY_CTAS),
+            'countries': COUNTRIES[:1] + [country for country in COUNTRIES[1:] if rng.random() < 0.5],
+        }
+
+    def render_ad(self, index: int) -> str:
+        """HTML for one ad container, matching the scraper's selectors."""
+        ad = self.ad(index)
+        expires = format(int(time.time()) + 86400, 'x')
+        date_text = f"Started running on {_format_date(ad['start_date'])}"
+        if ad['end_date']:
+            date_text += f" · Ended {_format_date(ad['end_date'])}"
+
+        icons = FACEBOOK_ICON + (INSTAGRAM_ICON if ad['instagram'] else '')
+        if ad['video']:
+            media = (f'<video src="{self.base_url}/assets/v/t42/{ad["ad_id"]}.mp4?oe={expires}" '
+                     f'poster="{self.base_url}/assets/v/t39/{ad["ad_id"]}_s600x600.jpg?oe={expires}"></video>')
+        else:
+            media = f'<img src="{self.base_url}/assets/v/t39/{ad["ad_id"]}_s600x600.jpg?oe={expires}">'
+        versions = ('<span>This ad has multiple versions</span>' if ad['multiple_versions'] else '')
+
+        return f"""
+        <div class="xh8yej3">
+            <span>{'Active' if ad['active'] else 'Inactive'}</span>
+            <span>Library ID: {ad['ad_id']}</span>
+            <div class="x3nfvp2 x1e56ztr"><span>{date_text}</span></div>
+            <div><span>Platforms</span><div>{icons}</div></div>
+            {versions}
+            <div data-testid="ad-library-dynamic-content-container">
+                <div style="white-space: pre-wrap">{ad['body_text']}</div>
+                {media}
+                <a href="https://l.facebook.com/l.php?u=https%3A%2F%2Fexample.com%2F{ad['ad_id']}">
+                    <div>EXAMPLE.COM</div>
+                    <div>{ad['headline']}</div>
+                    <div role="button">{ad['cta_text']}</div>
+                </a>
+            </div>
+        </div>"""
+
+    def next_matches(self, offset: int, count: int, params: dict) -> tuple:
+        """Indexes of up to `count` ads passing the filters, scanning from `offset`, and where to resume."""
+        indexes = []
+        index = offset
+        while index < self.total_ads and len(indexes) < count:
+            if self.matches(self.ad(index), params):
+                indexes.append(index)
+            index += 1
+        with self._lock:
+            self.ads_served += len(indexes)
+        return indexes, index
+
+    def render_batch(self, offset: int, params: dict) -> tuple:
+        """(html, next_offset) for the next scroll batch of the filtered feed."""
+        indexes, next_offset = self.next_matches(offset, self.batch_size, params)
+        return ''.join(self.render_ad(i) for i in indexes), next_offset
+
+    def render_page(self, params: dict, token: str = '') -> str:
+        ads, next_offset = self.render_batch(0, params)
+        # Batches are fetched with the page's own filters
+        query = urlencode(params)
+        return PAGE_TEMPLATE.format(
+            token=token,
+            ads=ads,
+            next_offset=next_offset,
+            total_ads=self.total_ads,
+            done='true' if next_offset >= self.total_ads else 'false',
+            # A feed that fits on the first page shows its end marker right away
+            end_display='block' if next_offset >= self.total_ads else 'none',
+            query=f"{query}&" if query else '',
+        )
+
+    def render_single(self, ad_id: str) -> str:
+        """Detail page for a single ad, listing every version of multi-version ads."""
+        index = int(ad_id) - 100000000000000
+        body = ''
+        if 0 <= index < self.total_ads:
+            body = self.render_ad(index)
+            if self.ad(index)['multiple_versions']:
+                body += f'<div id="versions">{self.render_versions(index)}</div>'
+        return f"<!DOCTYPE html><html><body><div id=\"feed\">{body}</div></body></html>"
+
+    def render_versions(self, index: int) -> str:
+        """Version blocks of a multi-version ad (2-4 creatives, the first is the feed one)."""
+        ad = self.ad(index)
+        rng = random.Random(self.seed * 7919 + index)
+        expires = format(int(time.time()) + 86400, 'x')
+        blocks = []
+        for version in range(rng.randint(2, 4)):
+            asset_id = ad['ad_id'] if version == 0 else f"{ad['ad_id']}_{version}"
+            body_text = ad['body_text'] if version == 0 else f"{rng.choice(COPY_OPENERS)} {rng.choice(COPY_OFFERS)}"
+            headline = ad['headline'] if version == 0 else rng.choice(COPY_HEADLINES)
+            blocks.append(f"""
+            <div data-testid="ad-version">
+                <div data-testid="ad-library-dynamic-content-container">
+                    <div style="white-space: pre-wrap">{body_text}</div>
+                    <img src="{self.base_url}/assets/v/t39/{asset_id}_s600x600.jpg?oe={expires}">
+                    <a href="https://l.facebook.com/l.php?u=https%3A%2F%2Fexample.com%2F{ad['ad_id']}">
+                        <div>EXAMPLE.COM</div>
+                        <div>{headline}</div>
+                        <div role="button">{ad['cta_text']}</div>
+                    </a>
+                </div>
+            </div>""")
+        return ''.join(blocks)
+
+    def issue_token(self) -> str:
+        """New session token, as embedded in each page load."""
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._tokens[token] = time.monotonic()
+            self.tokens_issued += 1
+        return token
+
+    def token_valid(self, token: str) -> bool:
+        with self._lock:
+            issued = self._tokens.get(token)
+        if issued is None:
+            return False
+        return not self.token_ttl or time.monotonic() - issued < self.token_ttl
+
+    def matches(self, ad: dict, params: dict) -> bool:
+        """Whether an ad passes the feed's country, start-date and media-type filters."""
+        country = params.get('country', 'ALL')
+        if country not in ('', 'ALL') and country not in ad['countries']:
+            return False
+        start = ad['start_date'].isoformat()
+        if params.get('start_date[min]') and start < params['start_date[min]']:
+            return False
+        if params.get('start_date[max]') and start > params['start_date[max]']:
+            return False
+        media_type = params.get('media_type', 'all')
+        if media_type == 'video':
+            return ad['video']
+        if media_type == 'image':
+            return not ad['video']
+        return media_type == 'all'
+
+    def search_result(self, index: int) -> dict:
+        """One ad in the shape of the pagination endpoint's results."""
+        ad = self.ad(index)
+        expires = format(int(time.time()) + 86400, 'x')
+        image_url = f"{self.base_url}/assets/v/t39/{ad['ad_id']}_s600x600.jpg?oe={expires}"
+        snapshot = {
+            'body': {'text': ad['body_text']},
+            'title': ad['headline'],
+            'cta_text': ad['cta_text'],
+            'link_url': f"https://example.com/{ad['ad_id']}",
+            'images': [] if ad['video'] else [{'original_image_url': image_url}],
+            'videos': [{
+                'video_hd_url': f"{self.base_url}/assets/v/t42/{ad['ad_id']}.mp4?oe={expires}",
+                'video_preview_image_url': image_url,
+            }] if ad['video'] else [],
+        }
+
+        def timestamp(value):
+            return int(datetime(value.year, value.month, value.day, tzinfo=timezone.utc).timestamp())
+
+        return {
+            'adArchiveID': ad['ad_id'],
+            'isActive': ad['active'],
+            'publisherPlatform': ['FACEBOOK'] + (['INSTAGRAM'] if ad['instagram'] else []),
+            'startDate': timestamp(ad['start_date']),
+            'endDate': timestamp(ad['end_date']) if ad['end_date'] else None,
+            'collationCount': 2 if ad['multiple_versions'] else 1,
+            'snapshot': snapshot,
+        }
+
+    def search(self, params: dict) -> str:
+        """Body of a pagination response: a page of matching ads and the next cursor."""
+        with self._lock:
+            self.search_requests += 1
+        if not self.token_valid(params.get('lsd', '')):
+            return 'for (;;);' + json.dumps({
+                'error': 1357004, 'errorSummary': 'Sorry, something went wrong',
+                'errorDescription': 'Please try closing and re-opening your browser window.',
+            })
+
+        count = int(params.get('count', self.batch_size))
+        # The cursor is the index to resume scanning from
+        indexes, index = self.next_matches(int(params.get('forward_cursor') or 0), count, params)
+        results = [self.search_result(i) for i in indexes]
+
+        return 'for (;;);' + json.dumps({'payload': {
+            'results': [[result] for result in results],
+            'forwardCursor': str(index) if index < self.total_ads else None,
+            'totalCount': self.total_ads,
+        }})
+
+    def asset_response(self, path: str) -> tuple:
+        """(status, content_type, body) for an asset request, with injected faults."""
+        with self._lock:
+            self.asset_requests += 1
+        if self.asset_latency:
+            time.sleep(self.asset_latency)
+
+        roll = random.random()
+        if roll < self.throttle_rate:
+            with self._lock:
+                self.errors_injected += 1
+            return 429, 'text/plain', b'rate limited'
+        if roll < self.throttle_rate + self.error_rate:
+            with self._lock:
+                self.errors_injected += 1
+            return 503, 'text/plain', b'unavailable'
+
+        is_video = path.endswith('.mp4')
+        size = self.video_size if is_video else self.image_size
+        with self._lock:
+            self.asset_bytes += size
+        return 200, 'video/mp4' if is_video else 'image/jpeg', b'\0' * size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'ads_served': self.ads_served,
+                'asset_requests': self.asset_requests,
+                'asset_bytes': self.asset_bytes,
+                'errors_injected': self.errors_injected,
+                'search_requests': self.search_requests,
+                'tokens_issued': self.tokens_issued,
+            }
+
+
+def make_handler(library: MockAdsLibrary):
+    """Request handler class bound to a MockAdsLibrary."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            query = parse_qs(parsed.query)
+            # The feed's filters, as the scraper put them in the URL
+            params = {key: values[0] for key, values in query.items() if key != 'offset'}
+            headers = {}
+
+            if parsed.path.startswith('/assets/'):
+                status, content_type, body = library.asset_response(parsed.path)
+            elif parsed.path == '/ads/library/batch':
+                offset = int(query.get('offset', ['0'])[0])
+                html, next_offset = library.render_batch(offset, params)
+                headers['X-Next-Offset'] = str(next_offset)
+                status, content_type, body = 200, 'text/html', html.encode()
+            elif parsed.path == '/ads/library/':
+                if 'id' in query:
+                    html = library.render_single(query['id'][0])
+                else:
+                    html = library.render_page(params, library.issue_token())
+                    headers['Set-Cookie'] = f"datr={uuid.uuid4().hex}; Path=/"
+                status, content_type, body = 200, 'text/html; charset=utf-8', html.encode()
+            else:
+                status, content_type, body = 404, 'text/plain', b'not found'
+
+            self.respond(status, content_type, body, headers)
+
+        def do_POST(self):
+            parsed = urlparse(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            form = self.rfile.read(length).decode() if length else ''
+            # Query string and form body together, as the real endpoint accepts
+            params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+            params.update({k: v[0] for k, v in parse_qs(form).items()})
+
+            if parsed.path == '/ads/library/async/search_ads/':
+                status, content_type, body = 200, 'application/x-javascript', library.search(params).encode()
+            else:
+                status, content_type, body = 404, 'text/plain', b'not found'
+
+            self.respond(status, content_type, body)
+
+        def respond(self, status: int, content_type: str, body: bytes, headers: dict = None):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_server(library: MockAdsLibrary, host: str = '127.0.0.1', port: int = 8765) -> ThreadingHTTPServer:
+    """Start the stand-in server on a background thread."""
+    server = ThreadingHTTPServer((host, port), make_handler(library))
+    server.daemon_threads = True
+    library.base_url = f"http://{host}:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, name='mock-ads-library', daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Ads Library stand-in server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--total-ads', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=30, help="Ads appended per scroll")
+    parser.add_argument('--asset-latency', type=float, default=0.05, help="Seconds per asset request")
+    parser.add_argument('--image-size', type=int, default=60000, help="Bytes per image")
+    parser.add_argument('--video-size', type=int, default=500000, help="Bytes per video")
+    parser.add_argument('--video-ratio', type=float, default=0.2)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of asset requests answered with 503")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of asset requests answered with 429")
+    parser.add_argument('--token-ttl', type=float, default=0.0,
+                        help="Seconds before a session token expires (0 = never)")
+    args = parser.parse_args()
+
+    library = MockAdsLibrary(
+        total_ads=args.total_ads, batch_size=args.batch_size,
+        asset_latency=args.asset_latency, image_size=args.image_size,
+        video_size=args.video_size, video_ratio=args.video_ratio,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+        token_ttl=args.token_ttl,
+    )
+    server = start_server(library, args.host, args.port)
+    print(f"✓ Ads Library stand-in running at {library.base_url}/ads/library/")
+    print(f"  Set ADS_LIBRARY_BASE_URL={library.base_url}/ads/library/ to scrape it")
+
+    try:
+        while True:
+            time.sleep(10)
+            print(f"  {library.stats()}")
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("\n✓ Server stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Staged producer/consumer pipeline for the scraper.
+
+The browser thread only extracts ads and pushes them into a bounded queue.
+Asset downloads and sink writes run in their own worker threads, so the
+browser never waits on network or database I/O. When a downstream stage
+falls behind, its queue fills up and the browser is slowed down
+(backpressure) instead of piling up unbounded work in memory.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+# Marker telling a worker thread to exit
+_STOP = object()
+
+
+class StageCounter:
+    """Thread-safe processed/error counters with throughput."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.processed = 0
+        self.errors = 0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, ok: bool = True):
+        with self._lock:
+            if ok:
+                self.processed += 1
+            else:
+                self.errors += 1
+
+    def throughput(self) -> float:
+        """Items processed per second since the stage started."""
+        elapsed = time.monotonic() - self.started_at
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            'name': self.name,
+            'processed': self.processed,
+            'errors': self.errors,
+            'throughput': round(self.throughput(), 2),
+        }
+
+
+class PipelineStage:
+    """A bounded queue drained by one or more worker threads.
+
+    Each item is passed to `handler`; a non-None return value is forwarded
+    to the downstream stage.
+    """
+
+    def __init__(self, name: str, handler: Callable, workers: int = 1,
+                 maxsize: int = 100, downstream: Optional['PipelineStage'] = None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.downstream = downstream
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.counter = StageCounter(name)
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        """Start worker threads."""
+        self.counter.started_at = time.monotonic()
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._run, name=f"{self.name}-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, item):
+        """Enqueue an item, blocking while the queue is full."""
+        self.queue.put(item)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is _STOP:
+                    return
+                try:
+                    result = self.handler(item)
+                    self.counter.record(ok=True)
+                except Exception as e:
+                    self.counter.record(ok=False)
+                    print(f"    ✗ Error in {self.name} stage: {e}")
+                    continue
+                if result is not None and self.downstream is not None:
+                    self.downstream.put(result)
+            finally:
+                self.queue.task_done()
+
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def load(self) -> float:
+        """Queue fill ratio between 0 and 1."""
+        return self.queue.qsize() / self.queue.maxsize if self.queue.maxsize else 0.0
+
+    def close(self):
+        """Drain the queue, stop workers, then close the downstream stage."""
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self.downstream is not None:
+            self.downstream.close()
+
+    def stats(self) -> Dict:
+        stats = self.counter.stats()
+        stats['queue_depth'] = self.depth()
+        stats['queue_size'] = self.queue.maxsize
+        stats['workers'] = self.workers
+        return stats
+
+
+class ScrapePipeline:
+    """Extraction -> asset fetching -> sink writing.
+
+    The browser thread acts as the extraction stage and calls `submit` for
+    every ad it extracts.
+    """
+
+    def __init__(self, fetch_asset: Callable, write_ad: Callable,
+                 asset_workers: int = 4, queue_size: int = 100,
+                 high_water: float = 0.8):
+        self.high_water = high_water
+        self.extract_counter = StageCounter('extract')
+        self.sink_stage = PipelineStage('sink', write_ad, workers=1, maxsize=queue_size)
+        self.asset_stage = PipelineStage(
+            'assets', fetch_asset, workers=asset_workers,
+            maxsize=queue_size, downstream=self.sink_stage
+        )
+        self.stages = [self.asset_stage, self.sink_stage]
+
+    def start(self):
+        self.extract_counter.started_at = time.monotonic()
+        for stage in self.stages:
+            stage.start()
+
+    def submit(self, ad_data: dict):
+        """Hand an extracted ad to the download/write stages."""
+        self.extract_counter.record(ok=True)
+        self.asset_stage.put(ad_data)
+
+    def wait_for_capacity(self, poll_interval: float = 0.2, max_wait: float = 60.0):
+        """Block while any downstream queue is above the high-water mark.
+
+        Called before scrolling so the browser does not load more ads than
+        the download and write stages can keep up with.
+        """
+        deadline = time.monotonic() + max_wait
+        while any(stage.load() >= self.high_water for stage in self.stages):
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(poll_interval)
+
+    def close(self):
+        """Wait for all queued work to finish and stop the workers."""
+        self.asset_stage.close()
+
+    def stats(self) -> List[Dict]:
+        return [self.extract_counter.stats()] + [stage.stats() for stage in self.stages]
+
+    def format_stats(self) -> str:
+        parts = []
+        for stats in self.stats():
+            part = f"{stats['name']}: {stats['processed']} ({stats['throughput']}/s)"
+            if 'queue_depth' in stats:
+                part += f" q={stats['queue_depth']}/{stats['queue_size']}"
+            if stats['errors']:
+                part += f" err={stats['errors']}"
+            parts.append(part)
+        return ' | '.join(parts)
@@ -0,0 +1,165 @@
+"""
+Adaptive (AIMD) concurrency and rate control for outgoing requests.
+
+A single controller is shared by asset downloads and page navigation.
+While requests succeed with healthy latency, the concurrency limit grows
+additively and the spacing between requests shrinks. On throttling
+signals (429/5xx responses, timeouts, connection resets) the limit is cut
+multiplicatively and the spacing doubles. Failed calls are retried with
+jittered exponential backoff.
+"""
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+
+class ThrottledError(Exception):
+    """Raised when a request was rejected or timed out in a way that signals overload."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AdaptiveRateController:
+    """AIMD controller for request concurrency and spacing."""
+
+    def __init__(self, name: str = 'requests', min_concurrency: int = 1,
+                 max_concurrency: int = 8, initial_concurrency: int = 2,
+                 target_latency: float = 3.0, decrease_factor: float = 0.5,
+                 max_interval: float = 10.0, max_retries: int = 4,
+                 base_backoff: float = 0.5, max_backoff: float = 30.0,
+                 cooldown: float = 2.0):
+        self.name = name
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(max(min_concurrency, min(initial_concurrency, max_concurrency)))
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.interval = 0.0  # Minimum seconds between request starts
+        self.max_interval = max_interval
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.cooldown = cooldown
+
+        self.in_flight = 0
+        self.successes = 0
+        self.throttles = 0
+        self.retries = 0
+        self.failures = 0
+        self.avg_latency = 0.0
+        self.error_rate = 0.0  # EWMA of throttle signals per request
+
+        self._last_start = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        """Wait for a free slot (and the request spacing), then hold it."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = self._last_start + self.interval - now
+                if self.in_flight < int(self.limit) and wait <= 0:
+                    break
+                self._cond.wait(timeout=wait if wait > 0 else 0.5)
+            self.in_flight += 1
+            self._last_start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def on_success(self, latency: float):
+        """Additive increase while latency stays under target."""
+        with self._cond:
+            self.successes += 1
+            self.avg_latency = latency if self.avg_latency == 0 else 0.8 * self.avg_latency + 0.2 * latency
+            self.error_rate *= 0.95
+            if latency <= self.target_latency:
+                # Roughly +1 slot per window of `limit` successful requests
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+                self.interval = max(0.0, self.interval * 0.9 - 0.01)
+            self._cond.notify_all()
+
+    def on_throttle(self):
+        """Multiplicative decrease, at most once per cooldown period."""
+        with self._cond:
+            self.throttles += 1
+            self.error_rate = 0.95 * self.error_rate + 0.05
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+            self.interval = min(self.max_interval, max(0.25, self.interval * 2))
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry attempt."""
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    def call(self, fn: Callable, is_throttle: Callable[[Exception], bool] = None):
+        """Run `fn` under the controller, retrying throttled failures.
+
+        `is_throttle` decides whether an exception is an overload signal
+        worth retrying; other exceptions are raised immediately.
+        """
+        if is_throttle is None:
+            is_throttle = lambda e: isinstance(e, ThrottledError)
+
+        attempt = 0
+        while True:
+            with self.slot():
+                started = time.monotonic()
+                try:
+                    result = fn()
+                except Exception as e:
+                    if not is_throttle(e):
+                        with self._cond:
+                            self.failures += 1
+                        raise
+                    error = e
+                else:
+                    self.on_success(time.monotonic() - started)
+                    return result
+
+            self.on_throttle()
+            if attempt >= self.max_retries:
+                with self._cond:
+                    self.failures += 1
+                raise error
+            with self._cond:
+                self.retries += 1
+            time.sleep(self.backoff_delay(attempt))
+            attempt += 1
+
+    def snapshot(self) -> Dict:
+        """Current controller state for monitoring."""
+        with self._cond:
+            return {
+                'name': self.name,
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'interval': round(self.interval, 3),
+                'avg_latency': round(self.avg_latency, 3),
+                'error_rate': round(self.error_rate, 3),
+                'successes': self.successes,
+                'throttles': self.throttles,
+                'retries': self.retries,
+                'failures': self.failures,
+            }
+
+    def format_stats(self) -> str:
+        snap = self.snapshot()
+        return (
+            f"{snap['name']}: limit={snap['limit']} in_flight={snap['in_flight']} "
+            f"gap={snap['interval']}s lat={snap['avg_latency']}s "
+            f"throttled={snap['throttles']} retries={snap['retries']} failed={snap['failures']}"
+        )
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Long-lived local report server.
+
+Every ad's report columns are loaded once into an in-memory cache, indexed
+by status, platform and search token. Triggers on the ads table (migration
+12) send an `ads_changed` notification listing the changed ad IDs after
+every insert, update or delete statement. The server listens for them,
+re-reads only those rows in one query and applies them to the cache.
+
+The HTML report and the JSON views are served from the cache. The report
+and analytics are rendered again only after the data has changed, and at
+most once every --render-interval seconds.
+
+Usage:
+    python report_server.py [--host 127.0.0.1] [--port 8080] [--render-interval 5]
+
+Endpoints:
+    /                   HTML report
+    /api/ads            ads as JSON (?status=&platform=&q=&limit=100&offset=0)
+    /api/ads/<ad_id>    one ad
+    /api/stats          counts and cache state
+    /api/analytics      longevity, cadence, platform mix and inventory
+"""
+
+import argparse
+import json
+import os
+import select
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Set
+from urllib.parse import parse_qs, unquote, urlparse
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from psycopg2.extras import RealDictCursor
+from database import Database
+from html_report import REPORT_COLUMNS, HTMLReportGenerator, ad_tokens, report_sort_key, tokenize
+
+
+# Channel the ads table triggers notify on (see migration 12)
+NOTIFY_CHANNEL = 'ads_changed'
+
+MAX_PAGE_SIZE = 1000
+
+
+class AdCache:
+    """Report rows keyed by ad_id, with indexes for the JSON views."""
+
+    def __init__(self):
+        self.ads: Dict[str, Dict] = {}
+        self.by_status: Dict[str, Set[str]] = {}
+        self.by_platform: Dict[str, Set[str]] = {}
+        self.tokens: Dict[str, Set[str]] = {}
+        self.version = 0
+        self.loaded_at: Optional[datetime] = None
+        self.updated_at: Optional[datetime] = None
+        self._ordered: Optional[List[Dict]] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ads)
+
+    def _index(self, ad: Dict):
+        ad_id = ad['ad_id']
+        self.by_status.setdefault(ad.get('status') or 'unknown', set()).add(ad_id)
+        for platform in ad.get('platforms') or []:
+            self.by_platform.setdefault(platform.lower(), set()).add(ad_id)
+        for token in ad_tokens(ad):
+            self.tokens.setdefault(token, set()).add(ad_id)
+
+    def _unindex(self, ad: Dict):
+        ad_id = ad['ad_id']
+        keys = [(self.by_status, ad.get('status') or 'unknown')]
+        keys += [(self.by_platform, platform.lower()) for platform in ad.get('platforms') or []]
+        keys += [(self.tokens, token) for token in ad_tokens(ad)]
+        for index, key in keys:
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(ad_id)
+                if not ids:
+                    del index[key]
+
+    def load(self, rows):
+        """Replace the whole cache. Readers keep the old data until the swap."""
+        fresh = AdCache()
+        for row in rows:
+            fresh.ads[row['ad_id']] = row
+            fresh._index(row)
+
+        with self._lock:
+            self.ads = fresh.ads
+            self.by_status = fresh.by_status
+            self.by_platform = fresh.by_platform
+            self.tokens = fresh.tokens
+            self.version += 1
+            self.loaded_at = self.updated_at = datetime.now()
+            self._ordered = None
+
+    def apply(self, ad_ids, rows: List[Dict]):
+        """Swap in the current rows of changed ads; IDs without a row were deleted."""
+        current = {row['ad_id']: row for row in rows}
+        with self._lock:
+            for ad_id in ad_ids:
+                old = self.ads.pop(ad_id, None)
+                if old is not None:
+                    self._unindex(old)
+                row = current.get(ad_id)
+                if row is not None:
+                    self.ads[ad_id] = row
+                    self._index(row)
+            self.version += 1
+            self.updated_at = datetime.now()
+            self._ordered = None
+
+    def _ordered_ads(self) -> List[Dict]:
+        # Sorted once per version; the caller holds the lock
+        if self._ordered is None:
+            self._ordered = sorted(self.ads.values(), key=report_sort_key)
+        return self._ordered
+
+    def snapshot(self) -> List[Dict]:
+        """All ads in report order."""
+        with self._lock:
+            return self._ordered_ads()
+
+    def get(self, ad_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self.ads.get(ad_id)
+
+    def query(self, status: Optional[str] = None, platform: Optional[str] = None,
+              q: Optional[str] = None, limit: int = 100, offset: int = 0) -> Dict:
+        """One page of matching ads in report order."""
+        with self._lock:
+            candidates = None
+            filters = []
+            if status:
+                filters.append(self.by_status.get(status, set()))
+            if platform:
+                filters.append(self.by_platform.get(platform.lower(), set()))
+            terms = tokenize(q) if q else []
+            for position, term in enumerate(terms):
+                if position == len(terms) - 1:
+                    # Like the report's search box, the last term matches as a prefix
+                    filters.append(set().union(*(ids for token, ids in self.tokens.items()
+                                                 if token.startswith(term))))
+                else:
+                    filters.append(self.tokens.get(term, set()))
+            for ids in sorted(filters, key=len):
+                candidates = set(ids) if candidates is None else candidates & ids
+
+            if candidates is None:
+                matched = self._ordered_ads()
+            else:
+                matched = sorted((self.ads[ad_id] for ad_id in candidates), key=report_sort_key)
+            version = self.version
+
+        return {
+            'version': version,
+            'total': len(matched),
+            'offset': offset,
+            'ads': matched[offset:offset + limit],
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'ads': len(self.ads),
+                'by_status': {status: len(ids) for status, ids in self.by_status.items()},
+                'by_platform': {platform: len(ids) for platform, ids in self.by_platform.items()},
+                'tokens': len(self.tokens),
+                'version': self.version,
+                'loaded_at': self.loaded_at,
+                'updated_at': self.updated_at,
+            }
+
+
+class CacheListener(threading.Thread):
+    """Load the cache, then keep it current from change notifications.
+
+    On a lost connection it reconnects and reloads everything, since
+    notifications sent while it was away are gone.
+    """
+
+    def __init__(self, cache: AdCache, reconnect_delay: float = 5.0, batch_size: int = 5000):
+        super().__init__(name='report-cache-listener', daemon=True)
+        self.cache = cache
+        self.reconnect_delay = reconnect_delay
+        self.batch_size = batch_size
+        self.notifications = 0
+        self.rows_applied = 0
+        self.ready = threading.Event()
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.is_set():
+            db = None
+            try:
+                db = Database()
+                self.listen(db)
+            except Exception as e:
+                if self.stopping.is_set():
+                    break
+                print(f"⚠️  Cache listener lost its connection ({e}); reconnecting in {self.reconnect_delay}s")
+                self.stopping.wait(self.reconnect_delay)
+            finally:
+                if db is not None:
+                    try:
+                        db.close()
+                    except Exception:
+                        pass
+
+    def listen(self, db: Database):
+        conn = db.conn
+        conn.autocommit = True
+        cursor = conn.cursor()
+        try:
+            # Listen before loading, so changes made during the load aren't missed
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        finally:
+            cursor.close()
+
+        started = time.monotonic()
+        self.cache.load(db.iter_ads(columns=REPORT_COLUMNS, batch_size=self.batch_size))
+        print(f"✓ Loaded {len(self.cache)} ads into the cache in {time.monotonic() - started:.1f}s")
+        self.ready.set()
+
+        while not self.stopping.is_set():
+            if select.select([conn], [], [], 1.0) == ([], [], []):
+                continue
+            conn.poll()
+            ad_ids = set()
+            while conn.notifies:
+                notification = conn.notifies.pop(0)
+                self.notifications += 1
+                ad_ids.update(notification.payload.split(','))
+            if ad_ids:
+                self.refresh(db, ad_ids)
+
+    def refresh(self, db: Database, ad_ids: Set[str]):
+        """Re-read changed ads and apply them to the cache."""
+        cursor = db.conn.cursor(cursor_factory=RealDictCursor)
+
+        try:
+            cursor.execute(f"""
+                SELECT {', '.join(REPORT_COLUMNS)} FROM ads
+                WHERE ad_id = ANY(%s) AND archived_at IS NULL
+            """, (list(ad_ids),))
+            rows = [dict(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+        self.cache.apply(ad_ids, rows)
+        self.rows_applied += len(ad_ids)
+
+    def stop(self):
+        self.stopping.set()
+
+
+class ReportViews:
+    """Rendered report and analytics, rebuilt only when the cache changed."""
+
+    def __init__(self, cache: AdCache, generator: HTMLReportGenerator, render_interval: float = 5.0):
+        self.cache = cache
+        self.generator = generator
+        self.render_interval = render_interval
+        self.renders = 0
+        self._built: Dict[str, tuple] = {}
+        self._lock = threading.RLock()
+
+    def _cached(self, name: str, build: Callable):
+        """(value, version) of a view, rebuilding it if it is stale and old enough."""
+        with self._lock:
+            version = self.cache.version
+            entry = self._built.get(name)
+            if entry is None or (entry[1] != version and time.monotonic() - entry[2] >= self.render_interval):
+                entry = (build(), version, time.monotonic())
+                self._built[name] = entry
+            return entry[0], entry[1]
+
+    def analytics(self):
+        def build():
+            try:
+                from analytics import arrays_from_ads, compute_analytics
+            except ImportError as e:
+                print(f"⚠️  Skipping analytics ({e}); install numpy to enable them")
+                return None
+            return compute_analytics(arrays_from_ads(self.cache.snapshot()))
+        return self._cached('analytics', build)
+
+    def html(self):
+        def build():
+            self.renders += 1
+            analytics, _ = self.analytics()
+            return self.generator._generate_html(self.cache.snapshot(), analytics).encode('utf-8')
+        return self._cached('html', build)
+
+
+def _json_default(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def make_handler(cache: AdCache, views: ReportViews, listener: CacheListener):
+    """Request handler class bound to the cache."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+            path = parsed.path.rstrip('/') or '/'
+
+            if not listener.ready.is_set():
+                return self.respond(503, 'text/plain', b'cache is loading')
+
+            if path == '/':
+                body, version = views.html()
+                return self.respond(200, 'text/html; charset=utf-8', body, version)
+            if path == '/api/ads':
+                try:
+                    limit = min(int(query.get('limit', 100)), MAX_PAGE_SIZE)
+                    offset = max(int(query.get('offset', 0)), 0)
+                except ValueError:
+                    return self.respond(400, 'text/plain', b'limit and offset must be integers')
+                result = cache.query(query.get('status'), query.get('platform'), query.get('q'), limit, offset)
+                return self.respond_json(result)
+            if path.startswith('/api/ads/'):
+                ad = cache.get(unquote(path[len('/api/ads/'):]))
+                if ad is None:
+                    return self.respond(404, 'text/plain', b'no such ad')
+                return self.respond_json(ad)
+            if path == '/api/stats':
+                stats = cache.stats()
+                stats.update(notifications=listener.notifications, rows_applied=listener.rows_applied,
+                             renders=views.renders)
+                return self.respond_json(stats)
+            if path == '/api/analytics':
+                analytics, version = views.analytics()
+                if analytics is None:
+                    return self.respond(501, 'text/plain', b'analytics need numpy')
+                return self.respond_json(analytics, version)
+            self.respond(404, 'text/plain', b'not found')
+
+        def respond_json(self, value, version: Optional[int] = None):
+            body = json.dumps(value, default=_json_default).encode('utf-8')
+            self.respond(200, 'application/json', body, version)
+
+        def respond(self, status: int, content_type: str, body: bytes, version: Optional[int] = None):
+            etag = f'"{version}"' if version is not None else None
+            if etag and self.headers.get('If-None-Match') == etag:
+                status, body = 304, b''
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            if etag:
+                self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the ads report from an in-memory cache")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--render-interval', type=float, default=5.0,
+                        help="Minimum seconds between re-renders of the report")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Starting report server...")
+    print("=" * 60)
+
+    # Applies pending migrations (including the change triggers) before listening
+    db = Database()
+    cache = AdCache()
+    listener = CacheListener(cache)
+    views = ReportViews(cache, HTMLReportGenerator(db=db), args.render_interval)
+    listener.start()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(cache, views, listener))
+    server.daemon_threads = True
+    print(f"✓ Serving the report at http://{args.host}:{server.server_address[1]}/")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n✓ Stopping report server")
+    finally:
+        listener.stop()
+        server.server_close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
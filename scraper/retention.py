@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+"""
+Tiered retention: archive cold ads and their assets, restore them on demand.
+
+An ad is cold once it has been inactive longer than the retention policy
+(--inactive-days, RETENTION_INACTIVE_DAYS, default 365). Ads that
+disappeared from the Library can be given a shorter one
+(--disappeared-days). Active ads are never archived.
+
+Archiving a cold ad:
+- moves its bulky columns (copy, link and asset references) and its
+  versions into `ads_archive`, whose rows TOAST compresses
+- packs its asset files into a bundle under --bundle-dir. A bundle is a
+  plain tar whose members are compressed one by one (zstd by default, or
+  gzip). `archived_assets` keeps each member's offset, so any file can be
+  read back with a single seek, without scanning the bundle.
+- leaves a stub in `ads`: ad_id, status, dates, platforms and
+  `archived_at`. Reports, search and the report server skip stubs.
+
+Scraping an archived ad again makes it hot: the upsert fills the row back in
+and clears `archived_at`. The stale archive entries are purged on the next
+archive run.
+
+Usage:
+    python retention.py archive [--inactive-days 365] [--disappeared-days 90] [--page PAGE_ID]
+        [--limit N] [--batch-size 500] [--codec zstd|gzip] [--bundle-dir archive] [--dry-run]
+    python retention.py restore AD_ID [AD_ID ...]
+    python retention.py restore --page PAGE_ID
+    python retention.py status
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import tarfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+from typing import Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from psycopg2.extras import RealDictCursor, execute_values
+from database import Database
+
+
+# Columns moved to the archive; everything else stays in the stub
+ARCHIVED_COLUMNS = ['asset_url', 'asset_path', 'body_text', 'headline', 'cta_text', 'link_url']
+
+CODEC_SUFFIXES = {'zstd': '.zst', 'gzip': '.gz', 'none': ''}
+
+
+def _import_zstandard():
+    """Import zstandard lazily; it is only needed for zstd bundles."""
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        raise ImportError(
+            "zstd bundles require zstandard. Install it with: pip install zstandard "
+            "(or use --codec gzip)"
+        )
+
+
+def compressor(codec: str) -> Callable[[bytes], bytes]:
+    if codec == 'zstd':
+        zstandard = _import_zstandard()
+        # ZstdCompressor objects are not thread-safe; compress() on a fresh one is cheap
+        return lambda data: zstandard.ZstdCompressor(level=10).compress(data)
+    if codec == 'gzip':
+        return lambda data: zlib.compress(data, 6)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == 'zstd':
+        return _import_zstandard().ZstdDecompressor().decompress(data)
+    if codec == 'gzip':
+        return zlib.decompress(data)
+    return data
+
+
+def pack_member(path: str, compress: Callable[[bytes], bytes], codec: str) -> Optional[Tuple]:
+    """(codec, data, size, sha256) for one asset file, or None if it is unreadable.
+
+    Images and videos are often already compressed; those are stored as is
+    when compression doesn't save at least 5%.
+    """
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+    except OSError as e:
+        print(f"    ⚠️  Skipping {path}: {e}")
+        return None
+    packed = compress(raw)
+    if len(packed) > len(raw) * 0.95:
+        codec, packed = 'none', raw
+    return codec, packed, len(raw), hashlib.sha256(raw).hexdigest()
+
+
+class Retention:
+    """Moves cold ads to the archive tier and back."""
+
+    def __init__(self, db: Database, bundle_dir: str = 'archive', codec: str = 'zstd',
+                 workers: Optional[int] = None):
+        self.db = db
+        self.bundle_dir = bundle_dir
+        self.codec = codec
+        self.workers = workers or os.cpu_count() or 1
+
+    def cold_ads(self, inactive_days: int, disappeared_days: Optional[int] = None,
+                 page_id: Optional[str] = None, after_id: int = 0, limit: int = 500) -> List[Tuple[int, str]]:
+        """(id, ad_id) of the next batch of ads that match the retention policy."""
+        clauses = ["archived_at IS NULL", "status <> 'active'", "id > %(after_id)s"]
+        policy = "COALESCE(end_date, last_seen_at::date, updated_at::date) < CURRENT_DATE - %(inactive_days)s"
+        if disappeared_days is not None:
+            policy = (f"({policy} OR disappeared_at < CURRENT_TIMESTAMP "
+                      f"- make_interval(days => %(disappeared_days)s))")
+        clauses.append(policy)
+        if page_id is not None:
+            clauses.append("page_id = %(page_id)s")
+
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute(f"""
+                SELECT id, ad_id FROM ads
+                WHERE {' AND '.join(clauses)}
+                ORDER BY id
+                LIMIT %(limit)s
+            """, {'after_id': after_id, 'inactive_days': inactive_days,
+                  'disappeared_days': disappeared_days, 'page_id': page_id, 'limit': limit})
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
+
+    def purge_stale(self) -> int:
+        """Drop archive entries of ads that were scraped again since they were archived."""
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute("""
+                DELETE FROM archived_assets s USING ads a
+                WHERE a.ad_id = s.ad_id AND a.archived_at IS NULL
+            """)
+            cursor.execute("""
+                DELETE FROM ads_archive r USING ads a
+                WHERE a.ad_id = r.ad_id AND a.archived_at IS NULL
+            """)
+            purged = cursor.rowcount
+            self.db.conn.commit()
+            return purged
+        except Exception:
+            self.db.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def asset_paths(self, ad_ids: List[str]) -> Dict[str, str]:
+        """{asset_path: ad_id} for the local assets of ads and their versions."""
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute("""
+                SELECT asset_path, ad_id FROM ads
+                WHERE ad_id = ANY(%s) AND asset_path IS NOT NULL
+                UNION
+                SELECT asset_path, ad_id FROM ad_versions
+                WHERE ad_id = ANY(%s) AND asset_path IS NOT NULL
+            """, (ad_ids, ad_ids))
+            return dict(cursor.fetchall())
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
+
+    def write_bundle(self, paths: Dict[str, str]) -> Tuple[Optional[str], List[Tuple]]:
+        """Pack asset files into a new bundle.
+
+        Returns the bundle path and one index row per packed file:
+        (path, ad_id, bundle, member_offset, size, stored_size, codec, sha256).
+        """
+        existing = [path for path in paths if os.path.isfile(path)]
+        if not existing:
+            return None, []
+
+        os.makedirs(self.bundle_dir, exist_ok=True)
+        bundle = os.path.join(
+            self.bundle_dir, f"assets_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.tar"
+        )
+        compress = compressor(self.codec)
+        members = {}
+
+        # Compression runs in threads (zlib and zstandard release the GIL).
+        # Files are handed out a window at a time so only a few are in memory.
+        window = self.workers * 2
+        with ThreadPoolExecutor(max_workers=self.workers) as executor, \
+                tarfile.open(bundle + '.part', 'w', format=tarfile.PAX_FORMAT) as tar:
+            for start in range(0, len(existing), window):
+                chunk = existing[start:start + window]
+                packed = executor.map(lambda path: pack_member(path, compress, self.codec), chunk)
+                for index, (path, result) in enumerate(zip(chunk, packed), start):
+                    if result is None:
+                        continue
+                    codec, data, size, sha256 = result
+                    info = tarfile.TarInfo(f"{index:06d}_{os.path.basename(path)}{CODEC_SUFFIXES[codec]}")
+                    info.size = len(data)
+                    info.mtime = int(time.time())
+                    tar.addfile(info, BytesIO(data))
+                    members[info.name] = (path, size, codec, sha256)
+
+        if not members:
+            os.remove(bundle + '.part')
+            return None, []
+
+        # Read back where each member's data starts, for seek-and-read access
+        rows = []
+        with tarfile.open(bundle + '.part', 'r') as tar:
+            for info in tar:
+                path, size, codec, sha256 = members[info.name]
+                rows.append((path, paths[path], bundle, info.offset_data, size, info.size, codec, sha256))
+        os.replace(bundle + '.part', bundle)
+        return bundle, rows
+
+    def archive_batch(self, ad_ids: List[str]) -> Tuple[int, int, int]:
+        """Archive one batch of ads. Returns (ads archived, files bundled, bytes freed)."""
+        paths = self.asset_paths(ad_ids)
+        bundle, index_rows = self.write_bundle(paths)
+        cursor = self.db.conn.cursor()
+
+        try:
+            if index_rows:
+                execute_values(cursor, """
+                    INSERT INTO archived_assets
+                        (path, ad_id, bundle, member_offset, size, stored_size, codec, sha256)
+                    VALUES %s
+                    ON CONFLICT (path) DO UPDATE SET
+                        ad_id = EXCLUDED.ad_id,
+                        bundle = EXCLUDED.bundle,
+                        member_offset = EXCLUDED.member_offset,
+                        size = EXCLUDED.size,
+                        stored_size = EXCLUDED.stored_size,
+                        codec = EXCLUDED.codec,
+                        sha256 = EXCLUDED.sha256
+                """, index_rows, page_size=1000)
+
+            archived_fields = ', '.join(f"'{column}', a.{column}" for column in ARCHIVED_COLUMNS)
+            cursor.execute(f"""
+                INSERT INTO ads_archive (ad_id, page_id, data, versions)
+                SELECT
+                    a.ad_id,
+                    a.page_id,
+                    jsonb_build_object({archived_fields}),
+                    (SELECT jsonb_agg(to_jsonb(v) ORDER BY v.version_index)
+                     FROM ad_versions v WHERE v.ad_id = a.ad_id)
+                FROM ads a
+                WHERE a.ad_id = ANY(%s) AND a.archived_at IS NULL
+                ON CONFLICT (ad_id) DO UPDATE SET
+                    page_id = EXCLUDED.page_id,
+                    archived_at = CURRENT_TIMESTAMP,
+                    data = EXCLUDED.data,
+                    versions = EXCLUDED.versions
+            """, (ad_ids,))
+            cursor.execute("DELETE FROM ad_versions WHERE ad_id = ANY(%s)", (ad_ids,))
+            cursor.execute(f"""
+                UPDATE ads
+                SET {', '.join(f'{column} = NULL' for column in ARCHIVED_COLUMNS)},
+                    archived_at = CURRENT_TIMESTAMP
+                WHERE ad_id = ANY(%s) AND archived_at IS NULL
+            """, (ad_ids,))
+            archived = cursor.rowcount
+
+            # Files still used by a hot row (shared assets) stay on disk
+            packed = [row[0] for row in index_rows]
+            cursor.execute("""
+                SELECT asset_path FROM ads WHERE asset_path = ANY(%s)
+                UNION
+                SELECT asset_path FROM ad_versions WHERE asset_path = ANY(%s)
+            """, (packed, packed))
+            in_use = {row[0] for row in cursor.fetchall()}
+            self.db.conn.commit()
+        except Exception:
+            self.db.conn.rollback()
+            # Nothing points at the bundle yet
+            if bundle:
+                os.remove(bundle)
+            raise
+        finally:
+            cursor.close()
+
+        freed = 0
+        for path, _, _, _, size, _, _, _ in index_rows:
+            if path in in_use:
+                continue
+            try:
+                os.remove(path)
+                freed += size
+            except OSError as e:
+                print(f"    ⚠️  Could not delete {path}: {e}")
+        return archived, len(index_rows), freed
+
+    def archive(self, inactive_days: int, disappeared_days: Optional[int] = None,
+                page_id: Optional[str] = None, limit: Optional[int] = None,
+                batch_size: int = 500, dry_run: bool = False) -> Dict:
+        """Archive every ad that matches the policy, one batch (and bundle) at a time."""
+        started = time.monotonic()
+        if not dry_run:
+            purged = self.purge_stale()
+            if purged:
+                print(f"  Purged {purged} archive entries of ads scraped again")
+
+        totals = {'ads': 0, 'files': 0, 'bytes_freed': 0, 'bundles': 0}
+        after_id = 0
+        while limit is None or totals['ads'] < limit:
+            size = batch_size if limit is None else min(batch_size, limit - totals['ads'])
+            batch = self.cold_ads(inactive_days, disappeared_days, page_id, after_id, size)
+            if not batch:
+                break
+            after_id = batch[-1][0]
+            ad_ids = [ad_id for _, ad_id in batch]
+            if dry_run:
+                totals['ads'] += len(ad_ids)
+                continue
+            archived, files, freed = self.archive_batch(ad_ids)
+            totals['ads'] += archived
+            totals['files'] += files
+            totals['bytes_freed'] += freed
+            totals['bundles'] += 1 if files else 0
+            print(f"  Archived {totals['ads']} ads, {totals['files']} files "
+                  f"({totals['bytes_freed'] / 1e6:.1f} MB freed)...")
+
+        totals['elapsed_seconds'] = round(time.monotonic() - started, 1)
+        return totals
+
+    def read_asset(self, bundle: str, offset: int, stored_size: int, codec: str) -> bytes:
+        """Read one archived file straight from its bundle."""
+        with open(bundle, 'rb') as f:
+            f.seek(offset)
+            return decompress(codec, f.read(stored_size))
+
+    def restore(self, ad_ids: Optional[List[str]] = None, page_id: Optional[str] = None) -> Tuple[int, int]:
+        """Bring archived ads back into the hot tier. Returns (ads, files) restored."""
+        cursor = self.db.conn.cursor(cursor_factory=RealDictCursor)
+
+        try:
+            if page_id is not None:
+                cursor.execute("""
+                    SELECT ad_id FROM ads WHERE page_id = %s AND archived_at IS NOT NULL
+                """, (page_id,))
+                ad_ids = [row['ad_id'] for row in cursor.fetchall()]
+            cursor.execute("""
+                SELECT s.path, s.bundle, s.member_offset, s.stored_size, s.codec, s.sha256
+                FROM archived_assets s
+                JOIN ads a ON a.ad_id = s.ad_id
+                WHERE s.ad_id = ANY(%s) AND a.archived_at IS NOT NULL
+                ORDER BY s.bundle, s.member_offset
+            """, (ad_ids,))
+            assets = cursor.fetchall()
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
+
+        # Files first: a row is only made hot once its asset is back
+        failed = []
+        for asset in assets:
+            try:
+                data = self.read_asset(asset['bundle'], asset['member_offset'],
+                                       asset['stored_size'], asset['codec'])
+                if hashlib.sha256(data).hexdigest() != asset['sha256']:
+                    raise ValueError("checksum mismatch")
+                directory = os.path.dirname(asset['path'])
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(asset['path'] + '.part', 'wb') as f:
+                    f.write(data)
+                os.replace(asset['path'] + '.part', asset['path'])
+            except (OSError, ValueError, zlib.error) as e:
+                print(f"    ⚠️  Could not restore {asset['path']} from {asset['bundle']}: {e}")
+                failed.append(asset['path'])
+
+        restored_columns = ', '.join(f"{column} = r.data->>'{column}'" for column in ARCHIVED_COLUMNS)
+        cursor = self.db.conn.cursor()
+
+        try:
+            cursor.execute(f"""
+                UPDATE ads
+                SET {restored_columns},
+                    archived_at = NULL
+                FROM ads_archive r
+                WHERE r.ad_id = ads.ad_id AND ads.ad_id = ANY(%s) AND ads.archived_at IS NOT NULL
+                RETURNING ads.ad_id
+            """, (ad_ids,))
+            restored = [row[0] for row in cursor.fetchall()]
+            cursor.execute("""
+                INSERT INTO ad_versions
+                SELECT v.*
+                FROM ads_archive r
+                CROSS JOIN LATERAL jsonb_populate_recordset(NULL::ad_versions, r.versions) v
+                WHERE r.ad_id = ANY(%s)
+                ON CONFLICT (ad_id, version_index) DO NOTHING
+            """, (restored,))
+            # Assets that could not be read back are left to asset_worker.py
+            if failed:
+                cursor.execute("UPDATE ads SET asset_path = NULL WHERE asset_path = ANY(%s)", (failed,))
+                cursor.execute("UPDATE ad_versions SET asset_path = NULL WHERE asset_path = ANY(%s)", (failed,))
+            cursor.execute("DELETE FROM archived_assets WHERE ad_id = ANY(%s)", (restored,))
+            cursor.execute("DELETE FROM ads_archive WHERE ad_id = ANY(%s)", (restored,))
+            self.db.conn.commit()
+        except Exception:
+            self.db.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        return len(restored), len(assets) - len(failed)
+
+    def status(self) -> Dict:
+        """Sizes of the hot and archive tiers."""
+        cursor = self.db.conn.cursor(cursor_factory=RealDictCursor)
+
+        try:
+            cursor.execute("""
+                SELECT
+                    (SELECT COUNT(*) FROM ads WHERE archived_at IS NULL) AS hot_ads,
+                    (SELECT COUNT(*) FROM ads WHERE archived_at IS NOT NULL) AS archived_ads,
+                    pg_total_relation_size('ads') AS ads_bytes,
+                    pg_total_relation_size('ads_archive') AS archive_bytes,
+                    (SELECT COUNT(*) FROM archived_assets) AS archived_files,
+                    (SELECT COALESCE(SUM(size), 0) FROM archived_assets) AS archived_file_bytes,
+                    (SELECT COALESCE(SUM(stored_size), 0) FROM archived_assets) AS stored_file_bytes,
+                    (SELECT COUNT(DISTINCT bundle) FROM archived_assets) AS bundles
+            """)
+            return dict(cursor.fetchone())
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
+
+
+def archive(args):
+    db = Database()
+    retention = Retention(db, args.bundle_dir, args.codec, args.workers)
+
+    try:
+        print(f"Archiving ads inactive for more than {args.inactive_days} days"
+              + (f" or disappeared for more than {args.disappeared_days}" if args.disappeared_days else "")
+              + (" (dry run)" if args.dry_run else ""))
+        totals = retention.archive(
+            args.inactive_days, args.disappeared_days, args.page, args.limit,
+            args.batch_size, args.dry_run,
+        )
+        if args.dry_run:
+            print(f"✓ {totals['ads']} ads would be archived")
+        else:
+            print(f"✓ Archived {totals['ads']} ads and {totals['files']} files into "
+                  f"{totals['bundles']} bundles in {totals['elapsed_seconds']}s "
+                  f"({totals['bytes_freed'] / 1e6:.1f} MB freed)")
+    except KeyboardInterrupt:
+        print("\n✗ Interrupted (batches already committed stay archived)")
+    finally:
+        db.close()
+
+
+def restore(args):
+    if not args.ad_ids and not args.page:
+        print("✗ Give ad IDs or --page")
+        sys.exit(2)
+    db = Database()
+    retention = Retention(db)
+
+    try:
+        restored, files = retention.restore(args.ad_ids or None, args.page)
+        print(f"✓ Restored {restored} ads and {files} files")
+    finally:
+        db.close()
+
+
+def status(args):
+    db = Database()
+
+    try:
+        stats = Retention(db).status()
+        print(f"  Hot ads:        {stats['hot_ads']}")
+        print(f"  Archived ads:   {stats['archived_ads']}")
+        print(f"  ads table:      {stats['ads_bytes'] / 1e6:.1f} MB")
+        print(f"  ads_archive:    {stats['archive_bytes'] / 1e6:.1f} MB")
+        ratio = (stats['stored_file_bytes'] / stats['archived_file_bytes']
+                 if stats['archived_file_bytes'] else 1.0)
+        print(f"  Archived files: {stats['archived_files']} in {stats['bundles']} bundles, "
+              f"{stats['archived_file_bytes'] / 1e6:.1f} MB stored as "
+              f"{stats['stored_file_bytes'] / 1e6:.1f} MB ({ratio:.0%})")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive cold ads and assets, restore them on demand")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    archive_parser = subparsers.add_parser('archive', help="Archive ads that match the retention policy")
+    archive_parser.add_argument('--inactive-days', type=int,
+                                default=int(os.getenv('RETENTION_INACTIVE_DAYS', '365')),
+                                help="Archive ads inactive for longer than this")
+    archive_parser.add_argument('--disappeared-days', type=int,
+                                default=int(os.getenv('RETENTION_DISAPPEARED_DAYS', '0')) or None,
+                                help="Archive ads gone from the Library for longer than this")
+    archive_parser.add_argument('--page', default=None, help="Only archive this page's ads")
+    archive_parser.add_argument('--limit', type=int, default=None, help="Archive at most this many ads")
+    archive_parser.add_argument('--batch-size', type=int, default=500, help="Ads per transaction and bundle")
+    archive_parser.add_argument('--codec', choices=['zstd', 'gzip'],
+                                default=os.getenv('RETENTION_CODEC', 'zstd'))
+    archive_parser.add_argument('--bundle-dir', default=os.getenv('RETENTION_BUNDLE_DIR', 'archive'))
+    archive_parser.add_argument('--workers', type=int, default=None,
+                                help="Compression threads (default: CPU count)")
+    archive_parser.add_argument('--dry-run', action='store_true', help="Only count the ads to archive")
+    archive_parser.set_defaults(func=archive)
+
+    restore_parser = subparsers.add_parser('restore', help="Bring archived ads back")
+    restore_parser.add_argument('ad_ids', nargs='*', help="Ad IDs to restore")
+    restore_parser.add_argument('--page', default=None, help="Restore every archived ad of this page")
+    restore_parser.set_defaults(func=restore)
+
+    status_parser = subparsers.add_parser('status', help="Show the size of each tier")
+    status_parser.set_defaults(func=status)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Per-run change report: what changed between a scrape run and the previous
+completed run of the same target (page ID and filters).
+
+Sections:
+- new ads: seen in this run but not the previous one (`EXCEPT` over the
+  two runs' observations), flagged when seen for the first time ever
+- ended: ads that went inactive or disappeared from the feed in this run
+- status changes: any other status transition (e.g. reactivated ads)
+- platform changes and new creatives (a different asset, not just a
+  re-signed URL)
+- no longer seen: in the previous run but not in this one. After a partial
+  crawl this includes ads the crawl simply didn't reach.
+
+Everything is computed in SQL. Run membership comes from `ad_observations`,
+read through its (run_id, ad_id) primary key. For the ads of this run, each
+field's value as of either run (the latest non-NULL observation up to it) is
+looked up through the (ad_id, observed_at) index, and the two are compared.
+Changes recorded in between by other runs (another country's sweep, a job
+run with different filters) are therefore included. The cost follows the
+size of the two runs, not the size of the `ads` table.
+
+Usage:
+    python run_diff.py [RUN_ID] [--previous RUN_ID] [--output-dir reports]
+"""
+
+import argparse
+import html as html_lib
+import json
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from psycopg2.extras import RealDictCursor
+from database import Database
+
+
+# Rows listed per section in the HTML (the JSON has all of them)
+MAX_HTML_ROWS = 200
+
+SECTIONS = [
+    ('new_ads', "New Ads"),
+    ('ended', "Ended"),
+    ('status_changes', "Status Changes"),
+    ('platform_changes', "Platform Changes"),
+    ('new_creatives', "New Creatives"),
+    ('no_longer_seen', "No Longer Seen"),
+]
+
+
+def _seen_in(run_param: str) -> str:
+    """Ads seen in a run (reconciliation adds 'disappeared' observations for ads it did not see)."""
+    return f"""
+        SELECT ad_id FROM ad_observations
+        WHERE run_id = %({run_param})s AND NOT 'disappeared' = ANY(changed_fields)
+    """
+
+
+def _json_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def _cell(value) -> str:
+    if isinstance(value, list):
+        value = ', '.join(value)
+    return html_lib.escape(str(value)) if value is not None else ''
+
+
+class RunDiffReport:
+    """Change summaries between consecutive scrape runs of a target."""
+
+    def __init__(self, output_dir: str = "reports", db: Optional[Database] = None):
+        self.output_dir = output_dir
+        self.db = db if db is not None else Database()
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def _fetch(self, query: str, params: Dict) -> List[Dict]:
+        cursor = self.db.conn.cursor(cursor_factory=RealDictCursor)
+
+        try:
+            cursor.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
+
+    def run_info(self, run_id: int) -> Optional[Dict]:
+        rows = self._fetch("""
+            SELECT id, page_id, filters, status, ads_seen, started_at, finished_at
+            FROM scrape_runs WHERE id = %(run)s
+        """, {'run': run_id})
+        return rows[0] if rows else None
+
+    def latest_run(self) -> Optional[int]:
+        """The most recent completed run."""
+        rows = self._fetch("""
+            SELECT id FROM scrape_runs WHERE status = 'completed' ORDER BY id DESC LIMIT 1
+        """, {})
+        return rows[0]['id'] if rows else None
+
+    def previous_run(self, run: Dict) -> Optional[int]:
+        """The completed run of the same target before `run`."""
+        rows = self._fetch("""
+            SELECT id FROM scrape_runs
+            WHERE page_id IS NOT DISTINCT FROM %(page_id)s
+              AND filters = %(filters)s::jsonb
+              AND status = 'completed'
+              AND id < %(run)s
+            ORDER BY id DESC
+            LIMIT 1
+        """, {'page_id': run['page_id'], 'filters': json.dumps(run['filters']), 'run': run['id']})
+        return rows[0]['id'] if rows else None
+
+    def _field_changes(self, field: str, condition: str, params: Dict) -> List[Dict]:
+        """Ads of the run whose `field` differs from its value as of the previous run.
+
+        A field's value as of a run is the latest non-NULL observation of it
+        up to that run (observations only hold changed values). Comparing the
+        two runs catches changes another run recorded in between, such as a
+        sweep of another country. `condition` filters on `old_value`,
+        `new_value` and `disappeared`.
+        """
+        return self._fetch(f"""
+            SELECT c.ad_id, c.old_value AS old_{field}, c.new_value AS new_{field},
+                   a.headline, a.start_date, a.end_date
+            FROM (
+                SELECT o.ad_id,
+                       'disappeared' = ANY(o.changed_fields) AS disappeared,
+                       COALESCE(po.{field}, before.{field}) AS old_value,
+                       COALESCE(o.{field}, after.{field}) AS new_value
+                FROM ad_observations o
+                LEFT JOIN ad_observations po ON po.run_id = %(previous)s AND po.ad_id = o.ad_id
+                LEFT JOIN LATERAL (
+                    SELECT p.{field} FROM ad_observations p
+                    WHERE p.ad_id = o.ad_id AND p.run_id <= %(previous)s AND p.{field} IS NOT NULL
+                    ORDER BY p.observed_at DESC
+                    LIMIT 1
+                ) before ON TRUE
+                LEFT JOIN LATERAL (
+                    SELECT p.{field} FROM ad_observations p
+                    WHERE p.ad_id = o.ad_id AND p.run_id <= %(run)s AND p.{field} IS NOT NULL
+                    ORDER BY p.observed_at DESC
+                    LIMIT 1
+                ) after ON TRUE
+                WHERE o.run_id = %(run)s
+                  -- Ads first observed after the previous run are new, not changed
+                  AND EXISTS (
+                      SELECT 1 FROM ad_observations p
+                      WHERE p.ad_id = o.ad_id AND p.run_id <= %(previous)s
+                  )
+            ) c
+            LEFT JOIN ads a ON a.ad_id = c.ad_id
+            WHERE {condition}
+            ORDER BY c.ad_id
+        """, params)
+
+    def compute(self, run_id: int, previous_run_id: Optional[int] = None) -> Dict:
+        """Every section of the change summary for a run."""
+        run = self.run_info(run_id)
+        if run is None:
+            raise ValueError(f"No scrape run {run_id}")
+        if previous_run_id is None:
+            previous_run_id = self.previous_run(run)
+        params = {'run': run_id, 'previous': previous_run_id}
+
+        diff = {
+            'run': run,
+            'previous_run': self.run_info(previous_run_id) if previous_run_id else None,
+        }
+        diff['new_ads'] = self._fetch(f"""
+            WITH added AS ({_seen_in('run')} EXCEPT {_seen_in('previous')})
+            SELECT o.ad_id, o.is_new AS first_seen, a.status, a.platforms, a.start_date,
+                   a.headline, a.asset_type, a.asset_url
+            FROM added
+            JOIN ad_observations o ON o.run_id = %(run)s AND o.ad_id = added.ad_id
+            LEFT JOIN ads a ON a.ad_id = added.ad_id
+            ORDER BY a.start_date DESC NULLS LAST, o.ad_id
+        """, params)
+        diff['ended'] = self._field_changes(
+            'status', "c.disappeared OR (c.new_value = 'inactive' "
+                      "AND c.old_value IS DISTINCT FROM c.new_value)", params,
+        )
+        diff['status_changes'] = self._field_changes(
+            'status', "c.old_value IS DISTINCT FROM c.new_value "
+                      "AND c.new_value IS DISTINCT FROM 'inactive' AND NOT c.disappeared", params,
+        )
+        diff['platform_changes'] = self._field_changes(
+            'platforms', "c.old_value IS DISTINCT FROM c.new_value", params,
+        )
+        # Asset URLs are re-signed on every load; asset_key is the asset itself
+        diff['new_creatives'] = self._field_changes(
+            'asset_url', "asset_key(c.old_value) IS DISTINCT FROM asset_key(c.new_value)", params,
+        )
+        diff['no_longer_seen'] = self._fetch(f"""
+            WITH missing AS (
+                {_seen_in('previous')}
+                EXCEPT
+                SELECT ad_id FROM ad_observations WHERE run_id = %(run)s
+            )
+            SELECT missing.ad_id, a.status, a.headline, a.start_date, a.last_seen_at
+            FROM missing
+            LEFT JOIN ads a ON a.ad_id = missing.ad_id
+            ORDER BY missing.ad_id
+        """, params)
+        diff['counts'] = {key: len(diff[key]) for key, _ in SECTIONS}
+        return diff
+
+    def generate(self, run_id: Optional[int] = None,
+                 previous_run_id: Optional[int] = None) -> Tuple[str, str]:
+        """Write the HTML and JSON change summary; returns their paths."""
+        if run_id is None:
+            run_id = self.latest_run()
+            if run_id is None:
+                raise ValueError("No completed scrape runs")
+        diff = self.compute(run_id, previous_run_id)
+
+        json_path = os.path.join(self.output_dir, f"run_diff_{run_id}.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(diff, f, indent=2, default=_json_value)
+
+        html_path = os.path.join(self.output_dir, f"run_diff_{run_id}.html")
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(self._generate_html(diff))
+
+        print(f"✓ Change report for run {run_id}: "
+              + ', '.join(f"{count} {key.replace('_', ' ')}" for key, count in diff['counts'].items()))
+        print(f"✓ Change report written: {html_path} (JSON: {json_path})")
+        return html_path, json_path
+
+    def _section_rows(self, key: str, rows: List[Dict]) -> str:
+        def cells(row: Dict) -> List[str]:
+            if key == 'new_ads':
+                tag = ' <span class="tag">first seen</span>' if row['first_seen'] else ''
+                return [_cell(row['ad_id']) + tag, _cell(row['status']), _cell(row['platforms']),
+                        _cell(row['start_date']), _cell(row['headline'])]
+            if key in ('ended', 'status_changes'):
+                change = f"{_cell(row['old_status'])} → {_cell(row['new_status'])}"
+                if row['new_status'] == row['old_status']:
+                    change = _cell(row['new_status'])
+                return [_cell(row['ad_id']), change, _cell(row['end_date']), _cell(row['headline'])]
+            if key == 'platform_changes':
+                return [_cell(row['ad_id']), _cell(row['old_platforms']),
+                        _cell(row['new_platforms']), _cell(row['headline'])]
+            if key == 'new_creatives':
+                asset = f'<a href="{_cell(row["new_asset_url"])}">new asset</a>' if row['new_asset_url'] else ''
+                return [_cell(row['ad_id']), asset, _cell(row['headline'])]
+            return [_cell(row['ad_id']), _cell(row['status']), _cell(row['last_seen_at']), _cell(row['headline'])]
+
+        return ''.join(
+            '<tr>' + ''.join(f'<td>{cell}</td>' for cell in cells(row)) + '</tr>'
+            for row in rows[:MAX_HTML_ROWS]
+        )
+
+    def _generate_html(self, diff: Dict) -> str:
+        """Compact HTML change summary."""
+        run, previous = diff['run'], diff['previous_run']
+        headers = {
+            'new_ads': ['Ad ID', 'Status', 'Platforms', 'Started', 'Headline'],
+            'ended': ['Ad ID', 'Status', 'End date', 'Headline'],
+            'status_changes': ['Ad ID', 'Status', 'End date', 'Headline'],
+            'platform_changes': ['Ad ID', 'Before', 'After', 'Headline'],
+            'new_creatives': ['Ad ID', 'Asset', 'Headline'],
+            'no_longer_seen': ['Ad ID', 'Status', 'Last seen', 'Headline'],
+        }
+        against = (f"run {previous['id']} ({previous['started_at']:%Y-%m-%d %H:%M})"
+                   if previous else "no earlier completed run of this target")
+        cards = ''.join(
+            f'<a class="stat-card" href="#{key}"><div class="stat-value">{diff["counts"][key]}</div>'
+            f'<div class="stat-label">{title}</div></a>'
+            for key, title in SECTIONS
+        )
+
+        sections = ''
+        for key, title in SECTIONS:
+            rows = diff[key]
+            if not rows:
+                continue
+            more = (f'<p class="muted">Showing {MAX_HTML_ROWS} of {len(rows)}; the JSON has all of them.</p>'
+                    if len(rows) > MAX_HTML_ROWS else '')
+            note = ('<p class="muted">Also includes ads a partial crawl did not reach.</p>'
+                    if key == 'no_longer_seen' else '')
+            header = ''.join(f'<th>{name}</th>' for name in headers[key])
+            sections += f"""
+    <section id="{key}">
+        <h2>{title} ({len(rows)})</h2>{note}
+        <table><tr>{header}</tr>{self._section_rows(key, rows)}</table>{more}
+    </section>
+"""
+        if not sections:
+            sections = '<p class="muted">No changes.</p>'
+
+        filters = ', '.join(f"{k}={v}" for k, v in (run['filters'] or {}).items()) or 'default filters'
+        return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Changes in Scrape Run {run['id']}</title>
+    <style>
+        body {{ font-family: Arial, sans-serif; margin: 20px; color: #1c1e21; background: #f0f2f5; }}
+        h1 {{ margin-bottom: 4px; }}
+        .muted {{ color: #65676b; font-size: 13px; }}
+        .stats {{ display: flex; gap: 12px; flex-wrap: wrap; margin: 20px 0; }}
+        .stat-card {{ background: white; border-radius: 8px; padding: 12px 18px; text-decoration: none; color: inherit;
+                      box-shadow: 0 1px 2px rgba(0,0,0,0.1); min-width: 110px; }}
+        .stat-value {{ font-size: 24px; font-weight: bold; color: #1877f2; }}
+        .stat-label {{ font-size: 13px; color: #65676b; }}
+        section {{ background: white; border-radius: 8px; padding: 16px; margin-bottom: 16px;
+                   box-shadow: 0 1px 2px rgba(0,0,0,0.1); }}
+        table {{ border-collapse: collapse; width: 100%; font-size: 13px; }}
+        th, td {{ text-align: left; padding: 6px 8px; border-bottom: 1px solid #e4e6eb; vertical-align: top; }}
+        .tag {{ background: #e7f3ff; color: #1877f2; border-radius: 4px; padding: 1px 6px; font-size: 11px; }}
+    </style>
+</head>
+<body>
+    <h1>Changes in Scrape Run {run['id']}</h1>
+    <p class="muted">Page {html_lib.escape(str(run['page_id']))} ({html_lib.escape(filters)}),
+       {run['ads_seen']} ads seen, started {run['started_at']:%Y-%m-%d %H:%M}; compared with {against}.</p>
+    <div class="stats">{cards}</div>
+{sections}
+</body>
+</html>"""
+
+    def close(self):
+        self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Change report for a scrape run")
+    parser.add_argument('run_id', nargs='?', type=int, default=None,
+                        help="Scrape run to report on (default: the latest completed run)")
+    parser.add_argument('--previous', type=int, default=None,
+                        help="Run to compare with (default: the previous completed run of the same target)")
+    parser.add_argument('--output-dir', default='reports')
+    args = parser.parse_args()
+
+    report = RunDiffReport(args.output_dir)
+
+    try:
+        report.generate(args.run_id, args.previous)
+    except ValueError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    finally:
+        report.close()
+
+
+if __name__ == "__main__":
+    main()
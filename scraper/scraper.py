@@ -6,7 +6,6 @@ Runs the scraper and generates HTML report.
 
 import os
 import sys
-import webbrowser
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -17,6 +16,8 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from facebook_ads_scraper import FacebookAdsScraper
 from html_report import HTMLReportGenerator
+from run_diff import RunDiffReport
+from sinks import PostgresSink
 
 
 def main():
@@ -38,6 +39,9 @@ def main():
             return
         
         print(f"\n✓ Successfully scraped {len(ads)} ads")
+        postgres_sink = scraper.sink.find(PostgresSink)
+        wrote_to_database = postgres_sink is not None
+        run_id = postgres_sink.last_run_id if postgres_sink is not None else None
         scraper.close()
         
     except KeyboardInterrupt:
@@ -51,6 +55,11 @@ def main():
         scraper.close()
         return
     
+    # The report is built from the database, so it needs the postgres sink
+    if not wrote_to_database:
+        print("\n⚠️  Postgres sink not enabled, skipping HTML report")
+        return
+    
     # Step 2: Generate HTML report
     print("\n" + "=" * 60)
     print("Step 2: Generating HTML report...")
@@ -59,19 +68,31 @@ def main():
     report_generator = HTMLReportGenerator()
     
     try:
-        report_path = report_generator.generate_report()
-        report_abs_path = os.path.abspath(report_path)
-        print(f"\n✓ Report generated successfully!")
-        print(f"  Report location: {report_abs_path}")
+        try:
+            report_path = report_generator.generate_report()
+            report_abs_path = os.path.abspath(report_path)
+            print(f"\n✓ Report generated successfully!")
+            print(f"  Report location: {report_abs_path}")
+            
+            # Open report in browser
+            import webbrowser
+            print("  Opening report in browser...")
+            webbrowser.open(f'file://{report_abs_path}')
+            print("  ✓ Report opened in browser")
+        except Exception as e:
+            print(f"\n✗ Error generating report: {e}")
+            import traceback
+            traceback.print_exc()
         
-        # Open report in browser
-        print("  Opening report in browser...")
-        webbrowser.open(f'file://{report_abs_path}')
-        print("  ✓ Report opened in browser")
-    except Exception as e:
-        print(f"\n✗ Error generating report: {e}")
-        import traceback
-        traceback.print_exc()
+        # Step 3: What changed since the previous run of this page
+        if run_id is not None:
+            print("\n" + "=" * 60)
+            print("Step 3: Generating change report...")
+            print("=" * 60)
+            try:
+                RunDiffReport(report_generator.output_dir, db=report_generator.db).generate(run_id)
+            except Exception as e:
+                print(f"\n✗ Error generating change report: {e}")
     finally:
         report_generator.close()
     
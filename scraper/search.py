@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Search scraped ads by their copy.
+
+Queries use PostgreSQL full-text search over the generated `search_vector`
+column (headline weighted above body text), ranked with ts_rank_cd. When a
+query has no full-text match — typos, partial words — it falls back to
+pg_trgm word similarity over the same text. Both paths are index-backed
+and accept the same filters as Database.query_ads.
+
+Usage:
+    python search.py "free shipping" [--status active] [--platform instagram] [--limit 20]
+"""
+
+import argparse
+import os
+import sys
+from typing import Dict, List, Optional, Sequence
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from psycopg2.extras import RealDictCursor
+from database import AD_COLUMNS, SEARCH_TEXT_EXPR, Database
+
+
+SEARCH_COLUMNS = ['ad_id', 'status', 'platforms', 'start_date', 'headline', 'body_text', 'cta_text', 'link_url']
+
+
+class AdSearch:
+    """Ranked full-text and fuzzy search over ad copy."""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def search(self, query: str, limit: int = 20, offset: int = 0,
+               columns: Optional[Sequence[str]] = None, fuzzy: bool = True,
+               **filters) -> List[Dict]:
+        """Return ads matching `query`, best match first.
+
+        Args:
+            query: Search text; supports web-search syntax ("quoted phrases", -exclude, or)
+            limit: Maximum number of results
+            offset: Number of results to skip
+            columns: Columns to return (defaults to SEARCH_COLUMNS)
+            fuzzy: Fall back to trigram similarity when nothing matches exactly
+            **filters: Same filters as Database.query_ads
+
+        Returns:
+            List of ad dicts, each with a `rank` score
+        """
+        columns = list(columns or SEARCH_COLUMNS)
+        unknown = [column for column in columns if column not in AD_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown ad columns: {', '.join(unknown)}")
+
+        rows = self._full_text(query, columns, limit, offset, filters)
+        if not rows and fuzzy and offset == 0:
+            rows = self._trigram(query, columns, limit, filters)
+        return rows
+
+    def _full_text(self, query, columns, limit, offset, filters) -> List[Dict]:
+        clauses, params = self.db._ad_filters(**filters)
+        clauses.insert(0, "search_vector @@ q.tsq")
+        cursor = self.db.conn.cursor(cursor_factory=RealDictCursor)
+
+        try:
+            cursor.execute(f"""
+                SELECT {', '.join(columns)}, ts_rank_cd(search_vector, q.tsq) AS rank
+                FROM ads, websearch_to_tsquery('english', %s) AS q(tsq)
+                WHERE {' AND '.join(clauses)}
+                ORDER BY rank DESC, id DESC
+                LIMIT %s OFFSET %s
+            """, [query] + params + [limit, offset])
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
+
+    def _trigram(self, query, columns, limit, filters) -> List[Dict]:
+        clauses, params = self.db._ad_filters(**filters)
+        # `<%` is the indexable form of word_similarity(query, text) >= threshold
+        clauses.insert(0, f"%s <%% {SEARCH_TEXT_EXPR}")
+        cursor = self.db.conn.cursor(cursor_factory=RealDictCursor)
+
+        try:
+            cursor.execute(f"""
+                SELECT {', '.join(columns)},
+                       word_similarity(%s, {SEARCH_TEXT_EXPR}) AS rank
+                FROM ads
+                WHERE {' AND '.join(clauses)}
+                ORDER BY rank DESC, id DESC
+                LIMIT %s
+            """, [query, query] + params + [limit])
+            return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"⚠️  Fuzzy search unavailable: {e}")
+            return []
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search scraped ads by their copy")
+    parser.add_argument('query', help="Search text")
+    parser.add_argument('--status', default=None)
+    parser.add_argument('--platform', default=None)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--exact', action='store_true', help="Disable the fuzzy fallback")
+    args = parser.parse_args()
+
+    db = Database()
+
+    try:
+        results = AdSearch(db).search(
+            args.query, limit=args.limit, fuzzy=not args.exact,
+            status=args.status, platform=args.platform,
+        )
+    finally:
+        db.close()
+
+    if not results:
+        print(f"No ads match '{args.query}'")
+        return
+
+    for ad in results:
+        title = ad.get('headline') or (ad.get('body_text') or '')[:80]
+        print(f"{ad['rank']:.3f}  {ad['ad_id']}  [{ad.get('status')}]  {title}")
+
+
+if __name__ == "__main__":
+    main()
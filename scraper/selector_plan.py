@@ -0,0 +1,253 @@
+"""
+Self-tuning selector plans for the DOM extractors.
+
+Every field the scraper extracts has a list of candidate selectors,
+defined here in one place. A lookup tries the candidates in plan order and
+stops at the first one that yields a value. Each try costs a WebDriver
+round trip. Hit rates are recorded per candidate, and the candidates are
+periodically reordered so the one that usually works is tried first. Once
+the plan has settled, extracting a field costs a single query.
+
+The learned plan is saved to SELECTOR_PLAN_PATH (default
+`selector_plan.json`) and loaded by the next run. Saved counts are halved
+on load, so new evidence outweighs old runs. When a field that every ad
+should have is found less often than before, or its best selector
+changes, a warning is printed: the Ads Library markup has probably
+changed.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+
+# Selenium locator strategies (the values of By.XPATH / By.CSS_SELECTOR)
+XPATH = 'xpath'
+CSS = 'css selector'
+
+CONTENT = "div[data-testid='ad-library-dynamic-content-container']"
+
+
+class Field:
+    """An extracted field and its candidate selectors, best first."""
+
+    def __init__(self, name: str, candidates: List[tuple], required: bool = True):
+        self.name = name
+        self.candidates = candidates
+        # Required fields are present on every ad, so a falling hit rate means
+        # the markup changed (optional ones like videos are legitimately absent)
+        self.required = required
+
+
+FIELDS = [
+    Field('ad_id', [
+        (XPATH, ".//span[contains(text(), 'Library ID:')]"),
+    ]),
+    Field('status', [
+        (XPATH, ".//span[text()='Active' or text()='Inactive']"),
+        (XPATH, ".//span[contains(text(), 'Active') or contains(text(), 'Inactive')]"),
+    ]),
+    Field('platforms', [
+        (XPATH, ".//span[contains(text(), 'Platforms')]"),
+    ]),
+    Field('dates', [
+        (XPATH, ".//div[contains(@class, 'x3nfvp2') and contains(@class, 'x1e56ztr')]"
+                "//span[contains(text(), 'Started running on')]"),
+        (XPATH, ".//span[contains(@class, 'x8t9es0') and contains(@class, 'xw23nyj') and "
+                "contains(@class, 'xo1l8bm') and contains(text(), 'Started running on')]"),
+        (XPATH, ".//div[contains(@class, 'x3nfvp2')]//span[contains(text(), 'Started running on')]"),
+        (XPATH, ".//span[contains(text(), 'Started running on')]"),
+        (XPATH, ".//*[contains(text(), 'Started running on')]"),
+    ]),
+    Field('image', [
+        (CSS, f"{CONTENT} img[src*='s600x600'], {CONTENT} img[src*='s1080x1080']"),
+        (CSS, "img[src*='fbcdn.net'][src*='s600x600'], img[src*='fbcdn.net'][src*='s1080x1080']"),
+    ], required=False),
+    Field('video', [
+        (CSS, "video"),
+    ], required=False),
+    Field('multiple_versions', [
+        (XPATH, ".//span[contains(text(), 'This ad has multiple versions')]"),
+    ], required=False),
+    Field('body_text', [
+        (CSS, f"{CONTENT} div[style*='pre-wrap']"),
+    ], required=False),
+    Field('link', [
+        (CSS, f"{CONTENT} a[href]"),
+    ], required=False),
+]
+
+# Reorder a field's candidates after this many lookups
+REORDER_EVERY = 50
+
+# Lookups needed in a run (and in history) before hit rates are compared
+MIN_SAMPLES = 50
+
+# Weight of the saved plan when it is loaded
+HISTORY_DECAY = 0.5
+
+
+class CandidateStats:
+    __slots__ = ('by', 'selector', 'hits', 'tries')
+
+    def __init__(self, by: str, selector: str, hits: float = 0.0, tries: float = 0.0):
+        self.by = by
+        self.selector = selector
+        self.hits = hits
+        self.tries = tries
+
+    def score(self) -> float:
+        # Laplace-smoothed hit rate, so untried candidates start at 0.5
+        return (self.hits + 1) / (self.tries + 2)
+
+
+class FieldPlan:
+    """Candidate order and hit counts for one field."""
+
+    def __init__(self, field: Field, saved: Optional[Dict] = None):
+        self.field = field
+        saved = saved or {}
+        saved_stats = {c['selector']: c for c in saved.get('candidates', [])}
+        self.candidates = []
+        for by, selector in field.candidates:
+            stats = saved_stats.get(selector, {})
+            self.candidates.append(CandidateStats(
+                by, selector,
+                stats.get('hits', 0.0) * HISTORY_DECAY, stats.get('tries', 0.0) * HISTORY_DECAY,
+            ))
+        # Keep the learned order; candidates new in code go where they are defined
+        order = {c['selector']: i for i, c in enumerate(saved.get('candidates', []))}
+        self.candidates.sort(key=lambda c: order.get(c.selector, len(order)))
+
+        self.history_lookups = saved.get('lookups', 0.0) * HISTORY_DECAY
+        self.history_found = saved.get('found', 0.0) * HISTORY_DECAY
+        self.lookups = 0
+        self.found = 0
+        self.queries = 0
+        self.initial_best = self.candidates[0].selector
+
+    def reorder(self):
+        self.candidates.sort(key=lambda c: c.score(), reverse=True)
+
+    def to_dict(self) -> Dict:
+        return {
+            'lookups': self.history_lookups + self.lookups,
+            'found': self.history_found + self.found,
+            'candidates': [
+                {'selector': c.selector, 'hits': c.hits, 'tries': c.tries}
+                for c in self.candidates
+            ],
+        }
+
+
+class SelectorPlan:
+    """Learned candidate order for every field, shared by all scrapers in a process."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        saved = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    saved = json.load(f).get('fields', {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Ignoring unreadable selector plan {path}: {e}")
+        self.fields = {field.name: FieldPlan(field, saved.get(field.name)) for field in FIELDS}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    def find(self, element, field: str, extract: Callable[[list], Optional[object]]):
+        """First value `extract` returns for the elements a candidate matches.
+
+        Candidates are tried in plan order; returns None if none matches.
+        """
+        plan = self.fields[field]
+        with self._lock:
+            candidates = list(plan.candidates)
+
+        value = None
+        tried = []
+        for candidate in candidates:
+            tried.append(candidate)
+            try:
+                value = extract(element.find_elements(candidate.by, candidate.selector))
+            except Exception:
+                value = None
+            if value is not None:
+                break
+
+        with self._lock:
+            for candidate in tried:
+                candidate.tries += 1
+            if value is not None:
+                tried[-1].hits += 1
+                plan.found += 1
+            plan.lookups += 1
+            plan.queries += len(tried)
+            if plan.lookups % REORDER_EVERY == 0:
+                plan.reorder()
+        return value
+
+    def check(self) -> List[str]:
+        """Warnings for fields whose hit rate dropped or whose best selector changed."""
+        warnings = []
+        with self._lock:
+            for name, plan in self.fields.items():
+                if not plan.field.required or plan.lookups < MIN_SAMPLES:
+                    continue
+                rate = plan.found / plan.lookups
+                baseline = (plan.history_found / plan.history_lookups
+                            if plan.history_lookups >= MIN_SAMPLES * HISTORY_DECAY else 1.0)
+                if rate < baseline - float(os.getenv('SELECTOR_WARN_DROP', '0.2')):
+                    warnings.append(f"'{name}' found on {rate:.0%} of ads (was {baseline:.0%}); "
+                                    f"the Ads Library markup may have changed")
+                best = plan.candidates[0].selector
+                if best != plan.initial_best:
+                    warnings.append(f"best selector for '{name}' changed to {best!r}")
+                    plan.initial_best = best
+        for warning in warnings:
+            print(f"  ⚠️  Selector plan: {warning}")
+        return warnings
+
+    def format_stats(self) -> str:
+        """Queries per lookup for each field (1.0 means the first candidate always hits)."""
+        with self._lock:
+            parts = [
+                f"{name} {plan.queries / plan.lookups:.2f}q {plan.found / plan.lookups:.0%}"
+                for name, plan in self.fields.items() if plan.lookups
+            ]
+        return ', '.join(parts) if parts else 'no lookups'
+
+    def save(self):
+        """Write the learned plan (atomically) for the next run."""
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                'updated_at': datetime.now().isoformat(timespec='seconds'),
+                'fields': {name: plan.to_dict() for name, plan in self.fields.items()},
+            }
+        # Scrapers in other processes may be saving the same file
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with self._save_lock:
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"⚠️  Could not save selector plan to {self.path}: {e}")
+
+
+_plan: Optional[SelectorPlan] = None
+_plan_lock = threading.Lock()
+
+
+def get_selector_plan() -> SelectorPlan:
+    """The process-wide plan, loaded from SELECTOR_PLAN_PATH on first use."""
+    global _plan
+    with _plan_lock:
+        if _plan is None:
+            _plan = SelectorPlan(os.getenv('SELECTOR_PLAN_PATH', 'selector_plan.json') or None)
+        return _plan
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Sharded crawl of a single advertiser across parallel browser sessions.
+
+A target's history is split into start-date windows (or media-type
+partitions) using the Ads Library URL filters. Each shard is crawled in
+its own browser session at the same time, and the results are merged
+with dedup by ad_id.
+
+Usage:
+    python sharded_crawl.py PAGE_ID --from 2020-01-01 [--to 2026-10-01] [--shards 8] [--parallel 4]
+    python sharded_crawl.py PAGE_ID --by media [--parallel 4]
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+# Media-type values accepted by the Ads Library `media_type` filter
+MEDIA_PARTITIONS = ['image', 'video', 'meme', 'none']
+
+
+def split_date_windows(start: date, end: date, shards: int) -> List[Tuple[date, date]]:
+    """Split [start, end] into up to `shards` consecutive, non-overlapping windows."""
+    total_days = (end - start).days + 1
+    shards = max(1, min(shards, total_days))
+    windows = []
+    window_start = start
+    for i in range(shards):
+        # Spread the remainder over the first windows
+        length = total_days // shards + (1 if i < total_days % shards else 0)
+        window_end = window_start + timedelta(days=length - 1)
+        windows.append((window_start, window_end))
+        window_start = window_end + timedelta(days=1)
+    return windows
+
+
+def date_shard_filters(start: date, end: date, shards: int) -> List[Dict]:
+    """Ads Library URL filters for each date window."""
+    return [
+        {'start_date[min]': window_start.isoformat(), 'start_date[max]': window_end.isoformat()}
+        for window_start, window_end in split_date_windows(start, end, shards)
+    ]
+
+
+def media_shard_filters() -> List[Dict]:
+    """Ads Library URL filters for each media-type partition."""
+    return [{'media_type': media_type} for media_type in MEDIA_PARTITIONS]
+
+
+def run_parallel_crawls(page_id: str, shard_filters: List[Dict], parallel: int = 4,
+                        max_ads_per_shard: Optional[int] = None,
+                        assets_dir: str = 'assets', sink=None, seen_ad_ids=None) -> Dict:
+    """Crawl each shard in its own browser session and merge the results.
+
+    All shards share one sink (serialized), one rate controller and one
+    set of seen ad IDs, so an ad that shows up in two shards is only
+    extracted, downloaded and written once. Each shard's progress and
+    `max_ads_per_shard` count every ad its own feed shows.
+
+    Returns:
+        Dict with the merged `ads` (deduplicated by ad_id) and the per-shard
+        `scrapers` (for their counters and errors)
+    """
+    from facebook_ads_scraper import FacebookAdsScraper, SeenAdIds
+    from rate_control import AdaptiveRateController
+    from sinks import SynchronizedSink, build_sink
+
+    owns_sink = sink is None
+    shared_sink = SynchronizedSink(sink if sink is not None else build_sink())
+    seen_ad_ids = seen_ad_ids if seen_ad_ids is not None else SeenAdIds()
+    asset_workers = int(os.getenv('ASSET_WORKERS', '4'))
+    rate_controller = AdaptiveRateController(
+        name='fetch',
+        max_concurrency=int(os.getenv('RATE_MAX_CONCURRENCY', str((asset_workers + 1) * parallel))),
+        target_latency=float(os.getenv('RATE_TARGET_LATENCY', '3.0')),
+        max_retries=int(os.getenv('FETCH_MAX_RETRIES', '4')),
+    )
+
+    scrapers = [
+        FacebookAdsScraper(
+            max_ads=max_ads_per_shard, assets_dir=assets_dir, sink=shared_sink,
+            rate_controller=rate_controller, page_id=page_id, filters=filters,
+            seen_ad_ids=seen_ad_ids, manage_run=False,
+        )
+        for filters in shard_filters
+    ]
+
+    def crawl(indexed):
+        index, scraper = indexed
+        print(f"▶ Shard {index + 1}/{len(scrapers)}: {scraper.filters}")
+        ads = scraper.scrape_ads()
+        print(f"✓ Shard {index + 1}/{len(scrapers)} finished with {len(ads)} new ads")
+        return ads
+
+    # All shards are recorded as one scrape run
+    shared_sink.begin_run(page_id, {'shards': shard_filters})
+    run_status = 'failed'
+    try:
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            shard_results = list(executor.map(crawl, enumerate(scrapers)))
+        run_status = 'completed' if all(s.error is None for s in scrapers) else 'partial'
+    finally:
+        shared_sink.end_run(run_status)
+        if owns_sink:
+            shared_sink.close()
+        else:
+            shared_sink.flush()
+
+    merged = {}
+    for ads in shard_results:
+        for ad in ads:
+            merged.setdefault(ad.get('ad_id'), ad)
+
+    return {'ads': list(merged.values()), 'scrapers': scrapers}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded parallel crawl of one advertiser")
+    parser.add_argument('page_id', help="Facebook page ID to crawl")
+    parser.add_argument('--by', choices=['date', 'media'], default='date',
+                        help="Partition by start-date windows or media type")
+    parser.add_argument('--from', dest='date_from', type=date.fromisoformat, default=None,
+                        help="Earliest start date (YYYY-MM-DD) for date sharding")
+    parser.add_argument('--to', dest='date_to', type=date.fromisoformat, default=date.today())
+    parser.add_argument('--shards', type=int, default=8, help="Number of date windows")
+    parser.add_argument('--parallel', type=int, default=4, help="Concurrent browser sessions")
+    parser.add_argument('--max-ads-per-shard', type=int, default=None)
+    parser.add_argument('--assets-dir', default='assets')
+    args = parser.parse_args()
+
+    if args.by == 'date':
+        if args.date_from is None:
+            parser.error("--from is required for date sharding")
+        shard_filters = date_shard_filters(args.date_from, args.date_to, args.shards)
+    else:
+        shard_filters = media_shard_filters()
+
+    print("=" * 60)
+    print(f"Sharded crawl of page {args.page_id}: {len(shard_filters)} shards, {args.parallel} in parallel")
+    print("=" * 60)
+
+    result = run_parallel_crawls(
+        args.page_id, shard_filters, parallel=args.parallel,
+        max_ads_per_shard=args.max_ads_per_shard, assets_dir=args.assets_dir,
+    )
+
+    failed = [s for s in result['scrapers'] if s.error is not None]
+    assets = sum(s.assets_downloaded for s in result['scrapers'])
+    print("\n" + "=" * 60)
+    print(f"✓ {len(result['ads'])} unique ads, {assets} assets downloaded")
+    if failed:
+        print(f"⚠️  {len(failed)} shard(s) failed: " + ', '.join(str(s.filters) for s in failed))
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
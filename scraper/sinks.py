@@ -0,0 +1,361 @@
+"""
+Output sinks for scraped ads.
+
+The scraper hands every extracted ad to a sink instead of talking to the
+database directly, so a run can write to PostgreSQL, a streaming NDJSON
+file, a columnar Parquet file, or any combination of them.
+"""
+
+import json
+import os
+import sys
+import threading
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+
+# Column layout shared by the Parquet sink and the Parquet table export
+PARQUET_COLUMNS = [
+    'ad_id', 'status', 'platforms', 'start_date', 'end_date',
+    'asset_url', 'asset_type', 'asset_path', 'multiple_versions',
+    'body_text', 'headline', 'cta_text', 'link_url', 'scraped_at',
+]
+
+
+def _import_pyarrow():
+    """Import pyarrow lazily; it is only needed for Parquet output."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        raise ImportError(
+            "Parquet output requires pyarrow. Install it with: pip install pyarrow"
+        )
+
+
+def parquet_schema():
+    """Arrow schema for ad records written to Parquet."""
+    pa = _import_pyarrow()
+    return pa.schema([
+        ('ad_id', pa.string()),
+        ('status', pa.string()),
+        ('platforms', pa.list_(pa.string())),
+        ('start_date', pa.date32()),
+        ('end_date', pa.date32()),
+        ('asset_url', pa.string()),
+        ('asset_type', pa.string()),
+        ('asset_path', pa.string()),
+        ('multiple_versions', pa.bool_()),
+        ('body_text', pa.string()),
+        ('headline', pa.string()),
+        ('cta_text', pa.string()),
+        ('link_url', pa.string()),
+        ('scraped_at', pa.timestamp('us')),
+    ])
+
+
+def _json_default(value):
+    """Serialize dates and datetimes as ISO strings."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+class AdSink:
+    """Base class for ad output sinks."""
+
+    name = 'sink'
+
+    def begin_run(self, page_id: Optional[str] = None, filters: Optional[Dict] = None):
+        """Called when a scrape run starts."""
+        pass
+
+    def end_run(self, status: str = 'completed'):
+        """Called when a scrape run ends, after all its ads were written."""
+        self.flush()
+
+    def write(self, ad_data: dict):
+        """Write a single ad record."""
+        raise NotImplementedError
+
+    def flush(self):
+        """Flush any buffered records."""
+        pass
+
+    def close(self):
+        """Flush and release resources."""
+        self.flush()
+
+
+class PostgresSink(AdSink):
+    """Write ads to the PostgreSQL `ads` table (upsert by ad_id).
+
+    Ads are buffered and written in batches. During a run, each batch also
+    records one `ad_observations` row per ad in the same transaction.
+    """
+
+    name = 'postgres'
+
+    def __init__(self, db=None, batch_size: Optional[int] = None):
+        if db is None:
+            from database import Database
+            db = Database()
+        from history import AdHistory
+        self.db = db
+        self.history = AdHistory(db)
+        self.batch_size = batch_size or int(os.getenv('DB_BATCH_SIZE', '50'))
+        self.run_id = None
+        # Kept after end_run, for reports on the run that just finished
+        self.last_run_id = None
+        self.page_id = None
+        self._buffer: Dict[str, Dict] = {}
+
+    def begin_run(self, page_id: Optional[str] = None, filters: Optional[Dict] = None):
+        self.flush()
+        self.run_id = self.history.start_run(page_id, filters)
+        self.page_id = page_id
+        print(f"✓ Started scrape run {self.run_id}")
+
+    def end_run(self, status: str = 'completed'):
+        self.flush()
+        if self.run_id is not None:
+            self.history.finish_run(self.run_id, status)
+            self.last_run_id = self.run_id
+            self.run_id = None
+            self.page_id = None
+
+    def reconcile(self, seen_ad_ids: Iterable[str], country: Optional[str] = None) -> int:
+        """Mark the run's page ads missing from `seen_ad_ids` as disappeared.
+
+        Only for runs that crawled the page's whole feed.
+        """
+        self.flush()
+        if self.run_id is None or self.page_id is None:
+            return 0
+        return self.history.reconcile_unseen(self.run_id, self.page_id, seen_ad_ids, country)
+
+    def write(self, ad_data: dict):
+        # Keyed by ad_id so a batch never upserts the same row twice
+        self._buffer[ad_data['ad_id']] = ad_data
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        batch = list(self._buffer.values())
+        self._buffer = {}
+        cursor = self.db.conn.cursor()
+
+        try:
+            if self.run_id is not None:
+                self.history.record_observations(cursor, self.run_id, batch)
+            self.db.upsert_ads(cursor, batch, self.page_id)
+            self.db.conn.commit()
+        except Exception as e:
+            print(f"✗ Error writing batch of {len(batch)} ads, retrying one by one: {e}")
+            self.db.conn.rollback()
+            for ad_data in batch:
+                self._write_one(cursor, ad_data)
+        finally:
+            cursor.close()
+
+    def _write_one(self, cursor, ad_data: dict):
+        """Observation and upsert of a single ad, in their own transaction."""
+        try:
+            if self.run_id is not None:
+                self.history.record_observations(cursor, self.run_id, [ad_data])
+            self.db.upsert_ads(cursor, [ad_data], self.page_id)
+            self.db.conn.commit()
+        except Exception as e:
+            print(f"✗ Error inserting ad {ad_data.get('ad_id')}: {e}")
+            self.db.conn.rollback()
+
+    def close(self):
+        self.end_run('aborted' if self.run_id is not None else 'completed')
+        self.db.close()
+
+
+class NDJSONSink(AdSink):
+    """Stream ads as newline-delimited JSON to a file or stdout."""
+
+    name = 'ndjson'
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        if path in (None, '', '-'):
+            self.stream = sys.stdout
+            self._owns_stream = False
+            # stdout now carries records only: progress messages printed
+            # anywhere in the process go to stderr for the rest of it
+            sys.stdout = sys.stderr
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.stream = open(path, 'a', encoding='utf-8')
+            self._owns_stream = True
+
+    def write(self, ad_data: dict):
+        self.stream.write(json.dumps(ad_data, default=_json_default, ensure_ascii=False))
+        self.stream.write('\n')
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+        if self._owns_stream:
+            self.stream.close()
+
+
+class ParquetSink(AdSink):
+    """Write ads to a Parquet file, one row group per batch of records."""
+
+    name = 'parquet'
+
+    def __init__(self, path: str, row_group_size: int = 10000):
+        pa = _import_pyarrow()
+        self.path = path
+        self.row_group_size = row_group_size
+        self.schema = parquet_schema()
+        self._buffer: List[Dict] = []
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._writer = pa.parquet.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, ad_data: dict):
+        record = {column: ad_data.get(column) for column in PARQUET_COLUMNS}
+        if record['scraped_at'] is None:
+            record['scraped_at'] = datetime.now()
+        self._buffer.append(record)
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def write_batch(self, records: List[Dict]):
+        """Write a batch of records directly as one row group."""
+        pa = _import_pyarrow()
+        table = pa.Table.from_pylist(records, schema=self.schema)
+        self._writer.write_table(table)
+
+    def flush(self):
+        if self._buffer:
+            self.write_batch(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+
+class MultiSink(AdSink):
+    """Fan out every record to several sinks."""
+
+    name = 'multi'
+
+    def __init__(self, sinks: List[AdSink]):
+        self.sinks = sinks
+
+    def begin_run(self, page_id: Optional[str] = None, filters: Optional[Dict] = None):
+        for sink in self.sinks:
+            sink.begin_run(page_id, filters)
+
+    def end_run(self, status: str = 'completed'):
+        for sink in self.sinks:
+            sink.end_run(status)
+
+    def write(self, ad_data: dict):
+        for sink in self.sinks:
+            sink.write(ad_data)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                print(f"✗ Error closing {sink.name} sink: {e}")
+
+    def find(self, sink_type: type) -> Optional[AdSink]:
+        """Return the first sink of the given type, if any."""
+        for sink in self.sinks:
+            if isinstance(sink, sink_type):
+                return sink
+        return None
+
+
+class SynchronizedSink(AdSink):
+    """Serialize access to a sink shared by several concurrent scrapers."""
+
+    name = 'synchronized'
+
+    def __init__(self, sink: AdSink):
+        self.sink = sink
+        self._lock = threading.Lock()
+
+    def begin_run(self, page_id: Optional[str] = None, filters: Optional[Dict] = None):
+        with self._lock:
+            self.sink.begin_run(page_id, filters)
+
+    def end_run(self, status: str = 'completed'):
+        with self._lock:
+            self.sink.end_run(status)
+
+    def write(self, ad_data: dict):
+        with self._lock:
+            self.sink.write(ad_data)
+
+    def flush(self):
+        with self._lock:
+            self.sink.flush()
+
+    def close(self):
+        with self._lock:
+            self.sink.close()
+
+    def find(self, sink_type: type) -> Optional[AdSink]:
+        if isinstance(self.sink, MultiSink):
+            return self.sink.find(sink_type)
+        return self.sink if isinstance(self.sink, sink_type) else None
+
+
+def build_sink(spec: Optional[str] = None, db=None) -> MultiSink:
+    """Build sinks from a comma-separated spec.
+
+    Each entry is `postgres`, `ndjson[:path]` or `parquet:path`. An ndjson
+    entry without a path (or with `-`) streams to stdout. When no spec is
+    given, the `SCRAPER_SINKS` environment variable is used, falling back
+    to `postgres`.
+    """
+    if spec is None:
+        spec = os.getenv('SCRAPER_SINKS', 'postgres')
+
+    sinks = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        kind, _, target = entry.partition(':')
+        kind = kind.lower()
+
+        if kind == 'postgres':
+            sinks.append(PostgresSink(db))
+        elif kind == 'ndjson':
+            sinks.append(NDJSONSink(target or None))
+        elif kind == 'parquet':
+            if not target:
+                raise ValueError("Parquet sink requires a path, e.g. parquet:exports/ads.parquet")
+            row_group_size = int(os.getenv('PARQUET_ROW_GROUP_SIZE', '10000'))
+            sinks.append(ParquetSink(target, row_group_size=row_group_size))
+        else:
+            raise ValueError(f"Unknown sink type: {kind}")
+
+    if not sinks:
+        raise ValueError("At least one sink must be configured")
+
+    return MultiSink(sinks)
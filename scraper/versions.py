@@ -0,0 +1,208 @@
+"""
+Expansion of multi-version ads.
+
+The feed only says "This ad has multiple versions". For every such ad the
+expander opens the ad's detail view in one of a small pool of background
+browser sessions and extracts each version's creative and copy. It
+downloads the version assets through the scraper's normal download path
+and stores the versions in `ad_versions`. Expansion runs alongside the
+feed crawl, so the main browser never waits on it.
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+from psycopg2.extras import RealDictCursor, execute_values
+
+
+# Marker telling an expansion session to exit
+_STOP = object()
+
+# One element per version in the ad detail view
+VERSION_SELECTOR = "div[data-testid='ad-version']"
+# Fallback: every creative block on the detail page is a version
+CONTENT_SELECTOR = "div[data-testid='ad-library-dynamic-content-container']"
+
+VERSION_COLUMNS = ['body_text', 'headline', 'cta_text', 'link_url', 'asset_url', 'asset_type', 'asset_path']
+
+
+class AdVersions:
+    """The ad_versions child table."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def replace_versions(self, ad_id: str, versions: List[Dict]):
+        """Store an ad's current versions, dropping ones that no longer exist."""
+        cursor = self.db.conn.cursor()
+
+        try:
+            if versions:
+                rows = [
+                    (ad_id, index) + tuple(version.get(column) for column in VERSION_COLUMNS)
+                    for index, version in enumerate(versions)
+                ]
+                execute_values(cursor, f"""
+                    INSERT INTO ad_versions (ad_id, version_index, {', '.join(VERSION_COLUMNS)})
+                    VALUES %s
+                    ON CONFLICT (ad_id, version_index) DO UPDATE SET
+                        {', '.join(f'{column} = EXCLUDED.{column}' for column in VERSION_COLUMNS)},
+                        scraped_at = CURRENT_TIMESTAMP
+                """, rows)
+            cursor.execute("""
+                DELETE FROM ad_versions WHERE ad_id = %s AND version_index >= %s
+            """, (ad_id, len(versions)))
+            self.db.conn.commit()
+        except Exception as e:
+            print(f"✗ Error saving versions of ad {ad_id}: {e}")
+            self.db.conn.rollback()
+        finally:
+            cursor.close()
+
+    def versions_for(self, ad_id: str) -> List[Dict]:
+        """All stored versions of one ad, in display order."""
+        cursor = self.db.conn.cursor(cursor_factory=RealDictCursor)
+
+        try:
+            cursor.execute("""
+                SELECT version_index, body_text, headline, cta_text, link_url,
+                       asset_url, asset_type, asset_path, scraped_at
+                FROM ad_versions
+                WHERE ad_id = %s
+                ORDER BY version_index
+            """, (ad_id,))
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            self.db.conn.rollback()
+
+
+class VersionExpander:
+    """Pool of background browser sessions expanding multi-version ads.
+
+    Sessions are started on the first run and, like the scraper's own
+    browser, can be kept open across runs: `drain()` waits for queued ads
+    and stops the worker threads, `close()` also quits the browsers.
+    """
+
+    def __init__(self, scraper, sessions: int = 2, db=None, queue_size: int = 100):
+        if db is None:
+            from database import Database
+            db = Database()
+        self.scraper = scraper
+        self.sessions = max(1, sessions)
+        self.db = db
+        self.store = AdVersions(db)
+        self.page_wait = float(os.getenv('VERSION_PAGE_WAIT', '3'))
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.expanded = 0
+        self.versions_found = 0
+        self.errors = 0
+        self._drivers = [None] * self.sessions
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start one worker thread per session."""
+        for i in range(self.sessions):
+            thread = threading.Thread(target=self._run, args=(i,), name=f"versions-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, ad_id: str):
+        """Queue a flagged ad for expansion (blocks while the queue is full)."""
+        self.queue.put(ad_id)
+
+    def _run(self, session: int):
+        while True:
+            ad_id = self.queue.get()
+            try:
+                if ad_id is _STOP:
+                    return
+                try:
+                    versions = self.expand(session, ad_id)
+                except Exception as e:
+                    with self._lock:
+                        self.errors += 1
+                    print(f"    ⚠️  Could not expand versions of ad {ad_id}: {e}")
+                    # Start the session over on its next ad
+                    self._quit(session)
+                    continue
+                with self._lock:
+                    self.store.replace_versions(ad_id, versions)
+                    self.expanded += 1
+                    self.versions_found += len(versions)
+            finally:
+                self.queue.task_done()
+
+    def _driver(self, session: int):
+        if self._drivers[session] is None:
+            self._drivers[session] = self.scraper.create_driver()
+        return self._drivers[session]
+
+    def _quit(self, session: int):
+        driver = self._drivers[session]
+        self._drivers[session] = None
+        if driver is not None:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def expand(self, session: int, ad_id: str) -> List[Dict]:
+        """Open an ad's detail view and extract every version."""
+        from selenium.webdriver.common.by import By
+        from facebook_ads_scraper import build_ad_url, is_throttle_error
+
+        scraper = self.scraper
+        driver = self._driver(session)
+        scraper.rate_controller.call(lambda: driver.get(build_ad_url(ad_id)), is_throttle=is_throttle_error)
+        time.sleep(self.page_wait)
+
+        elements = driver.find_elements(By.CSS_SELECTOR, VERSION_SELECTOR)
+        if not elements:
+            elements = [content.find_element(By.XPATH, './..')
+                        for content in driver.find_elements(By.CSS_SELECTOR, CONTENT_SELECTOR)]
+
+        versions = []
+        seen = set()
+        for element in elements:
+            asset_url, asset_type = scraper.extract_asset(element)
+            version = scraper.extract_ad_copy(element)
+            version['asset_url'] = asset_url
+            version['asset_type'] = asset_type
+            # The fallback can see the same creative twice (card and detail view)
+            key = (asset_url, version['body_text'], version['headline'])
+            if key in seen:
+                continue
+            seen.add(key)
+            versions.append(version)
+
+        for index, version in enumerate(versions):
+            version['asset_path'] = None
+            if version['asset_url'] and not scraper.skip_asset_downloads:
+                version['asset_path'] = scraper.download_asset(
+                    version['asset_url'], version['asset_type'], f"{ad_id}_v{index}"
+                )
+        return versions
+
+    def drain(self):
+        """Wait for queued ads to be expanded and stop the worker threads."""
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def close(self):
+        """Drain, quit the browser sessions and close the database connection."""
+        self.drain()
+        for session in range(self.sessions):
+            self._quit(session)
+        self.db.close()
+
+    def format_stats(self) -> str:
+        return (f"versions: {self.expanded} ads expanded, {self.versions_found} versions"
+                f" q={self.queue.qsize()}" + (f" err={self.errors}" if self.errors else ''))